@@ -1,22 +1,81 @@
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import OAuth2PasswordRequestForm
-import pandas as pd
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from functools import partial, lru_cache
+import asyncio
 import io
-import json
 import os
-import bcrypt
-from gpt.components.exportar_pdf import exportar_dashboard_pdf
-from gpt.logic.procesar_archivo import procesar_archivo, leer_csv_robusto
-from gpt.logic.filtros import aplicar_filtros
-from gpt.logic.feedback import analizar_grupo, recomendar
+import shutil
+import tempfile
+import zipfile
+from gpt.components.exportar_pdf import exportar_dashboard_pdf, MOTOR_PDF, MOTORES_PDF
+from gpt.components.ejecutores import Ejecutores
+from gpt.components.trabajos_pdf import ColaTrabajosPDF, ColaLlena
+from gpt.components.usuarios import autenticar
+from gpt.components.tokens import emitir_token
+from gpt.components.autenticacion import ProteccionSubidas, usuario_actual
+from gpt.components.admision import ControlAdmision, MiddlewareAdmision
+from gpt.components.arranque import Calentamiento
+from gpt.logic.instrumentacion import MiddlewareMetricas, etapa, contar, exponer_metricas
+from gpt.logic.ingesta import volcar_a_temporal, es_zip, extraer_zip, UMBRAL_DISCO
+from gpt.logic.cache import CacheResultados, huella_contenido, DATASETS_MAX_BYTES, DATASETS_TTL
+# Los módulos con pandas (pipeline, filtros, compactar, serializacion, cuentas, columnar) se importan dentro
+# de cada endpoint: así el servidor abre el puerto sin esperar a pandas y el calentamiento los carga después
+
+# bcrypt, lecturas y wkhtmltopdf van al pool de hilos y los pipelines de pandas al de procesos,
+# para que una subida grande no bloquee el event loop ni el resto de peticiones
+ejecutores = Ejecutores()
+
+# Lo que se importa en segundo plano al arrancar, aquí y en cada worker del pool de procesos
+MODULOS_PESADOS = ['gpt.logic.pipeline', 'gpt.logic.filtros', 'gpt.logic.cuentas']
+calentamiento = Calentamiento(ejecutores, MODULOS_PESADOS)
+
+# Ajusta la ruta a tu ejecutable de wkhtmltopdf si es necesario (solo para el motor 'wkhtmltopdf')
+WKHTML_PATH = os.environ.get('OPTICAMP_WKHTMLTOPDF', r"C:/Program Files/wkhtmltopdf/bin/wkhtmltopdf.exe")
+
+# Subidas más grandes que esto se analizan por bloques (memoria acotada, sin DataFrame completo ni caché del df)
+UMBRAL_BLOQUES = int(os.environ.get('OPTICAMP_UMBRAL_BLOQUES', 32 * 1024 * 1024))
+
+# Archivos por lote de /analizar_lote/ (contando los CSV de dentro de un ZIP) y bytes descomprimidos por ZIP
+MAX_ARCHIVOS_LOTE = int(os.environ.get('OPTICAMP_LOTE_MAX_ARCHIVOS', 50))
+MAX_BYTES_ZIP = int(os.environ.get('OPTICAMP_LOTE_MAX_BYTES_ZIP', 1024 * 1024 * 1024))
+
+# OPTICAMP_COMPACTAR=1 guarda los datasets con categorías y float32/int32 sin pérdida (menos memoria por dataset)
+COMPACTAR_DATASETS = os.environ.get('OPTICAMP_COMPACTAR', '0') == '1'
 
-app = FastAPI()
+# Máximo de filas por página de /datasets/{id}/filas
+MAX_POR_PAGINA = int(os.environ.get('OPTICAMP_MAX_POR_PAGINA', 1000))
+
+@asynccontextmanager
+async def ciclo_de_vida(app):
+    # Sin esperarlo: el servidor acepta conexiones mientras se calientan pandas, el pipeline y el pool de procesos
+    calentamiento.iniciar()
+    yield
+    await calentamiento.detener()
+    await trabajos_pdf.detener()
+    ejecutores.cerrar()
+
+app = FastAPI(lifespan=ciclo_de_vida)
+
+# Subidas a la vez por endpoint (0 sin límite); las siguientes esperan turno en una cola acotada (ver components/admision.py)
+CONCURRENCIA_SUBIDAS = {
+    "/analizar/": int(os.environ.get('OPTICAMP_CONCURRENCIA_ANALIZAR', 4)),
+    "/analizar_lote/": int(os.environ.get('OPTICAMP_CONCURRENCIA_LOTE', 1)),
+    "/cuenta/anexar/": int(os.environ.get('OPTICAMP_CONCURRENCIA_CUENTA', 2)),
+    "/generar_pdf/": int(os.environ.get('OPTICAMP_CONCURRENCIA_PDF', 2)),
+    "/trabajos_pdf/": int(os.environ.get('OPTICAMP_CONCURRENCIA_TRABAJOS_PDF', 4)),
+}
+
+# Subidas que exigen token válido y cuota disponible; se comprueba antes de leer el archivo
+RUTAS_SUBIDA = list(CONCURRENCIA_SUBIDAS)
+app.add_middleware(ProteccionSubidas, rutas=RUTAS_SUBIDA)
+# Tamaño máximo, concurrencia y cola de espera de las subidas, por fuera de ProteccionSubidas (un rechazo no gasta cuota)
+admision = ControlAdmision(CONCURRENCIA_SUBIDAS)
+app.add_middleware(MiddlewareAdmision, control=admision)
+# Tiempos por etapa en la cabecera Server-Timing y acumulados en /metrics
+app.add_middleware(MiddlewareMetricas)
 
 # Permitir peticiones desde cualquier origen (ajusta origins en producción)
 app.add_middleware(
@@ -48,162 +107,624 @@ app.add_middleware(
 # 5. Prueba el login y dashboard en https://astrorituals.es/opticamp/
 # -------------------------------------------------------------------------------
 
-USUARIOS_PATH = os.path.join(os.path.dirname(__file__), 'components', 'usuarios.json')
-
-def cargar_usuarios():
-    if not os.path.isfile(USUARIOS_PATH):
-        return []
-    with open(USUARIOS_PATH, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-def verificar_password(password, password_hash):
-    try:
-        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
-    except Exception:
-        return False
-
 @app.post("/login/")
 async def login(form_data: dict):
     """
     Login de usuario. Recibe JSON: {"usuario": "...", "password": "..."
     Devuelve: {"usuario": ..., "plan": ..., "token": ...}
+    El token va firmado con el usuario, el plan y la caducidad; se envía como 'Authorization: Bearer <token>'.
     """
     usuario = form_data.get("usuario")
     password = form_data.get("password")
     if not usuario or not password:
         raise HTTPException(status_code=400, detail="Usuario y contraseña requeridos")
-    usuarios = cargar_usuarios()
-    user = next((u for u in usuarios if u["usuario"] == usuario), None)
-    if not user or not verificar_password(password, user["password_hash"]):
+    user = await ejecutores.en_hilo(autenticar, usuario, password)
+    if not user:
         raise HTTPException(status_code=401, detail="Credenciales incorrectas")
-    # Token simple (puedes mejorar con JWT)
-    token = f"token-{usuario}"
+    token = emitir_token(usuario, user["plan"])
     return {"usuario": usuario, "plan": user["plan"], "token": token}
 
+cache = CacheResultados()
+# DataFrames procesados, por huella de la subida: la reutilizan /generar_pdf/ y los trabajos de PDF
+# y se consultan por páginas en /datasets/{huella}. Junto a cada uno, en 'usuarios', quienes lo han subido
+datasets = CacheResultados(max_bytes=DATASETS_MAX_BYTES, ttl=DATASETS_TTL)
+
+async def ejecutar_pipeline(file: UploadFile, funcion):
+    """
+    Ejecuta funcion(origen, nombre_archivo) fuera del event loop. Con pool de procesos se envían
+    los bytes de la subida, o la ruta de una copia en disco si es grande (el archivo temporal no se
+    puede pasar a otro proceso); sin él se lee directamente del archivo temporal en un hilo.
+    """
+    if not ejecutores.usa_procesos:
+        return await ejecutores.en_hilo(funcion, file.file, file.filename)
+    if tamano_subida(file) <= UMBRAL_DISCO:
+        with etapa('copia_subida'):
+            datos = await ejecutores.en_hilo(file.file.read)
+        file.file.seek(0)
+        return await ejecutores.en_proceso(funcion, datos, file.filename)
+    with etapa('copia_subida'):
+        ruta = await ejecutores.en_hilo(volcar_a_temporal, file.file)
+    try:
+        return await ejecutores.en_proceso(funcion, ruta, file.filename)
+    finally:
+        os.remove(ruta)
+
+def tamano_subida(file: UploadFile):
+    if file.size is not None:
+        return file.size
+    posicion = file.file.tell()
+    tamano = file.file.seek(0, os.SEEK_END)
+    file.file.seek(posicion)
+    return tamano
+
+async def guardar_dataset(huella, df):
+    """Guarda df en el almacén de datasets, compactado si está activado; devuelve si se ha guardado."""
+    if not COMPACTAR_DATASETS:
+        return datasets.guardar(huella, 'df', df)
+    from gpt.logic.compactar import compactar_dataset
+    df, informe = await ejecutores.en_hilo(compactar_dataset, df)
+    return datasets.guardar(huella, 'df', df, tamano=informe["bytes_despues"])
+
+def anotar_propietario(huella, nombre_usuario):
+    """Apunta al usuario entre los que han subido el dataset huella (sin autenticación nombre_usuario es None)."""
+    if nombre_usuario is None:
+        return
+    usuarios = datasets.obtener(huella, 'usuarios') or frozenset()
+    # Se guarda siempre, para que no caduque antes que el DataFrame
+    datasets.guardar(huella, 'usuarios', usuarios | {nombre_usuario})
+
+async def leer_subida(file: UploadFile, huella=None):
+    """
+    Lee y normaliza el CSV subido y añade la columna de recomendación, fuera del event loop.
+    Si se pasa la huella del contenido, reutiliza el DataFrame cacheado.
+    Devuelve (df, None) o (None, JSONResponse de error).
+    """
+    from gpt.logic.pipeline import procesar_subida
+    if huella is not None:
+        df = datasets.obtener(huella, 'df')
+        if df is not None:
+            return df, None
+    df, error = await ejecutar_pipeline(file, procesar_subida)
+    if error is not None:
+        return None, JSONResponse(content=error, status_code=400)
+    if huella is not None:
+        await guardar_dataset(huella, df)
+    return df, None
+
+def error_formato(formato):
+    from gpt.logic.serializacion import FORMATOS
+    return JSONResponse(content={"error": f"Formato desconocido: {formato}. Opciones: {', '.join(FORMATOS)}"}, status_code=400)
+
 @app.post("/analizar/")
-async def analizar_csv(file: UploadFile = File(...)):
+async def analizar_csv(file: UploadFile = File(...), formato: str = 'filas', usuario: Optional[dict] = Depends(usuario_actual)):
     """
-    Sube un CSV de campañas y devuelve KPIs, feedback, gráficas globales e individuales y tabla resumen en JSON (modo BASIC mejorado).
+    Sube un CSV de campañas (o un Parquet / Arrow IPC) y devuelve KPIs, feedback, gráficas globales e individuales y tabla resumen en JSON (modo BASIC mejorado).
+    Incluye dataset_id para recorrer todas las filas procesadas en GET /datasets/{dataset_id}/filas
+    (null si no se ha guardado el DataFrame: subidas analizadas por bloques o más grandes que el almacén).
+    ?formato=columnas devuelve las campañas y la tabla como un array por campo, más pequeño que una lista de objetos.
     """
-    import tempfile
-    content = await file.read()
+    from gpt.logic.pipeline import resumen_analisis, analizar_subida, analizar_subida_por_bloques, con_dataset_id
+    from gpt.logic.serializacion import serializar_json, FORMATOS
+    if formato not in FORMATOS:
+        return error_formato(formato)
+    clave = 'analizar' if formato == 'filas' else 'analizar-' + formato
     try:
-        # Guardar archivo temporalmente para pasarlo a leer_csv_robusto
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.csv') as tmp:
-            tmp.write(content)
-            tmp_path = tmp.name
-        df_raw, delim, error_info = leer_csv_robusto(tmp_path)
-        os.unlink(tmp_path)
-        if df_raw is None:
-            return JSONResponse(content={
-                "error": "No se pudo leer el archivo CSV. Prueba con otro delimitador o revisa el formato.",
-                "diagnostico": error_info
-            }, status_code=400)
-        df, columnas_faltantes, columnas_encontradas = procesar_archivo(df_raw, file.filename)
-        if columnas_faltantes:
-            return JSONResponse(content={
-                "error": f"Faltan columnas requeridas: {columnas_faltantes}. Columnas encontradas: {columnas_encontradas}"
-            }, status_code=400)
-        # Añadir columna de recomendación si no existe
-        if 'Recomendación' not in df.columns:
-            df['Recomendación'] = df.apply(analizar_grupo, axis=1).apply(recomendar)
-        # KPIs principales globales
-        gasto_total = float(df['Gasto'].sum()) if 'Gasto' in df.columns else None
-        conversiones = int(df['Conversiones'].sum()) if 'Conversiones' in df.columns else None
-        ctr = float(df['CTR'].mean()) if 'CTR' in df.columns else None
-        cpa = float(df['Gasto'].sum() / df['Conversiones'].sum()) if 'Gasto' in df.columns and 'Conversiones' in df.columns and df['Conversiones'].sum() > 0 else None
-        # Feedback global sencillo
-        if conversiones == 0:
-            feedback = "No se han registrado conversiones. Revisa la segmentación, la oferta y la landing page."
-        elif ctr and ctr < 1:
-            feedback = "El CTR es bajo. Prueba nuevas creatividades y segmentaciones."
-        elif cpa and cpa > 50:
-            feedback = "El CPA es alto. Optimiza la segmentación y revisa la oferta."
+        contar('bytes_subida', tamano_subida(file))
+        with etapa('huella'):
+            huella = await ejecutores.en_hilo(huella_contenido, file.file)
+        por_bloques = tamano_subida(file) > UMBRAL_BLOQUES
+        # (cuerpo, guardado): el cuerpo cacheado lleva el dataset_id si guardado, y entonces
+        # solo vale mientras el dataset siga guardado
+        cacheado = cache.obtener(huella, clave)
+        df = None if por_bloques else datasets.obtener(huella, 'df')
+        if cacheado is not None and (df is not None or not cacheado[1]):
+            # Misma subida y misma versión del pipeline: se devuelve el JSON ya serializado
+            if df is not None:
+                anotar_propietario(huella, usuario["usuario"] if usuario else None)
+            return Response(content=cacheado[0], media_type="application/json")
+        guardado = df is not None
+        if df is not None:
+            # DataFrame ya normalizado (p. ej. por /generar_pdf/): solo falta el resumen
+            cuerpo = await ejecutores.en_hilo(lambda: serializar_json(resumen_analisis(df, formato)))
+            status = 200
         else:
-            feedback = "Buen rendimiento general. Sigue optimizando y probando cambios."
-        # --- GRAFICA GLOBAL: por mes (si existe columna 'Mes') ---
-        grafica_global = None
-        if 'Mes' in df.columns and 'Gasto' in df.columns:
-            meses = df['Mes'].unique().tolist()
-            datos_gasto = [float(df[df['Mes'] == m]['Gasto'].sum()) for m in meses]
-            grafica_global = {"labels": meses, "gasto": datos_gasto}
-        # --- GRAFICAS Y KPIs POR CAMPAÑA ---
-        campanas = []
-        if 'Campaña' in df.columns:
-            for nombre, df_camp in df.groupby('Campaña'):
-                kpi_camp = {
-                    "gasto": float(df_camp['Gasto'].sum()) if 'Gasto' in df_camp.columns else None,
-                    "conversiones": int(df_camp['Conversiones'].sum()) if 'Conversiones' in df_camp.columns else None,
-                    "ctr": float(df_camp['CTR'].mean()) if 'CTR' in df_camp.columns else None,
-                    "cpa": float(df_camp['Gasto'].sum() / df_camp['Conversiones'].sum()) if 'Gasto' in df_camp.columns and 'Conversiones' in df_camp.columns and df_camp['Conversiones'].sum() > 0 else None
-                }
-                feedback_camp = df_camp['Recomendación'].iloc[0] if 'Recomendación' in df_camp.columns else ""
-                # Gráfica individual por mes
-                grafica = None
-                if 'Mes' in df_camp.columns and 'Gasto' in df_camp.columns:
-                    meses = df_camp['Mes'].unique().tolist()
-                    datos_gasto = [float(df_camp[df_camp['Mes'] == m]['Gasto'].sum()) for m in meses]
-                    grafica = {"labels": meses, "gasto": datos_gasto}
-                campanas.append({
-                    "nombre": nombre,
-                    "kpis": kpi_camp,
-                    "feedback": feedback_camp,
-                    "grafica": grafica
-                })
-        # Tabla resumen (primeras 20 filas)
-        columnas_tabla = [col for col in ['Campaña','Nombre','Gasto','Clics','Conversiones','CTR','CPC','CPA','ROAS','CPM','Recomendación'] if col in df.columns]
-        tabla = df[columnas_tabla].head(20).to_dict(orient="records")
-        return JSONResponse(content={
-            "kpis": {
-                "gasto_total": gasto_total,
-                "conversiones": conversiones,
-                "ctr": ctr,
-                "cpa": cpa
-            },
-            "feedback": feedback,
-            "grafica_global": grafica_global,
-            "campanas": campanas,
-            "tabla": tabla
-        })
+            pipeline = analizar_subida_por_bloques if por_bloques else analizar_subida
+            df, cuerpo, status = await ejecutar_pipeline(file, partial(pipeline, formato=formato))
+            if df is not None:
+                guardado = await guardar_dataset(huella, df)
+        if status == 200:
+            # El id del dataset es la huella: el mismo archivo vuelve a dar el mismo id
+            if guardado:
+                anotar_propietario(huella, usuario["usuario"] if usuario else None)
+            cuerpo = con_dataset_id(cuerpo, huella if guardado else None)
+            cache.guardar(huella, clave, (cuerpo, guardado), tamano=len(cuerpo))
+        return Response(content=cuerpo, status_code=status, media_type="application/json")
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=400)
 
-@app.post("/generar_pdf/")
-async def generar_pdf(file: UploadFile = File(...)):
+@app.post("/analizar_lote/")
+async def analizar_lote(files: List[UploadFile] = File(...), usuario: Optional[dict] = Depends(usuario_actual)):
+    """
+    Sube varios CSV (o un ZIP con exports) y devuelve NDJSON: una línea {"archivo", "status", "resultado"}
+    por archivo, en cuanto termina (el resultado es el de /analizar/ o su error), y al final una línea
+    {"lote": ...} con los KPIs combinados de todos los archivos correctos y los de cada uno.
+    Los archivos se analizan en paralelo en el pool de procesos.
+    """
+    directorio = tempfile.mkdtemp(prefix='opticamp_lote_')
+    try:
+        contar('bytes_subida', sum(tamano_subida(file) for file in files))
+        with etapa('copia_subida'):
+            entradas = await ejecutores.en_hilo(preparar_lote, files, directorio)
+        if not entradas:
+            raise ValueError("El lote no contiene ningún CSV")
+    except (ValueError, zipfile.BadZipFile) as e:
+        shutil.rmtree(directorio, ignore_errors=True)
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    except Exception:
+        shutil.rmtree(directorio, ignore_errors=True)
+        raise
+    return StreamingResponse(resultados_lote(entradas, directorio), media_type="application/x-ndjson")
+
+def preparar_lote(files, directorio):
+    """
+    Copia al directorio del lote cada subida, o los CSV de las que son un ZIP, porque las subidas
+    se cierran al terminar el endpoint y la respuesta sigue después. Devuelve [(nombre, ruta)].
+    """
+    entradas = []
+    for i, file in enumerate(files):
+        if es_zip(file.file):
+            subdirectorio = os.path.join(directorio, str(i))
+            os.mkdir(subdirectorio)
+            entradas.extend(extraer_zip(file.file, subdirectorio, MAX_ARCHIVOS_LOTE, MAX_BYTES_ZIP))
+        else:
+            ruta = os.path.join(directorio, f"{i}.csv")
+            copiar_subida(file.file, ruta)
+            entradas.append((file.filename, ruta))
+        if len(entradas) > MAX_ARCHIVOS_LOTE:
+            raise ValueError(f"El lote tiene más de {MAX_ARCHIVOS_LOTE} archivos")
+    return entradas
+
+async def analizar_archivo_lote(indice, nombre, ruta):
+    from gpt.logic.pipeline import analizar_para_lote
+    try:
+        por_bloques = os.path.getsize(ruta) > UMBRAL_BLOQUES
+        status, contenido, agregado = await ejecutores.en_proceso(analizar_para_lote, ruta, os.path.basename(nombre), por_bloques)
+    except Exception as e:
+        status, contenido, agregado = 400, {"error": str(e)}, None
+    return indice, nombre, status, contenido, agregado
+
+def linea_ndjson(contenido):
+    from gpt.logic.serializacion import serializar_json
+    return serializar_json(contenido) + b"\n"
+
+async def resultados_lote(entradas, directorio):
+    tareas = [asyncio.ensure_future(analizar_archivo_lote(i, nombre, ruta)) for i, (nombre, ruta) in enumerate(entradas)]
+    try:
+        correctos = []
+        for siguiente in asyncio.as_completed(tareas):
+            indice, nombre, status, contenido, agregado = await siguiente
+            try:
+                linea = linea_ndjson({"archivo": nombre, "status": status, "resultado": contenido})
+            except (TypeError, ValueError) as e:
+                # Valores no serializables: el archivo cuenta como fallido y el lote sigue
+                status, agregado = 400, None
+                linea = linea_ndjson({"archivo": nombre, "status": status, "resultado": {"error": str(e)}})
+            if agregado is not None:
+                correctos.append((indice, nombre, contenido, agregado))
+            yield linea
+        if not correctos:
+            yield linea_ndjson({"lote": {"error": "Ningún archivo del lote se ha podido analizar"}})
+            return
+        # En el orden de subida, no en el de llegada, para que el resumen no dependa de qué archivo termina antes
+        correctos.sort(key=lambda r: r[0])
+        from gpt.logic.pipeline import resumen_lote
+        resumen = await ejecutores.en_hilo(resumen_lote, [r[1:] for r in correctos])
+        try:
+            linea = linea_ndjson({"lote": resumen})
+        except (TypeError, ValueError) as e:
+            linea = linea_ndjson({"lote": {"error": str(e)}})
+        yield linea
+    finally:
+        # Si el cliente se desconecta, lo pendiente no llega a enviarse al pool
+        for tarea in tareas:
+            tarea.cancel()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+@lru_cache(maxsize=None)
+def almacen_cuentas():
+    """Filas normalizadas de cada cuenta en disco, para anexar exports diarios (ver logic/cuentas.py)."""
+    from gpt.logic.cuentas import AlmacenCuentas
+    return AlmacenCuentas()
+
+def cuenta_de(usuario):
+    # Sin autenticación (OPTICAMP_AUTH=0) todas las subidas van a una única cuenta local
+    return usuario["usuario"] if usuario else 'local'
+
+@app.post("/cuenta/anexar/")
+async def anexar_cuenta(file: UploadFile = File(...), formato: str = 'filas', usuario: Optional[dict] = Depends(usuario_actual)):
+    """
+    Añade un export (p. ej. el del último día) a las filas guardadas de la cuenta y devuelve los KPIs, feedback
+    y gráficas de todo el histórico, como /analizar/ pero sin tabla, y en "anexado" las filas nuevas,
+    las sustituidas (mismo Nombre y Mes que una ya guardada) y el total.
+    Solo se procesa el export: el histórico no se vuelve a leer ni a agregar.
+    """
+    from gpt.logic.pipeline import procesar_subida, resumen_agregado
+    from gpt.logic.serializacion import serializar_json, FORMATOS
+    if formato not in FORMATOS:
+        return error_formato(formato)
+    try:
+        contar('bytes_subida', tamano_subida(file))
+        # Sin RankingGasto ni ColorCampaña, que dependen de cada archivo y no del histórico
+        df, error = await ejecutar_pipeline(file, partial(procesar_subida, columnas_globales=False))
+        if error is not None:
+            return JSONResponse(content=error, status_code=400)
+        with etapa('anexado'):
+            agregado, anexado = await ejecutores.en_hilo(almacen_cuentas().anexar, cuenta_de(usuario), df)
+        cuerpo = await ejecutores.en_hilo(lambda: serializar_json({**resumen_agregado(agregado, formato), "anexado": anexado}))
+        return Response(content=cuerpo, media_type="application/json")
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+
+@app.get("/cuenta/")
+async def resumen_cuenta(formato: str = 'filas', usuario: Optional[dict] = Depends(usuario_actual)):
+    """
+    KPIs, feedback y gráficas de todo el histórico de la cuenta desde el agregado guardado, sin leer las filas,
+    y en "cuenta" las filas, columnas, segmentos y bytes en disco.
+    """
+    from gpt.logic.pipeline import resumen_agregado
+    from gpt.logic.serializacion import serializar_json, FORMATOS
+    if formato not in FORMATOS:
+        return error_formato(formato)
+    cuenta = cuenta_de(usuario)
+    agregado = await ejecutores.en_hilo(almacen_cuentas().agregado, cuenta)
+    if agregado is None:
+        raise HTTPException(status_code=404, detail="La cuenta no tiene datos: sube un export a /cuenta/anexar/")
+    estadisticas = await ejecutores.en_hilo(almacen_cuentas().estadisticas, cuenta)
+    cuerpo = await ejecutores.en_hilo(lambda: serializar_json({**resumen_agregado(agregado, formato), "cuenta": estadisticas}))
+    return Response(content=cuerpo, media_type="application/json")
+
+@app.delete("/cuenta/")
+async def borrar_cuenta(usuario: Optional[dict] = Depends(usuario_actual)):
     """
-    Sube un CSV y devuelve el PDF del dashboard generado.
+    Borra todas las filas guardadas de la cuenta.
     """
-    content = await file.read()
+    if not await ejecutores.en_hilo(almacen_cuentas().borrar, cuenta_de(usuario)):
+        raise HTTPException(status_code=404, detail="La cuenta no tiene datos")
+    return {"borrada": True}
+
+def dataset_cacheado(dataset_id, usuario):
+    # El id es la huella del contenido: un dataset que no ha subido el usuario responde igual que uno inexistente
+    df = datasets.obtener(dataset_id, 'df')
+    if df is not None and usuario is not None and usuario["usuario"] not in (datasets.obtener(dataset_id, 'usuarios') or ()):
+        df = None
+    if df is None:
+        raise HTTPException(status_code=404, detail="Dataset no encontrado o caducado: vuelve a subir el archivo a /analizar/")
+    return df
+
+def indice_dataset(dataset_id, df):
+    """Índices de filtrado y orden del dataset, construidos en la primera consulta y guardados junto a él."""
+    indice = datasets.obtener(dataset_id, 'indice')
+    if indice is None:
+        from gpt.logic.filtros import DatasetIndexado
+        indice = DatasetIndexado(df)
+        datasets.guardar(dataset_id, 'indice', indice, tamano=indice.memoria())
+    return indice
+
+@app.get("/datasets/{dataset_id}")
+async def info_dataset(dataset_id: str, usuario: Optional[dict] = Depends(usuario_actual)):
+    """
+    Filas, columnas y valores de los filtros (canales, tipos y rango de gasto) de un dataset de /analizar/.
+    """
+    from gpt.logic.filtros import describir_dataset
+    df = dataset_cacheado(dataset_id, usuario)
+    return await ejecutores.en_hilo(describir_dataset, df)
+
+@app.get("/datasets/{dataset_id}/filas")
+async def filas_dataset(
+    dataset_id: str,
+    pagina: int = Query(1, ge=1),
+    por_pagina: int = Query(50, ge=1, le=MAX_POR_PAGINA),
+    orden: Optional[str] = None,
+    canal: str = 'Todos',
+    tipo: str = 'Todos',
+    gasto_min: Optional[float] = None,
+    gasto_max: Optional[float] = None,
+    columnas: Optional[str] = None,
+    formato: str = 'filas',
+    usuario: Optional[dict] = Depends(usuario_actual)
+):
+    """
+    Una página de las filas procesadas de un dataset de /analizar/, sin volver a leer el CSV.
+    ?orden=-Gasto,Nombre ordena ('-' descendente), ?canal=, ?tipo=, ?gasto_min= y ?gasto_max= filtran
+    como aplicar_filtros, ?columnas=Nombre,Gasto elige las columnas y ?formato=columnas devuelve un array por columna.
+    """
+    from gpt.logic.serializacion import serializar_json, FORMATOS
+    if formato not in FORMATOS:
+        return error_formato(formato)
+    df = dataset_cacheado(dataset_id, usuario)
+    indice = await ejecutores.en_hilo(indice_dataset, dataset_id, df)
+    rango_gasto = None
+    if gasto_min is not None or gasto_max is not None:
+        rango_gasto = (gasto_min if gasto_min is not None else float('-inf'), gasto_max if gasto_max is not None else float('inf'))
     try:
-        df_raw = pd.read_csv(io.BytesIO(content))
-        df, _, _ = procesar_archivo(df_raw, file.filename)
-        columnas_pdf = [col for col in ['Campaña','Nombre','Gasto','Clics','Conversiones','CTR','CPC','CPA','ROAS','CPM','Recomendación'] if col in df.columns]
-        df_export = df[columnas_pdf]
-        feedback_global = "Resumen generado desde API"
-        # Ajusta la ruta a tu ejecutable de wkhtmltopdf si es necesario
-        wkhtml_path = r"C:/Program Files/wkhtmltopdf/bin/wkhtmltopdf.exe"
-        # Ajusta la ruta a tu logo si lo quieres en el PDF
-        logo_path = "gpt/components/logo.png"
-        pdf_bytes, _ = exportar_dashboard_pdf(
-            df_export=df_export,
-            feedback_global=feedback_global,
-            wkhtml_path=wkhtml_path,
-            logo_path=logo_path
+        contenido = await ejecutores.en_hilo(
+            indice.pagina, canal, tipo, rango_gasto,
+            orden=orden.split(',') if orden else None,
+            pagina=pagina,
+            por_pagina=por_pagina,
+            columnas=columnas.split(',') if columnas else None,
+            formato=formato
         )
+        return Response(content=serializar_json({"dataset_id": dataset_id, **contenido}), media_type="application/json")
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+
+@app.get("/datasets/{dataset_id}/descargar")
+async def descargar_dataset(dataset_id: str, formato: str = 'parquet', columnas: Optional[str] = None, usuario: Optional[dict] = Depends(usuario_actual)):
+    """
+    Descarga todas las filas procesadas de un dataset de /analizar/ en Parquet (?formato=parquet, por defecto)
+    o Arrow IPC (?formato=arrow), para pandas, Polars, DuckDB, Spark... ?columnas=Nombre,Gasto elige las columnas.
+    """
+    from gpt.logic.columnar import escribir_columnar, FORMATOS_DESCARGA
+    if formato not in FORMATOS_DESCARGA:
+        return JSONResponse(content={"error": f"Formato desconocido: {formato}. Opciones: {', '.join(FORMATOS_DESCARGA)}"}, status_code=400)
+    df = dataset_cacheado(dataset_id, usuario)
+    try:
+        contenido = await ejecutores.en_hilo(escribir_columnar, df, formato, columnas.split(',') if columnas else None)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    except RuntimeError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=501)
+    tipo, extension = FORMATOS_DESCARGA[formato]
+    return Response(content=contenido, media_type=tipo, headers={"Content-Disposition": f'attachment; filename="{dataset_id}{extension}"'})
+
+@app.get("/datasets/{dataset_id}/exportar")
+async def exportar_dataset(request: Request, dataset_id: str, formato: str = 'ndjson', columnas: Optional[str] = None, comprimir: Optional[bool] = None, usuario: Optional[dict] = Depends(usuario_actual)):
+    """
+    Todas las filas procesadas de un dataset de /analizar/ (con Recomendación, RankingGasto, CVR...) en NDJSON
+    (?formato=ndjson, una fila por línea) o CSV (?formato=csv), enviadas por lotes a medida que se serializan,
+    sin armar la respuesta entera en memoria. ?columnas=Nombre,Gasto elige las columnas. Va en gzip si el cliente
+    lo acepta (Accept-Encoding); ?comprimir=true|false lo fuerza o lo desactiva.
+    """
+    from gpt.logic.compactar import comprobar_columnas
+    from gpt.logic.serializacion import FORMATOS_EXPORTACION, exportar_filas, comprimir_gzip
+    if formato not in FORMATOS_EXPORTACION:
+        return JSONResponse(content={"error": f"Formato desconocido: {formato}. Opciones: {', '.join(FORMATOS_EXPORTACION)}"}, status_code=400)
+    df = dataset_cacheado(dataset_id, usuario)
+    seleccion = columnas.split(',') if columnas else None
+    if seleccion:
+        try:
+            comprobar_columnas(df, seleccion)
+        except ValueError as e:
+            return JSONResponse(content={"error": str(e)}, status_code=400)
+    trozos = exportar_filas(df, formato, seleccion)
+    tipo, extension = FORMATOS_EXPORTACION[formato]
+    cabeceras = {"Content-Disposition": f'attachment; filename="{dataset_id}{extension}"', "Vary": "Accept-Encoding"}
+    if comprimir is None:
+        comprimir = acepta_gzip(request.headers.get('accept-encoding', ''))
+    if comprimir:
+        trozos = comprimir_gzip(trozos)
+        cabeceras["Content-Encoding"] = "gzip"
+    return StreamingResponse(trozos_en_hilo(trozos), media_type=tipo, headers=cabeceras)
+
+def acepta_gzip(accept_encoding):
+    # gzip en Accept-Encoding, salvo con q=0 (p. ej. 'gzip, deflate, br' o 'gzip;q=0.8')
+    for codificacion in accept_encoding.split(','):
+        nombre, *parametros = [parte.strip() for parte in codificacion.split(';')]
+        if nombre.lower() == 'gzip':
+            q = next((parametro[2:] for parametro in parametros if parametro.startswith('q=')), '1')
+            try:
+                return float(q) > 0
+            except ValueError:
+                return False
+    return False
+
+async def trozos_en_hilo(trozos):
+    # Cada lote se serializa en el pool de hilos; si el cliente se desconecta no se piden más
+    while True:
+        trozo = await ejecutores.en_hilo(next, trozos, None)
+        if trozo is None:
+            return
+        yield trozo
+
+async def renderizar_pdf(df, motor):
+    """Tabla del dashboard en PDF con el motor elegido. Devuelve (pdf_bytes, errores)."""
+    columnas_pdf = [col for col in ['Campaña','Nombre','Gasto','Clics','Conversiones','CTR','CPC','CPA','ROAS','CPM','Recomendación'] if col in df.columns]
+    df_export = df[columnas_pdf]
+    feedback_global = "Resumen generado desde API"
+    # Ajusta la ruta a tu logo si lo quieres en el PDF
+    logo_path = "gpt/components/logo.png"
+    # wkhtmltopdf es un subproceso externo (basta un hilo); ReportLab dibuja en Python y va al pool de procesos
+    ejecutar = ejecutores.en_proceso if motor == 'reportlab' else ejecutores.en_hilo
+    return await ejecutar(
+        exportar_dashboard_pdf,
+        df_export=df_export,
+        feedback_global=feedback_global,
+        wkhtml_path=WKHTML_PATH,
+        logo_path=logo_path,
+        motor=motor
+    )
+
+def error_motor(motor):
+    return JSONResponse(content={"error": f"Motor de PDF desconocido: {motor}. Opciones: {', '.join(MOTORES_PDF)}"}, status_code=400)
+
+@app.post("/generar_pdf/")
+async def generar_pdf(file: UploadFile = File(...), motor: Optional[str] = None, usuario: Optional[dict] = Depends(usuario_actual)):
+    """
+    Sube un CSV (o un Parquet / Arrow IPC) y devuelve el PDF del dashboard generado.
+    ?motor=reportlab|wkhtmltopdf elige el motor de PDF (por defecto OPTICAMP_MOTOR_PDF).
+    """
+    try:
+        motor = motor or MOTOR_PDF
+        if motor not in MOTORES_PDF:
+            return error_motor(motor)
+        contar('bytes_subida', tamano_subida(file))
+        with etapa('huella'):
+            huella = await ejecutores.en_hilo(huella_contenido, file.file)
+        pdf_bytes = cache.obtener(huella, 'pdf-' + motor)
+        if pdf_bytes is not None:
+            return StreamingResponse(io.BytesIO(pdf_bytes), media_type="application/pdf")
+        df, error = await leer_subida(file, huella)
+        if error is not None:
+            return error
+        anotar_propietario(huella, usuario["usuario"] if usuario else None)
+        pdf_bytes, errores = await renderizar_pdf(df, motor)
+        if not pdf_bytes:
+            return JSONResponse(content={"error": "No se pudo generar el PDF", "errores": errores}, status_code=500)
+        cache.guardar(huella, 'pdf-' + motor, pdf_bytes)
         return StreamingResponse(io.BytesIO(pdf_bytes), media_type="application/pdf")
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=400)
 
+async def procesar_trabajo_pdf(trabajo):
+    """Genera el PDF de un trabajo de la cola a partir del CSV guardado en su directorio."""
+    trabajo.avanzar('leyendo_csv', 10)
+    huella = await ejecutores.en_hilo(huella_archivo, trabajo.ruta_csv)
+    pdf_bytes = cache.obtener(huella, 'pdf-' + trabajo.motor)
+    if pdf_bytes is not None:
+        return pdf_bytes
+    df = datasets.obtener(huella, 'df')
+    if df is None:
+        from gpt.logic.pipeline import procesar_subida
+        df, error = await ejecutores.en_proceso(procesar_subida, trabajo.ruta_csv, trabajo.nombre_archivo)
+        if error is not None:
+            raise ValueError(error["error"])
+        await guardar_dataset(huella, df)
+    anotar_propietario(huella, trabajo.usuario)
+    trabajo.avanzar('generando_pdf', 60)
+    pdf_bytes, errores = await renderizar_pdf(df, trabajo.motor)
+    if not pdf_bytes:
+        raise RuntimeError("No se pudo generar el PDF: " + " | ".join(errores))
+    cache.guardar(huella, 'pdf-' + trabajo.motor, pdf_bytes)
+    return pdf_bytes
+
+def huella_archivo(ruta):
+    with open(ruta, 'rb') as f:
+        return huella_contenido(f)
+
+trabajos_pdf = ColaTrabajosPDF(procesar_trabajo_pdf)
+
+@app.post("/trabajos_pdf/", status_code=202)
+async def crear_trabajo_pdf(file: UploadFile = File(...), motor: Optional[str] = None, usuario: Optional[dict] = Depends(usuario_actual)):
+    """
+    Encola la generación del PDF de un CSV y responde enseguida con el id del trabajo.
+    El estado se consulta en GET /trabajos_pdf/{id} y el PDF se descarga en GET /trabajos_pdf/{id}/pdf.
+    """
+    motor = motor or MOTOR_PDF
+    if motor not in MOTORES_PDF:
+        return error_motor(motor)
+    try:
+        trabajo = trabajos_pdf.crear(file.filename, motor, usuario["usuario"] if usuario else None)
+    except ColaLlena as e:
+        return JSONResponse(content={"error": str(e)}, status_code=429, headers={"Retry-After": "30"})
+    try:
+        # La subida se cierra al terminar la petición: se copia al directorio del trabajo
+        await ejecutores.en_hilo(copiar_subida, file.file, trabajo.ruta_csv)
+        trabajos_pdf.encolar(trabajo)
+    except ColaLlena as e:
+        return JSONResponse(content={"error": str(e)}, status_code=429, headers={"Retry-After": "30"})
+    except BaseException:
+        # También con CancelledError (el cliente corta la subida): si no, el directorio del trabajo se queda huérfano
+        trabajos_pdf.descartar(trabajo)
+        raise
+    return trabajo.a_dict()
+
+def copiar_subida(origen, ruta):
+    with open(ruta, 'wb') as destino:
+        shutil.copyfileobj(origen, destino)
+
+@app.get("/trabajos_pdf/{id_trabajo}")
+async def estado_trabajo_pdf(id_trabajo: str, usuario: Optional[dict] = Depends(usuario_actual)):
+    """
+    Estado de un trabajo de PDF: en_cola, procesando (con etapa y progreso en %), completado o error.
+    """
+    return trabajo_del_usuario(id_trabajo, usuario).a_dict()
+
+def trabajo_del_usuario(id_trabajo, usuario):
+    # Un trabajo ajeno responde igual que uno inexistente
+    trabajo = trabajos_pdf.obtener(id_trabajo)
+    if trabajo is None or (usuario is not None and trabajo.usuario != usuario["usuario"]):
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o caducado")
+    return trabajo
+
+@app.get("/trabajos_pdf/{id_trabajo}/pdf")
+async def descargar_trabajo_pdf(id_trabajo: str, usuario: Optional[dict] = Depends(usuario_actual)):
+    """
+    Descarga el PDF de un trabajo completado (409 si aún no ha terminado o ha fallado).
+    """
+    trabajo = trabajo_del_usuario(id_trabajo, usuario)
+    if trabajo.estado != 'completado':
+        return JSONResponse(content=trabajo.a_dict(), status_code=409)
+    return FileResponse(trabajo.ruta_pdf, media_type="application/pdf", filename="dashboard.pdf")
+
+@app.get("/salud/")
+async def salud():
+    """
+    Comprobación de vida: responde en cuanto el servidor acepta conexiones, sin esperar a pandas,
+    con el estado del calentamiento (pendiente, calentando, listo, error o desactivado).
+    """
+    return {"estado": "ok", "calentamiento": calentamiento.estadisticas()}
+
+@app.get("/listo/")
+async def listo():
+    """
+    Comprobación de disponibilidad para el health check de Render o del balanceador: 200 con el calentamiento
+    terminado y 503 con Retry-After mientras calienta o si ha fallado.
+    """
+    contenido = {"listo": calentamiento.listo, **calentamiento.estadisticas()}
+    if calentamiento.listo:
+        return contenido
+    return JSONResponse(content=contenido, status_code=503, headers={"Retry-After": "5"})
+
+@app.get("/metrics")
+async def metricas():
+    """
+    Histogramas en formato Prometheus: duración por ruta y por etapa, filas, intentos de detección y tamaño de subida,
+    y contadores del control de admisión (subidas admitidas y rechazadas por motivo, en curso y esperando).
+    """
+    return Response(content=exponer_metricas() + admision.exponer(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/")
+async def estadisticas_cache():
+    """
+    Estado de la caché de resultados y del almacén de datasets: entradas, bytes ocupados, aciertos, fallos y expulsiones.
+    """
+    return {**cache.estadisticas(), "datasets": datasets.estadisticas()}
+
+@app.get("/ejecutores/")
+async def estadisticas_ejecutores():
+    """
+    Estado de los pools de hilos y procesos (tamaño, tareas en curso y en cola, enviadas, completadas y fallidas),
+    de la cola de trabajos de PDF y del control de admisión de las subidas.
+    """
+    return {**ejecutores.estadisticas(), "trabajos_pdf": trabajos_pdf.estadisticas(), "admision": admision.estadisticas()}
+
 """
 INSTRUCCIONES RÁPIDAS:
 
-- Lanza la API con:
-    uvicorn gpt.api:app --reload
+- Lanza la API desde la carpeta gpt/ (como el Start Command del README; --reload para desarrollo):
+    uvicorn gpt.api:app --app-dir .. --host 0.0.0.0 --port 10000
 
 - Endpoints:
-    POST /analizar/    # Sube un CSV y recibe KPIs en JSON
-    POST /generar_pdf/ # Sube un CSV y recibe el PDF generado
+    POST /analizar/    # Sube un CSV y recibe KPIs en JSON (?formato=columnas: arrays por campo)
+    GET  /datasets/{id}          # Columnas y valores de filtro del dataset de /analizar/
+    GET  /datasets/{id}/filas    # Página de filas (?pagina, ?por_pagina, ?orden=-Gasto, ?canal, ?tipo, ?gasto_min, ?gasto_max, ?columnas)
+    GET  /datasets/{id}/descargar  # Todas las filas en Parquet o Arrow IPC (?formato=parquet|arrow, ?columnas)
+    GET  /datasets/{id}/exportar   # Todas las filas por streaming en NDJSON o CSV (?formato=ndjson|csv, ?columnas; gzip con Accept-Encoding)
+    POST /analizar_lote/         # Varios CSV o un ZIP: NDJSON con cada archivo al terminar y el resumen conjunto
+    POST /cuenta/anexar/         # Añade un export diario al histórico de la cuenta y devuelve sus KPIs
+    GET  /cuenta/                # KPIs del histórico de la cuenta (DELETE lo borra)
+    POST /generar_pdf/ # Sube un CSV y recibe el PDF generado (?motor=reportlab|wkhtmltopdf)
+    POST /trabajos_pdf/          # Encola un PDF y devuelve su id (202)
+    GET  /trabajos_pdf/{id}      # Estado y progreso del trabajo
+    GET  /trabajos_pdf/{id}/pdf  # Descarga el PDF terminado
+    GET  /salud/       # Vida: responde en cuanto abre el puerto, con el estado del calentamiento
+    GET  /listo/       # Disponibilidad: 200 con pandas y el pool de procesos calientes, 503 mientras tanto
+    GET  /metrics      # Métricas en formato Prometheus (OPTICAMP_METRICAS=0 las desactiva)
+    GET  /cache/       # Estadísticas de la caché de resultados
+    GET  /ejecutores/  # Tamaño y cola de los pools de hilos y procesos y control de admisión de las subidas
 
 - Consúmelo desde WordPress vía AJAX, WPForms Webhook, o cualquier frontend.
-- Si necesitas seguridad, añade autenticación por token o API key.
+- Las subidas necesitan 'Authorization: Bearer <token>' con el token de POST /login/ (OPTICAMP_AUTH=0 lo desactiva en local).
+- Con las subidas de un endpoint ocupadas y su cola de espera llena se responde 429 con Retry-After (503 si se agota la espera); más de OPTICAMP_MAX_SUBIDA bytes, 413.
 """
\ No newline at end of file
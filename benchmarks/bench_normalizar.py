@@ -0,0 +1,53 @@
+"""
+Compara parse_float_robusto aplicado celda a celda con normalizar_numerica.
+
+Uso (desde la carpeta que contiene gpt/):
+    python -m gpt.benchmarks.bench_normalizar --filas 500000
+"""
+import argparse
+import random
+import time
+import numpy as np
+import pandas as pd
+from gpt.logic.procesar_archivo import parse_float_robusto
+from gpt.logic.normalizar import normalizar_numerica
+
+
+def generar_columna(filas, semilla=0):
+    # Valores con el aspecto de un export de Google Ads: comas decimales, %, espacios finos...
+    rnd = random.Random(semilla)
+    plantillas = ['{:.2f}', '{:.2f} %', '{:,.2f}', '"{:.2f}"', '{:.2f};{:.2f}', '{:.0f} ']
+    valores = []
+    for _ in range(filas):
+        v = rnd.uniform(0, 5000)
+        plantilla = rnd.choice(plantillas)
+        valores.append(plantilla.format(v, v).replace('.', ','))
+    return pd.Series(valores, dtype=object)
+
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--filas', type=int, default=500_000)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args()
+    serie = generar_columna(args.filas)
+    t_celda, esperado = medir(lambda: serie.apply(parse_float_robusto), args.repeticiones)
+    t_vector, obtenido = medir(lambda: normalizar_numerica(serie), args.repeticiones)
+    iguales = np.array_equal(esperado.to_numpy(dtype='float64'), obtenido.to_numpy())
+    print(f"filas={args.filas}")
+    print(f"parse_float_robusto (apply): {t_celda:.3f} s")
+    print(f"normalizar_numerica:         {t_vector:.3f} s")
+    print(f"aceleración: x{t_celda / t_vector:.1f}  resultados idénticos: {iguales}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Mide por separado cada etapa del pipeline (detección del formato, lectura, normalización, recomendación,
+agregación, serialización JSON y PDF) sobre exports sintéticos de benchmarks.generador y guarda
+los resultados en JSON para compararlos entre versiones.
+
+Uso (desde la carpeta que contiene gpt/):
+    python -m gpt.benchmarks.bench_pipeline --filas 1000 100000 --salida resultados.json
+    python -m gpt.benchmarks.bench_pipeline --plataformas meta_es --encodings utf-16 --delimitadores tab puntoycoma --comparar resultados.json
+    python -m gpt.benchmarks.bench_pipeline --plataformas facebook --filas 100000 --columnas-extra 80
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from gpt.benchmarks.generador import PLATAFORMAS, ENCODINGS, DELIMITADORES, TAMANOS, escribir_export
+from gpt.logic.deteccion_csv import TAMANO_MUESTRA, detectar_formato
+from gpt.logic.procesar_archivo import leer_csv_robusto, procesar_archivo
+from gpt.logic.feedback import recomendar_columnas
+from gpt.logic.agregados import agregar_campanas
+from gpt.logic.pipeline import resumen_analisis, serializar_json
+from gpt.components.exportar_pdf import exportar_dashboard_pdf
+
+ETAPAS = ['deteccion', 'lectura', 'normalizacion', 'recomendacion', 'agregacion', 'serializacion', 'pdf']
+
+
+def medir(funcion, repeticiones):
+    """Mejor tiempo de repeticiones ejecuciones y el resultado de la última."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), resultado
+
+
+def ruta_export(directorio, plataforma, filas, encoding, delimitador, semilla, columnas_extra=0):
+    """Genera el export si no existe ya en directorio (los de millones de filas tardan en generarse)."""
+    nombre_delim = next(nombre for nombre, d in DELIMITADORES.items() if d == delimitador)
+    ruta = os.path.join(directorio, f"{plataforma}_{filas}_{encoding}_{nombre_delim}_{semilla}_{columnas_extra}.csv")
+    if not os.path.isfile(ruta):
+        escribir_export(ruta, plataforma, filas, semilla, encoding, delimitador, columnas_extra=columnas_extra)
+    return ruta
+
+
+def medir_caso(ruta, plataforma, repeticiones, filas_pdf, motor_pdf):
+    tiempos = {}
+    with open(ruta, 'rb') as f:
+        muestra = f.read(TAMANO_MUESTRA + 1)
+    tiempos['deteccion'], _ = medir(lambda: detectar_formato(muestra[:TAMANO_MUESTRA], None, len(muestra) <= TAMANO_MUESTRA), repeticiones)
+    tiempos['lectura'], (df_raw, _, error) = medir(lambda: leer_csv_robusto(ruta), repeticiones)
+    if df_raw is None:
+        raise ValueError(f"{ruta}: {error['errores']}")
+    memoria = int(df_raw.memory_usage(deep=True).sum())
+    tiempos['normalizacion'], (df, faltantes, _) = medir(lambda: procesar_archivo(df_raw.copy(), plataforma), repeticiones)
+    if faltantes:
+        raise ValueError(f"{ruta}: faltan columnas {faltantes}")
+    tiempos['recomendacion'], recomendaciones = medir(lambda: recomendar_columnas(df), repeticiones)
+    df['Recomendación'] = recomendaciones
+    tiempos['agregacion'], _ = medir(lambda: agregar_campanas(df), repeticiones)
+    contenido = resumen_analisis(df)
+    tiempos['serializacion'], cuerpo = medir(lambda: serializar_json(contenido), repeticiones)
+    if filas_pdf:
+        df_pdf = df.head(filas_pdf)
+        tiempos['pdf'], (pdf_bytes, errores) = medir(lambda: exportar_dashboard_pdf(df_pdf, "", logo_path=None, motor=motor_pdf), repeticiones)
+        if not pdf_bytes:
+            tiempos['pdf'] = None
+    return tiempos, len(cuerpo), memoria
+
+
+def version_codigo():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(actual, anterior):
+    """Imprime, para cada caso presente en ambos resultados, el cociente actual/anterior de cada etapa."""
+    clave = lambda r: (r['plataforma'], r['filas'], r['encoding'], r['delimitador'], r.get('columnas_extra', 0))
+    previos = {clave(r): r for r in anterior['resultados']}
+    print(f"\ncomparación con {anterior.get('version')} (actual/anterior, <1 es más rápido):")
+    for r in actual['resultados']:
+        previo = previos.get(clave(r))
+        if previo is None:
+            continue
+        cocientes = [f"{e}={r['etapas'][e] / previo['etapas'][e]:.2f}" for e in ETAPAS
+                     if r['etapas'].get(e) and previo['etapas'].get(e)]
+        print(f"  {r['plataforma']:<10} {r['filas']:>9} {r['encoding']:<9} {r['delimitador']!r:<5} " + ' '.join(cocientes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--plataformas', nargs='+', choices=sorted(PLATAFORMAS), default=sorted(PLATAFORMAS))
+    parser.add_argument('--filas', nargs='+', type=int, default=TAMANOS[:3], help=f"tamaños (hasta {TAMANOS[-1]:,} filas)")
+    parser.add_argument('--encodings', nargs='+', choices=ENCODINGS, help="por defecto el de cada plataforma")
+    parser.add_argument('--delimitadores', nargs='+', choices=DELIMITADORES, help="por defecto el de cada plataforma")
+    parser.add_argument('--columnas-extra', type=int, default=0, help="columnas que la aplicación no usa (exports anchos)")
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--filas-pdf', type=int, default=1000, help="filas de la tabla del PDF (0 para no medirlo)")
+    parser.add_argument('--motor-pdf', default='reportlab')
+    parser.add_argument('--directorio', default=os.path.join(tempfile.gettempdir(), 'opticamp_bench'),
+                        help="dónde se generan y reutilizan los exports")
+    parser.add_argument('--salida', help="archivo JSON con los resultados")
+    parser.add_argument('--comparar', help="JSON de una ejecución anterior con el que comparar")
+    args = parser.parse_args()
+    os.makedirs(args.directorio, exist_ok=True)
+    resultados = []
+    for plataforma in args.plataformas:
+        config = PLATAFORMAS[plataforma]
+        for filas in args.filas:
+            for encoding in args.encodings or [config['encoding']]:
+                for delimitador in [DELIMITADORES[d] for d in args.delimitadores] if args.delimitadores else [config['delimitador']]:
+                    ruta = ruta_export(args.directorio, plataforma, filas, encoding, delimitador, args.semilla, args.columnas_extra)
+                    etapas, bytes_json, bytes_df = medir_caso(ruta, plataforma, args.repeticiones, args.filas_pdf, args.motor_pdf)
+                    resultados.append({
+                        "plataforma": plataforma, "filas": filas, "encoding": encoding, "delimitador": delimitador,
+                        "columnas_extra": args.columnas_extra, "bytes_csv": os.path.getsize(ruta), "bytes_json": bytes_json,
+                        "bytes_df_leido": bytes_df, "etapas": etapas
+                    })
+                    print(f"{plataforma:<10} {filas:>9} {encoding:<9} {delimitador!r:<5} " +
+                          ' '.join(f"{e}={t:.4f}s" for e, t in etapas.items() if t is not None))
+    informe = {
+        "version": version_codigo(),
+        "fecha": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "entorno": {"python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+                    "maquina": platform.machine(), "cpus": os.cpu_count()},
+        "parametros": {"repeticiones": args.repeticiones, "semilla": args.semilla, "filas_pdf": args.filas_pdf,
+                       "motor_pdf": args.motor_pdf},
+        "resultados": resultados
+    }
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, ensure_ascii=False, indent=1)
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            comparar(informe, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
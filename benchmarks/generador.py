@@ -0,0 +1,154 @@
+"""
+Generador reproducible de exports sintéticos de campañas para cada plataforma de mapeo_columnas
+(Google Ads ES/EN, Facebook, TikTok, Pinterest y Meta ES), con su encoding, delimitador,
+formato numérico y líneas de preámbulo habituales, que se pueden cambiar.
+
+Uso (desde la carpeta que contiene gpt/):
+    python -m gpt.benchmarks.generador google_es 100000 /tmp/google_es.csv --encoding latin1 --delimitador puntoycoma
+"""
+import argparse
+import io
+import numpy as np
+import pandas as pd
+
+ENCODINGS = ['utf-8', 'utf-8-sig', 'latin1', 'utf-16']
+# Por nombre, para poder pasarlos desde la línea de comandos
+DELIMITADORES = {'coma': ',', 'puntoycoma': ';', 'tab': '\t'}
+TAMANOS = [1_000, 10_000, 100_000, 1_000_000, 5_000_000]
+FILAS_POR_BLOQUE = 250_000
+
+MESES = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre']
+
+# Columnas de cada export: (nombre en el CSV, métrica). Métricas: mes, campana, grupo, clics, impresiones, ctr,
+# cpc, gasto, conversiones, cpa, cvr, cpm. 'decimal' es el separador decimal y 'porcentaje' el sufijo de los %.
+PLATAFORMAS = {
+    'google_es': {
+        'columnas': [('Mes', 'mes'), ('Campaña', 'campana'), ('Clics', 'clics'), ('Impr.', 'impresiones'), ('CTR', 'ctr'),
+                     ('CPC medio', 'cpc'), ('Coste', 'gasto'), ('Conversiones', 'conversiones'), ('Coste/conv.', 'cpa'),
+                     ('Tasa de conv.', 'cvr')],
+        'encoding': 'utf-16', 'delimitador': '\t', 'decimal': ',', 'porcentaje': ' %',
+        'preambulo': ['Informe de campañas', 'Todo el tiempo'],
+    },
+    'google_en': {
+        'columnas': [('Campaign', 'campana'), ('Clicks', 'clics'), ('Impressions', 'impresiones'), ('Avg. CPC', 'cpc'),
+                     ('Cost', 'gasto'), ('All conversions', 'conversiones')],
+        'encoding': 'utf-8', 'delimitador': ',', 'decimal': '.', 'porcentaje': '%',
+        'preambulo': ['Campaign report', 'All time'],
+    },
+    'facebook': {
+        'columnas': [('Campaign name', 'campana'), ('Amount spent', 'gasto'), ('Link clicks', 'clics'), ('Results', 'conversiones'),
+                     ('Impressions', 'impresiones'), ('Cost per link click', 'cpc')],
+        'encoding': 'utf-8-sig', 'delimitador': ',', 'decimal': '.', 'porcentaje': '%',
+        'preambulo': [],
+    },
+    'tiktok': {
+        'columnas': [('Ad name', 'campana'), ('Total spend', 'gasto'), ('Website clicks', 'clics'), ('Reach', 'impresiones'),
+                     ('Click-through rate', 'ctr'), ('Cost per click', 'cpc'), ('Conversions', 'conversiones')],
+        'encoding': 'utf-8', 'delimitador': ',', 'decimal': '.', 'porcentaje': '%',
+        'preambulo': [],
+    },
+    'pinterest': {
+        'columnas': [('Campaign name', 'campana'), ('Spend', 'gasto'), ('Clicks', 'clics'), ('Conversions', 'conversiones'),
+                     ('Impressions', 'impresiones'), ('CPM', 'cpm')],
+        'encoding': 'utf-8', 'delimitador': ',', 'decimal': '.', 'porcentaje': '%',
+        'preambulo': [],
+    },
+    'meta_es': {
+        'columnas': [('Mes', 'mes'), ('Nombre del grupo publicitario', 'grupo'), ('Campaña de Performance', 'campana'),
+                     ('Gasto total', 'gasto'), ('Clics en el Pin', 'clics'), ('Resultado', 'conversiones'), ('CPM', 'cpm'),
+                     ('CTR', 'ctr')],
+        'encoding': 'latin1', 'delimitador': ';', 'decimal': ',', 'porcentaje': '%',
+        'preambulo': [],
+    },
+}
+
+
+def _bloque(plataforma, filas, rng, columnas_extra=0):
+    """
+    DataFrame con filas filas del export de plataforma, con los números ya formateados como texto,
+    y columnas_extra columnas que la aplicación no usa (los exports reales traen decenas).
+    """
+    config = PLATAFORMAS[plataforma]
+    decimal = config['decimal']
+    campana = rng.integers(0, 40, filas)
+    impresiones = rng.integers(100, 50_000, filas)
+    clics = rng.binomial(impresiones, rng.uniform(0.002, 0.05, filas))
+    conversiones = rng.binomial(clics, rng.uniform(0.0, 0.12, filas))
+    gasto = np.round(clics * rng.uniform(0.05, 2.5, filas), 2)
+    metricas = {
+        'mes': [f"{MESES[m % 12]} {2022 + m // 12}" for m in rng.integers(0, 36, filas)],
+        'campana': [f"Campaña {c}" for c in campana],
+        'grupo': [f"Grupo {c}-{g}" for c, g in zip(campana, rng.integers(0, 8, filas))],
+        'clics': clics,
+        'impresiones': impresiones,
+        'conversiones': conversiones,
+        'gasto': gasto,
+        'ctr': clics / impresiones * 100,
+        'cpc': gasto / np.maximum(clics, 1),
+        'cpa': gasto / np.maximum(conversiones, 1),
+        'cvr': conversiones / np.maximum(clics, 1) * 100,
+        'cpm': gasto / impresiones * 1000,
+    }
+    columnas = {}
+    for nombre, metrica in config['columnas']:
+        valores = metricas[metrica]
+        if metrica in ('ctr', 'cvr'):
+            valores = [f"{v:.2f}{config['porcentaje']}".replace('.', decimal) for v in valores]
+        elif isinstance(valores, np.ndarray) and valores.dtype.kind == 'f':
+            valores = [f"{v:.2f}".replace('.', decimal) for v in valores]
+        columnas[nombre] = valores
+    for i in range(columnas_extra):
+        columnas[f"Extra {i}"] = rng.integers(0, 10_000, filas) if i % 2 else rng.choice(['Activa', 'Pausada', 'Borrador'], filas)
+    return pd.DataFrame(columnas)
+
+
+def escribir_export(destino, plataforma, filas, semilla=0, encoding=None, delimitador=None, preambulo=None, columnas_extra=0):
+    """
+    Escribe en destino (ruta o archivo binario) un export de filas filas de plataforma, por bloques para que
+    la memoria no dependa del tamaño. encoding, delimitador y preambulo (lista de líneas) cambian los de la plataforma.
+    """
+    config = PLATAFORMAS[plataforma]
+    encoding = encoding or config['encoding']
+    delimitador = delimitador or config['delimitador']
+    preambulo = config['preambulo'] if preambulo is None else preambulo
+    rng = np.random.default_rng(semilla)
+    binario = open(destino, 'wb') if isinstance(destino, str) else destino
+    # Un único TextIOWrapper: el BOM de utf-16 y utf-8-sig se escribe una sola vez
+    texto = io.TextIOWrapper(binario, encoding=encoding, newline='')
+    try:
+        for linea in preambulo:
+            texto.write(linea + '\n')
+        for inicio in range(0, max(filas, 1), FILAS_POR_BLOQUE):
+            n = min(FILAS_POR_BLOQUE, filas - inicio)
+            _bloque(plataforma, n, rng, columnas_extra).to_csv(texto, sep=delimitador, index=False, header=inicio == 0, lineterminator='\n')
+        texto.flush()
+    finally:
+        texto.detach()
+        if isinstance(destino, str):
+            binario.close()
+
+
+def generar_export(plataforma, filas, semilla=0, encoding=None, delimitador=None, preambulo=None, columnas_extra=0):
+    """Como escribir_export, pero devuelve los bytes del CSV."""
+    salida = io.BytesIO()
+    escribir_export(salida, plataforma, filas, semilla, encoding, delimitador, preambulo, columnas_extra)
+    return salida.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('plataforma', choices=sorted(PLATAFORMAS))
+    parser.add_argument('filas', type=int)
+    parser.add_argument('destino')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--encoding', choices=ENCODINGS)
+    parser.add_argument('--delimitador', choices=DELIMITADORES)
+    parser.add_argument('--sin-preambulo', action='store_true')
+    parser.add_argument('--columnas-extra', type=int, default=0, help="columnas adicionales que la aplicación no usa")
+    args = parser.parse_args()
+    escribir_export(args.destino, args.plataforma, args.filas, args.semilla, args.encoding, DELIMITADORES.get(args.delimitador),
+                    [] if args.sin_preambulo else None, args.columnas_extra)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Mide el arranque en frío de la API: informe de `python -X importtime` de `import gpt.api` (total y módulos
+más lentos) y comprobación de que no importa pandas ni los demás módulos pesados, que se cargan en el
+calentamiento (components/arranque.py). Con --servidor lanza uvicorn y mide los segundos hasta que
+/salud/ responde (puerto abierto) y hasta que /listo/ da 200 (calentamiento terminado).
+Sale con código 1 si se importa un módulo pesado o se pasa de --presupuesto-ms, para usarlo en CI.
+
+Uso (desde la carpeta que contiene gpt/):
+    python -m gpt.benchmarks.tiempo_arranque
+    python -m gpt.benchmarks.tiempo_arranque --presupuesto-ms 800 --servidor --salida arranque.json
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+PAQUETE = __package__.split('.')[0] if __package__ else 'gpt'
+# Carpeta que contiene el paquete, desde la que se importa en los subprocesos
+RAIZ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Módulos que `import gpt.api` no debe importar
+MODULOS_PESADOS = ['pandas', 'numpy', 'pyarrow', 'reportlab', 'pdfkit']
+
+
+def importtime(codigo):
+    """
+    Líneas de `python -X importtime -c codigo` en un proceso nuevo como [(módulo, profundidad, µs propios, µs acumulados)],
+    en el orden en que terminan de importarse (cada módulo después de los que importa), y la salida estándar.
+    """
+    proceso = subprocess.run([sys.executable, '-X', 'importtime', '-c', codigo], cwd=RAIZ, capture_output=True,
+                             text=True, check=True)
+    lineas = []
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith('import time:') or 'cumulative' in linea:
+            continue
+        propio, acumulado, nombre = linea[len('import time:'):].split('|')
+        # Un espacio tras la barra y dos más por nivel de anidamiento
+        profundidad = (len(nombre) - len(nombre.lstrip()) - 1) // 2
+        lineas.append((nombre.strip(), profundidad, int(propio), int(acumulado)))
+    return lineas, proceso.stdout
+
+
+def informe_importacion(modulo, mas_lentos=15):
+    """Total en ms, módulos más lentos y módulos pesados importados por `import modulo` (sin lo que importa Python al arrancar)."""
+    base = {nombre for nombre, _, _, _ in importtime('pass')[0]}
+    # importtime también apunta los intentos fallidos (p. ej. pyarrow sin instalar): los importados se miran en sys.modules
+    lineas, salida = importtime(f'import sys, {modulo}; print(*sys.modules)')
+    lineas = [l for l in lineas if l[0] not in base]
+    total = sum(acumulado for _, profundidad, _, acumulado in lineas if profundidad == 0)
+    lentos = sorted(lineas, key=lambda l: l[3], reverse=True)[:mas_lentos]
+    importados = set(salida.split())
+    return {
+        "modulo": modulo,
+        "total_ms": round(total / 1000, 1),
+        "modulos": len(lineas),
+        "mas_lentos": [{"modulo": nombre, "acumulado_ms": round(acumulado / 1000, 1), "propio_ms": round(propio / 1000, 1)}
+                       for nombre, _, propio, acumulado in lentos],
+        "pesados_importados": [m for m in MODULOS_PESADOS if m in importados]
+    }
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _esperar(url, estado, inicio, limite):
+    # Segundos desde inicio hasta que url responde con estado, o None si pasa de limite
+    while time.perf_counter() - inicio < limite:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as respuesta:
+                if respuesta.status == estado:
+                    return round(time.perf_counter() - inicio, 3)
+        except urllib.error.HTTPError as e:
+            if e.code == estado:
+                return round(time.perf_counter() - inicio, 3)
+        except OSError:
+            pass
+        time.sleep(0.02)
+    return None
+
+
+def medir_servidor(limite=120):
+    """Segundos desde lanzar uvicorn hasta que /salud/ responde y hasta que /listo/ da 200, y el calentamiento."""
+    puerto = _puerto_libre()
+    base = f'http://127.0.0.1:{puerto}'
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen([sys.executable, '-m', 'uvicorn', f'{PAQUETE}.api:app', '--port', str(puerto)],
+                               cwd=RAIZ, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        salud = _esperar(base + '/salud/', 200, inicio, limite)
+        listo = _esperar(base + '/listo/', 200, inicio, limite)
+        with urllib.request.urlopen(base + '/salud/', timeout=5) as respuesta:
+            calentamiento = json.load(respuesta)['calentamiento']
+    finally:
+        proceso.terminate()
+        proceso.wait()
+    return {"salud_s": salud, "listo_s": listo, "calentamiento": calentamiento}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modulo', default=f'{PAQUETE}.api')
+    parser.add_argument('--presupuesto-ms', type=float, default=0, help="máximo de `import modulo` (0 sin límite)")
+    parser.add_argument('--mas-lentos', type=int, default=15)
+    parser.add_argument('--servidor', action='store_true', help="mide también el arranque de uvicorn y el calentamiento")
+    parser.add_argument('--salida', help="archivo JSON con los resultados")
+    args = parser.parse_args()
+    informe = {"importacion": informe_importacion(args.modulo, args.mas_lentos)}
+    importacion = informe["importacion"]
+    print(f"import {args.modulo}: {importacion['total_ms']} ms, {importacion['modulos']} módulos")
+    for m in importacion["mas_lentos"]:
+        print(f"  {m['acumulado_ms']:>8.1f} ms  {m['modulo']}")
+    if args.servidor:
+        informe["servidor"] = medir_servidor()
+        print(f"puerto abierto (/salud/): {informe['servidor']['salud_s']} s, listo (/listo/): {informe['servidor']['listo_s']} s")
+        print(f"calentamiento: {json.dumps(informe['servidor']['calentamiento'], ensure_ascii=False)}")
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, ensure_ascii=False, indent=1)
+    errores = []
+    if importacion["pesados_importados"]:
+        errores.append(f"import {args.modulo} importa {', '.join(importacion['pesados_importados'])}: deberían cargarse en el calentamiento")
+    if args.presupuesto_ms and importacion["total_ms"] > args.presupuesto_ms:
+        errores.append(f"import {args.modulo} tarda {importacion['total_ms']} ms, más que el presupuesto de {args.presupuesto_ms} ms")
+    for error in errores:
+        print("ERROR: " + error, file=sys.stderr)
+    sys.exit(1 if errores else 0)
+
+
+if __name__ == '__main__':
+    main()
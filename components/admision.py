@@ -0,0 +1,247 @@
+# Control de admisión de las subidas pesadas: tamaño máximo, concurrencia por endpoint y por plan y cola de espera acotada
+import asyncio
+import os
+import threading
+from fastapi.responses import JSONResponse
+from .autenticacion import AUTENTICACION_ACTIVA, verificador, token_de_cabeceras
+
+# Bytes máximos del cuerpo de una subida, contados mientras se recibe; 0 es ilimitado
+MAX_BYTES_SUBIDA = int(os.environ.get('OPTICAMP_MAX_SUBIDA', 512 * 1024 * 1024))
+# Peticiones que pueden esperar turno en cada endpoint y segundos que esperan como mucho antes del 429
+MAX_ESPERA = int(os.environ.get('OPTICAMP_ADMISION_COLA', 10))
+ESPERA_MAXIMA = float(os.environ.get('OPTICAMP_ADMISION_ESPERA', 30))
+# Por plan: bytes por subida (0 = el límite general) y subidas simultáneas por usuario (0 = sin límite propio)
+LIMITES_PLAN = {
+    'BASIC': {
+        'bytes': int(os.environ.get('OPTICAMP_MAX_SUBIDA_BASIC', 0)),
+        'simultaneas': int(os.environ.get('OPTICAMP_SIMULTANEAS_BASIC', 2)),
+    },
+    'PRO': {
+        'bytes': int(os.environ.get('OPTICAMP_MAX_SUBIDA_PRO', 0)),
+        'simultaneas': int(os.environ.get('OPTICAMP_SIMULTANEAS_PRO', 0)),
+    },
+}
+
+RESULTADOS = ('admitida', 'cola_llena', 'espera_agotada', 'limite_plan', 'demasiado_grande')
+
+
+class Compuerta:
+    """
+    Semáforo de un endpoint: hasta limite peticiones a la vez (0 es ilimitado) y como mucho max_espera
+    esperando turno, cada una durante espera_maxima segundos. entrar() devuelve None si la petición pasa
+    (y entonces hay que llamar a salir()) o el motivo del rechazo.
+    """
+
+    def __init__(self, limite, max_espera=MAX_ESPERA, espera_maxima=ESPERA_MAXIMA):
+        self.limite = limite
+        self.max_espera = max_espera
+        self.espera_maxima = espera_maxima
+        self.en_curso = 0
+        self.esperando = 0
+        self._semaforo = asyncio.Semaphore(limite) if limite else None
+
+    async def entrar(self):
+        if self._semaforo is None:
+            self.en_curso += 1
+            return None
+        if self._semaforo.locked() and self.esperando >= self.max_espera:
+            return 'cola_llena'
+        self.esperando += 1
+        try:
+            await asyncio.wait_for(self._semaforo.acquire(), self.espera_maxima)
+        except asyncio.TimeoutError:
+            return 'espera_agotada'
+        finally:
+            self.esperando -= 1
+        self.en_curso += 1
+        return None
+
+    def salir(self):
+        self.en_curso -= 1
+        if self._semaforo is not None:
+            self._semaforo.release()
+
+
+class ControlAdmision:
+    """
+    Estado compartido del control de admisión: una Compuerta por ruta (limites = {ruta: peticiones a la vez}),
+    las subidas en curso de cada usuario y los contadores por ruta y resultado de /metrics.
+    """
+
+    def __init__(self, limites, max_bytes=MAX_BYTES_SUBIDA, limites_plan=LIMITES_PLAN, max_espera=MAX_ESPERA, espera_maxima=ESPERA_MAXIMA):
+        self.compuertas = {ruta: Compuerta(limite, max_espera, espera_maxima) for ruta, limite in limites.items()}
+        self.max_bytes = max_bytes
+        self.limites_plan = limites_plan
+        self.espera_maxima = espera_maxima
+        self._por_usuario = {}
+        self._contadores = {}
+        self._lock = threading.Lock()
+
+    def anotar(self, ruta, resultado):
+        with self._lock:
+            clave = (ruta, resultado)
+            self._contadores[clave] = self._contadores.get(clave, 0) + 1
+
+    def max_bytes_plan(self, plan):
+        """Bytes máximos por subida para el plan (None sin usuario), o 0 si no hay límite."""
+        propio = self.limites_plan.get(plan, {}).get('bytes', 0) if plan else 0
+        if propio and self.max_bytes:
+            return min(propio, self.max_bytes)
+        return propio or self.max_bytes
+
+    def reservar_usuario(self, usuario, plan):
+        """Anota una subida en curso del usuario y devuelve True, o False si su plan no admite más a la vez."""
+        limite = self.limites_plan.get(plan, {}).get('simultaneas', 0)
+        with self._lock:
+            en_curso = self._por_usuario.get(usuario, 0)
+            if limite and en_curso >= limite:
+                return False
+            self._por_usuario[usuario] = en_curso + 1
+            return True
+
+    def liberar_usuario(self, usuario):
+        with self._lock:
+            restantes = self._por_usuario.get(usuario, 1) - 1
+            if restantes:
+                self._por_usuario[usuario] = restantes
+            else:
+                self._por_usuario.pop(usuario, None)
+
+    def estadisticas(self):
+        with self._lock:
+            contadores = dict(self._contadores)
+            usuarios = len(self._por_usuario)
+        return {
+            "max_bytes": self.max_bytes,
+            "usuarios_con_subidas": usuarios,
+            "rutas": {
+                ruta: {
+                    "limite": compuerta.limite,
+                    "en_curso": compuerta.en_curso,
+                    "esperando": compuerta.esperando,
+                    **{resultado: contadores.get((ruta, resultado), 0) for resultado in RESULTADOS}
+                }
+                for ruta, compuerta in self.compuertas.items()
+            }
+        }
+
+    def exponer(self):
+        """Contadores y ocupación en el formato de exposición de Prometheus (para /metrics)."""
+        lineas = [
+            "# HELP opticamp_admision_total Peticiones de subida por ruta y resultado del control de admisión",
+            "# TYPE opticamp_admision_total counter"
+        ]
+        with self._lock:
+            contadores = dict(self._contadores)
+        for ruta in self.compuertas:
+            for resultado in RESULTADOS:
+                lineas.append(f'opticamp_admision_total{{ruta="{ruta}",resultado="{resultado}"}} {contadores.get((ruta, resultado), 0)}')
+        for nombre, ayuda, atributo in [
+            ('opticamp_admision_en_curso', 'Subidas en curso por ruta', 'en_curso'),
+            ('opticamp_admision_esperando', 'Subidas esperando turno por ruta', 'esperando'),
+        ]:
+            lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} gauge"]
+            for ruta, compuerta in self.compuertas.items():
+                lineas.append(f'{nombre}{{ruta="{ruta}"}} {getattr(compuerta, atributo)}')
+        return '\n'.join(lineas) + '\n'
+
+
+def _rechazo(status, mensaje, reintentar=None):
+    cabeceras = {"Retry-After": str(max(1, int(reintentar)))} if reintentar is not None else None
+    return JSONResponse(content={"error": mensaje}, status_code=status, headers=cabeceras)
+
+
+class MiddlewareAdmision:
+    """
+    Middleware ASGI para los POST de las rutas de control: antes de leer el cuerpo comprueba Content-Length,
+    las subidas simultáneas del plan del usuario y la compuerta de la ruta (429 con Retry-After si está ocupada
+    y su cola llena, 503 si la espera se agota); después cuenta los bytes según llegan y corta la subida con 413 al pasar del máximo.
+    Va por fuera de ProteccionSubidas para que una petición rechazada aquí no gaste cuota; las que no traen
+    un token válido pasan sin más y ProteccionSubidas responde 401.
+    """
+
+    def __init__(self, app, control, verificador=verificador, autenticacion=AUTENTICACION_ACTIVA):
+        self.app = app
+        self.control = control
+        self.verificador = verificador
+        self.autenticacion = autenticacion
+
+    async def __call__(self, scope, receive, send):
+        ruta = scope.get('path')
+        if scope['type'] != 'http' or scope['method'] != 'POST' or ruta not in self.control.compuertas:
+            await self.app(scope, receive, send)
+            return
+        cabeceras = {k.decode('latin1').lower(): v.decode('latin1') for k, v in scope['headers']}
+        datos = None
+        if self.autenticacion:
+            datos = self.verificador.verificar(token_de_cabeceras(cabeceras))
+            if datos is None:
+                await self.app(scope, receive, send)
+                return
+        control = self.control
+        plan = datos['plan'] if datos else None
+        max_bytes = control.max_bytes_plan(plan)
+        try:
+            declarados = int(cabeceras.get('content-length', 0))
+        except ValueError:
+            declarados = 0
+        if max_bytes and declarados > max_bytes:
+            control.anotar(ruta, 'demasiado_grande')
+            await _rechazo(413, f"La subida supera el máximo de {max_bytes} bytes")(scope, receive, send)
+            return
+        if datos and not control.reservar_usuario(datos['usuario'], plan):
+            control.anotar(ruta, 'limite_plan')
+            await _rechazo(429, f"El plan {plan} no admite más subidas simultáneas: espera a que termine alguna", control.espera_maxima)(scope, receive, send)
+            return
+        try:
+            compuerta = control.compuertas[ruta]
+            motivo = await compuerta.entrar()
+            if motivo is not None:
+                control.anotar(ruta, motivo)
+                # Cola llena: 429 sin esperar; si ha esperado turno y el servidor sigue saturado, 503
+                status = 429 if motivo == 'cola_llena' else 503
+                await _rechazo(status, "Servidor ocupado con otras subidas: vuelve a intentarlo en unos segundos", control.espera_maxima)(scope, receive, send)
+                return
+            control.anotar(ruta, 'admitida')
+            try:
+                await self._admitida(scope, receive, send, ruta, max_bytes)
+            finally:
+                compuerta.salir()
+        finally:
+            if datos:
+                control.liberar_usuario(datos['usuario'])
+
+    async def _admitida(self, scope, receive, send, ruta, max_bytes):
+        recibidos = 0
+        excedido = False
+        iniciada = False
+
+        async def recibir():
+            nonlocal recibidos, excedido
+            if excedido:
+                return {'type': 'http.disconnect'}
+            mensaje = await receive()
+            if mensaje['type'] == 'http.request' and max_bytes:
+                recibidos += len(mensaje.get('body', b''))
+                if recibidos > max_bytes:
+                    # Para la aplicación el cliente se ha ido: deja de leer y su respuesta se sustituye por el 413
+                    excedido = True
+                    return {'type': 'http.disconnect'}
+            return mensaje
+
+        async def enviar(mensaje):
+            nonlocal iniciada
+            if excedido and not iniciada:
+                return
+            if mensaje['type'] == 'http.response.start':
+                iniciada = True
+            await send(mensaje)
+
+        try:
+            await self.app(scope, recibir, enviar)
+        except Exception:
+            if not excedido or iniciada:
+                raise
+        if excedido and not iniciada:
+            self.control.anotar(ruta, 'demasiado_grande')
+            await _rechazo(413, f"La subida supera el máximo de {max_bytes} bytes")(scope, receive, send)
@@ -0,0 +1,78 @@
+# Calentamiento al arrancar: importa en segundo plano los módulos pesados (pandas y el pipeline) y levanta el pool de procesos
+import asyncio
+import importlib
+import os
+import time
+
+# OPTICAMP_CALENTAR=0 no calienta nada al arrancar: cada módulo se importa en la primera petición que lo usa
+CALENTAR = os.environ.get('OPTICAMP_CALENTAR', '1') != '0'
+
+
+def importar_modulos(modulos):
+    """Importa modulos (nombres completos) y devuelve {módulo: segundos}; 0 si ya estaba importado."""
+    tiempos = {}
+    for modulo in modulos:
+        inicio = time.perf_counter()
+        importlib.import_module(modulo)
+        tiempos[modulo] = round(time.perf_counter() - inicio, 3)
+    return tiempos
+
+
+class Calentamiento:
+    """
+    Tarea de fondo que importa modulos en el pool de hilos y después en cada worker del pool de procesos
+    (que así queda creado), para que no lo pague la primera subida. iniciar() no espera a que termine:
+    el servidor abre el puerto y atiende mientras tanto. estado: pendiente -> calentando -> listo o error
+    ('desactivado' con activo=False).
+    """
+
+    def __init__(self, ejecutores, modulos, activo=CALENTAR):
+        self.ejecutores = ejecutores
+        self.modulos = list(modulos)
+        self.activo = activo
+        self.estado = 'pendiente' if activo else 'desactivado'
+        self.error = None
+        self.segundos = None
+        self.tiempos = {}
+        self._tarea = None
+
+    @property
+    def listo(self):
+        return self.estado in ('listo', 'desactivado')
+
+    def iniciar(self):
+        if self.activo and self._tarea is None:
+            self._tarea = asyncio.ensure_future(self._calentar())
+
+    async def _calentar(self):
+        self.estado = 'calentando'
+        inicio = time.perf_counter()
+        try:
+            self.tiempos = {"servidor": await self.ejecutores.en_hilo(importar_modulos, self.modulos)}
+            if self.ejecutores.usa_procesos:
+                # Una tarea por worker a la vez: el pool arranca todos sus procesos y cada uno importa lo suyo
+                workers = self.ejecutores.procesos.max_workers
+                tiempos = await asyncio.gather(*(self.ejecutores.en_proceso(importar_modulos, self.modulos) for _ in range(workers)))
+                self.tiempos["procesos"] = [round(sum(t.values()), 3) for t in tiempos]
+            self.estado = 'listo'
+        except Exception as e:
+            self.estado = 'error'
+            self.error = str(e)
+        finally:
+            self.segundos = round(time.perf_counter() - inicio, 3)
+
+    async def detener(self):
+        if self._tarea is not None and not self._tarea.done():
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+
+    def estadisticas(self):
+        return {
+            "estado": self.estado,
+            "segundos": self.segundos,
+            "tiempos": self.tiempos,
+            "error": self.error
+        }
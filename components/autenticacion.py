@@ -0,0 +1,111 @@
+# Autenticación por token y cuota de subidas por plan para los endpoints de FastAPI
+import os
+import threading
+import time
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from .tokens import VerificadorTokens
+
+# OPTICAMP_AUTH=0 desactiva la autenticación (solo para desarrollo local)
+AUTENTICACION_ACTIVA = os.environ.get('OPTICAMP_AUTH', '1') != '0'
+# Subidas por usuario y día según el plan; 0 es ilimitado
+CUOTAS_PLAN = {
+    'BASIC': int(os.environ.get('OPTICAMP_CUOTA_BASIC', 50)),
+    'PRO': int(os.environ.get('OPTICAMP_CUOTA_PRO', 0)),
+}
+
+verificador = VerificadorTokens()
+
+
+def token_de_cabeceras(cabeceras):
+    """Token de la cabecera 'Authorization: Bearer <token>' (cabeceras como dict o Headers)."""
+    valor = cabeceras.get('authorization', '')
+    esquema, _, token = valor.partition(' ')
+    return token.strip() if esquema.lower() == 'bearer' else None
+
+
+class CuotaSubidas:
+    """Cuenta las subidas de cada usuario en ventanas fijas de `ventana` segundos."""
+
+    def __init__(self, limites=CUOTAS_PLAN, ventana=86400, reloj=time.time):
+        self.limites = limites
+        self.ventana = ventana
+        self._reloj = reloj
+        self._periodo = None
+        self._usadas = {}
+        self._lock = threading.Lock()
+
+    def limite(self, plan):
+        return self.limites.get(plan, self.limites.get('BASIC', 0))
+
+    def consumir(self, usuario, plan):
+        """Anota una subida y devuelve True, o False si el usuario ya ha agotado la cuota de su plan."""
+        limite = self.limite(plan)
+        periodo = int(self._reloj() // self.ventana)
+        with self._lock:
+            if periodo != self._periodo:
+                self._periodo = periodo
+                self._usadas = {}
+            usadas = self._usadas.get(usuario, 0)
+            if limite and usadas >= limite:
+                return False
+            self._usadas[usuario] = usadas + 1
+            return True
+
+    def restantes(self, usuario, plan):
+        limite = self.limite(plan)
+        if not limite:
+            return None
+        with self._lock:
+            usadas = self._usadas.get(usuario, 0) if self._periodo == int(self._reloj() // self.ventana) else 0
+        return max(0, limite - usadas)
+
+
+cuota_subidas = CuotaSubidas()
+
+
+class ProteccionSubidas:
+    """
+    Middleware ASGI para los POST de subida: valida el token y descuenta la cuota antes de que el endpoint
+    lea el cuerpo, así una subida anónima o fuera de cuota se rechaza sin recibir el archivo.
+    Deja los datos del token en request.state.usuario.
+    """
+
+    def __init__(self, app, rutas, verificador=verificador, cuota=cuota_subidas, activa=AUTENTICACION_ACTIVA):
+        self.app = app
+        self.rutas = set(rutas)
+        self.verificador = verificador
+        self.cuota = cuota
+        self.activa = activa
+
+    async def __call__(self, scope, receive, send):
+        if not self.activa or scope['type'] != 'http' or scope['method'] != 'POST' or scope['path'] not in self.rutas:
+            await self.app(scope, receive, send)
+            return
+        cabeceras = {k.decode('latin1').lower(): v.decode('latin1') for k, v in scope['headers']}
+        datos = self.verificador.verificar(token_de_cabeceras(cabeceras))
+        if datos is None:
+            respuesta = JSONResponse(content={"error": "Token ausente, inválido o caducado"}, status_code=401, headers={"WWW-Authenticate": "Bearer"})
+        elif not self.cuota.consumir(datos["usuario"], datos["plan"]):
+            respuesta = JSONResponse(content={"error": f"Cuota diaria de subidas del plan {datos['plan']} agotada"}, status_code=429)
+        else:
+            scope.setdefault('state', {})['usuario'] = datos
+            await self.app(scope, receive, send)
+            return
+        await respuesta(scope, receive, send)
+
+
+def usuario_actual(request: Request):
+    """
+    Dependencia de FastAPI: datos del token ({"usuario", "plan", "exp"}) de la petición,
+    o None si la autenticación está desactivada. Lanza 401 si el token no es válido.
+    """
+    datos = getattr(request.state, 'usuario', None)
+    if datos is not None:
+        return datos
+    if not AUTENTICACION_ACTIVA:
+        return None
+    datos = verificador.verificar(token_de_cabeceras(request.headers))
+    if datos is None:
+        raise HTTPException(status_code=401, detail="Token ausente, inválido o caducado", headers={"WWW-Authenticate": "Bearer"})
+    return datos
@@ -0,0 +1,113 @@
+# Pools de ejecución para sacar del event loop el trabajo bloqueante o de CPU
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from ..logic.instrumentacion import activas, ejecutar_medido
+
+# Hilos para bcrypt, lectura de archivos y el subproceso de wkhtmltopdf
+HILOS = int(os.environ.get('OPTICAMP_HILOS', 8))
+# Procesos para los pipelines de pandas; 0 los ejecuta en el pool de hilos (p. ej. en instancias con poca RAM)
+PROCESOS = int(os.environ.get('OPTICAMP_PROCESOS', min(2, os.cpu_count() or 1)))
+
+
+def _contexto_procesos():
+    # fork con hilos vivos (uvicorn, pool de hilos) puede bloquear los hijos: se prefiere forkserver
+    metodos = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in metodos else 'spawn')
+
+
+class PoolEjecucion:
+    """
+    Envuelve un executor de concurrent.futures que se crea la primera vez que se usa.
+    Cuenta tareas enviadas, completadas y fallidas; las pendientes por encima de max_workers
+    son las que esperan en cola.
+    """
+
+    def __init__(self, nombre, max_workers, crear_executor):
+        self.nombre = nombre
+        self.max_workers = max_workers
+        self._crear_executor = crear_executor
+        self._executor = None
+        self.enviadas = 0
+        self.completadas = 0
+        self.fallidas = 0
+
+    def _obtener_executor(self):
+        if self._executor is None:
+            self._executor = self._crear_executor(self.max_workers)
+        return self._executor
+
+    async def ejecutar(self, funcion, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        self.enviadas += 1
+        mediciones = activas()
+        try:
+            if mediciones is None:
+                return await loop.run_in_executor(self._obtener_executor(), functools.partial(funcion, *args, **kwargs))
+            # El contexto de la petición no llega al hilo/proceso: las etapas medidas allí se traen de vuelta
+            resultado, datos = await loop.run_in_executor(self._obtener_executor(), functools.partial(ejecutar_medido, funcion, *args, **kwargs))
+            mediciones.fusionar(datos)
+            return resultado
+        except BrokenProcessPool:
+            # Un worker murió (p. ej. por OOM): se descarta el pool para que la siguiente tarea cree otro
+            self._executor = None
+            self.fallidas += 1
+            raise
+        except Exception:
+            self.fallidas += 1
+            raise
+        finally:
+            self.completadas += 1
+
+    def estadisticas(self):
+        pendientes = self.enviadas - self.completadas
+        return {
+            "max_workers": self.max_workers,
+            "en_curso": min(pendientes, self.max_workers),
+            "en_cola": max(0, pendientes - self.max_workers),
+            "enviadas": self.enviadas,
+            "completadas": self.completadas,
+            "fallidas": self.fallidas
+        }
+
+    def cerrar(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class Ejecutores:
+    """
+    Pool de hilos para E/S y bcrypt y pool de procesos para los pipelines de DataFrames.
+    Con procesos=0 todo va al pool de hilos y usa_procesos es False.
+    """
+
+    def __init__(self, hilos=HILOS, procesos=PROCESOS):
+        self.hilos = PoolEjecucion('hilos', hilos, lambda n: ThreadPoolExecutor(max_workers=n, thread_name_prefix='opticamp'))
+        self.procesos = PoolEjecucion('procesos', procesos, lambda n: ProcessPoolExecutor(max_workers=n, mp_context=_contexto_procesos())) if procesos > 0 else None
+
+    @property
+    def usa_procesos(self):
+        return self.procesos is not None
+
+    async def en_hilo(self, funcion, *args, **kwargs):
+        return await self.hilos.ejecutar(funcion, *args, **kwargs)
+
+    async def en_proceso(self, funcion, *args, **kwargs):
+        """Ejecuta en el pool de procesos (funcion y argumentos deben poder serializarse con pickle)."""
+        pool = self.procesos if self.procesos is not None else self.hilos
+        return await pool.ejecutar(funcion, *args, **kwargs)
+
+    def estadisticas(self):
+        return {
+            "hilos": self.hilos.estadisticas(),
+            "procesos": self.procesos.estadisticas() if self.procesos is not None else None
+        }
+
+    def cerrar(self):
+        self.hilos.cerrar()
+        if self.procesos is not None:
+            self.procesos.cerrar()
@@ -1,17 +1,16 @@
+import io
 import os
 import tempfile
+from functools import lru_cache
 from typing import Optional
+from ..logic.instrumentacion import etapa
 
-def exportar_dashboard_pdf(df_export, feedback_global: str, wkhtml_path: str, logo_path: Optional[str] = None):
-    """
-    Genera un PDF con la tabla de campañas (solo columnas clave y en orden).
-    Si se proporciona logo_path y existe, lo incluye en el PDF.
-    Devuelve (pdf_bytes, errores: list[str])
-    """
-    import pdfkit
-    errores = []
-    pdf_bytes = None
-    # --- Tabla solo con las columnas clave y en orden ---
+# Motores de PDF: 'wkhtmltopdf' (HTML renderizado por el ejecutable externo) o 'reportlab' (en proceso, sin dependencias externas)
+MOTORES_PDF = ('wkhtmltopdf', 'reportlab')
+MOTOR_PDF = os.environ.get('OPTICAMP_MOTOR_PDF', 'wkhtmltopdf')
+
+def _tabla_exportacion(df_export):
+    """Tabla solo con las columnas clave, en orden y con los nombres del PDF."""
     columnas_orden = [
         'Campaña', 'Gasto', 'Clics', 'Conversiones', 'CTR', 'CPC', 'CPA', 'Recomendación'
     ]
@@ -32,7 +31,29 @@ def exportar_dashboard_pdf(df_export, feedback_global: str, wkhtml_path: str, lo
         'Recomendación': 'Acción recomendada'
     }
     columnas_final = [col for col in columnas_orden if col in df_aux.columns]
-    df_aux = df_aux[columnas_final].rename(columns=renames)
+    return df_aux[columnas_final].rename(columns=renames)
+
+def exportar_dashboard_pdf(df_export, feedback_global: str, wkhtml_path: Optional[str] = None, logo_path: Optional[str] = None, motor: Optional[str] = None):
+    """
+    Genera un PDF con la tabla de campañas (solo columnas clave y en orden).
+    Si se proporciona logo_path y existe, lo incluye en el PDF.
+    motor elige entre 'wkhtmltopdf' (necesita wkhtml_path) y 'reportlab'; por defecto MOTOR_PDF.
+    Devuelve (pdf_bytes, errores: list[str])
+    """
+    motor = motor or MOTOR_PDF
+    if motor not in MOTORES_PDF:
+        return None, [f"❌ Motor de PDF desconocido: {motor}. Opciones: {', '.join(MOTORES_PDF)}"]
+    with etapa('pdf_tabla'):
+        df_aux = _tabla_exportacion(df_export)
+    with etapa('pdf_' + motor):
+        if motor == 'reportlab':
+            return _pdf_reportlab(df_aux, logo_path)
+        return _pdf_wkhtmltopdf(df_aux, wkhtml_path, logo_path)
+
+def _pdf_wkhtmltopdf(df_aux, wkhtml_path, logo_path):
+    import pdfkit
+    errores = []
+    pdf_bytes = None
     tabla_html = df_aux.to_html(index=False, border=0, classes='tabla-campanas', justify='center')
     # --- Logo opcional ---
     logo_html = ''
@@ -58,7 +79,7 @@ def exportar_dashboard_pdf(df_export, feedback_global: str, wkhtml_path: str, lo
     import uuid
     unique_id = uuid.uuid4().hex
     try:
-        if not os.path.isfile(wkhtml_path):
+        if not wkhtml_path or not os.path.isfile(wkhtml_path):
             errores.append(f"❌ No se encontró el ejecutable 'wkhtmltopdf.exe' en: {wkhtml_path}")
             raise FileNotFoundError(wkhtml_path)
         if not os.access(wkhtml_path, os.X_OK):
@@ -77,3 +98,77 @@ def exportar_dashboard_pdf(df_export, feedback_global: str, wkhtml_path: str, lo
     except Exception as e:
         errores.append(f"❌ Error al generar el PDF. Ruta ejecutable: {wkhtml_path}\n\n{str(e)}")
     return pdf_bytes, errores
+
+@lru_cache(maxsize=8)
+def _logo_reducido(logo_path, mtime, alto_px=180):
+    """
+    PNG del logo reducido a alto_px píxeles de alto (cuatro veces su tamaño en el PDF) y sus dimensiones.
+    Incrustar el original a resolución completa multiplica el tamaño y el tiempo de cada PDF.
+    mtime forma parte de la clave para que un logo nuevo invalide la caché.
+    """
+    from PIL import Image as ImagenPIL
+    with ImagenPIL.open(logo_path) as imagen:
+        if imagen.height > alto_px:
+            imagen = imagen.resize((max(1, round(imagen.width * alto_px / imagen.height)), alto_px), ImagenPIL.LANCZOS)
+        salida = io.BytesIO()
+        imagen.save(salida, format='PNG', optimize=True)
+        return salida.getvalue(), imagen.width, imagen.height
+
+def _celda_pdf(valor):
+    if isinstance(valor, float):
+        return '' if valor != valor else f"{valor:.2f}"
+    return '' if valor is None else str(valor)
+
+def _pdf_reportlab(df_aux, logo_path):
+    """
+    Dibuja el mismo documento que la plantilla HTML (logo, título y tabla) directamente en memoria con ReportLab,
+    sin archivos temporales ni procesos externos.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import mm
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Image, Spacer
+    from xml.sax.saxutils import escape
+    errores = []
+    pdf_bytes = None
+    try:
+        azul = colors.HexColor('#2563eb')
+        estilos = getSampleStyleSheet()
+        titulo = ParagraphStyle('TituloOpticamp', parent=estilos['Heading1'], textColor=azul)
+        celda = ParagraphStyle('CeldaOpticamp', parent=estilos['BodyText'], fontSize=8, leading=10, alignment=TA_CENTER)
+        cabecera = ParagraphStyle('CabeceraOpticamp', parent=celda, fontName='Helvetica-Bold', textColor=azul)
+        salida = io.BytesIO()
+        doc = SimpleDocTemplate(salida, pagesize=A4, leftMargin=12 * mm, rightMargin=12 * mm, topMargin=12 * mm, bottomMargin=12 * mm, title="Resumen de Campañas")
+        elementos = []
+        # --- Logo opcional (60 px de alto, como en la plantilla HTML) ---
+        if logo_path and os.path.isfile(logo_path):
+            logo, ancho, alto = _logo_reducido(logo_path, os.path.getmtime(logo_path))
+            elementos += [Image(io.BytesIO(logo), width=45 * ancho / alto, height=45, hAlign='LEFT'), Spacer(1, 16)]
+        elementos.append(Paragraph("Resumen de Campañas", titulo))
+        # Solo las columnas de texto van como Paragraph (para partir líneas); los números como texto plano, que es mucho más rápido
+        texto = {'Nombre campaña', 'Acción recomendada'}
+        filas = [[Paragraph(escape(str(col)), cabecera) for col in df_aux.columns]]
+        for registro in df_aux.itertuples(index=False):
+            filas.append([Paragraph(escape(_celda_pdf(v)), celda) if col in texto else _celda_pdf(v) for col, v in zip(df_aux.columns, registro)])
+        # Las columnas de texto reciben el doble de ancho que las numéricas
+        pesos = [2 if col in texto else 1 for col in df_aux.columns]
+        anchos = [doc.width * p / sum(pesos) for p in pesos] if pesos else None
+        tabla = Table(filas, colWidths=anchos, repeatRows=1)
+        tabla.setStyle(TableStyle([
+            ('GRID', (0, 0), (-1, -1), 0.75, colors.HexColor('#cbd5e1')),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e0e7ef')),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8fafc')),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ]))
+        elementos.append(tabla)
+        doc.build(elementos)
+        pdf_bytes = salida.getvalue()
+    except Exception as e:
+        errores.append(f"❌ Error al generar el PDF con ReportLab.\n\n{str(e)}")
+    return pdf_bytes, errores
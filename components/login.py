@@ -1,21 +1,9 @@
 import streamlit as st
-import json
-import os
-import bcrypt
-
-USUARIOS_PATH = os.path.join(os.path.dirname(__file__), 'usuarios.json')
-
-def cargar_usuarios():
-    if not os.path.isfile(USUARIOS_PATH):
-        return []
-    with open(USUARIOS_PATH, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-def verificar_password(password, password_hash):
-    try:
-        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
-    except Exception:
-        return False
+try:
+    from .usuarios import autenticar
+except ImportError:
+    # Página lanzada suelta con `streamlit run`: sin paquete, usuarios.py está en la misma carpeta (en sys.path)
+    from usuarios import autenticar
 
 def login_form():
     # Ocultar sidebar y menú Streamlit en la pantalla de login
@@ -140,9 +128,8 @@ def login_form():
         </div>
         """, unsafe_allow_html=True)
         if login_btn:
-            usuarios = cargar_usuarios()
-            user = next((u for u in usuarios if u['usuario'] == usuario), None)
-            if user and verificar_password(password, user['password_hash']):
+            user = autenticar(usuario, password)
+            if user:
                 st.session_state['usuario_autenticado'] = True
                 st.session_state['usuario_nombre'] = usuario
                 st.session_state['usuario_plan'] = user.get('plan', 'BASIC')
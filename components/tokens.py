@@ -0,0 +1,81 @@
+# Tokens de sesión firmados con HMAC: no necesitan estado en el servidor ni consultar usuarios ni bcrypt
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Sin OPTICAMP_SECRETO se usa un secreto aleatorio: los tokens dejan de valer al reiniciar
+# y no sirven entre varios workers, así que en producción hay que definirlo
+SECRETO = os.environ.get('OPTICAMP_SECRETO', '').encode('utf-8') or os.urandom(32)
+TOKEN_TTL = int(os.environ.get('OPTICAMP_TOKEN_TTL', 12 * 3600))
+MAX_TOKENS_VERIFICADOS = 4096
+
+
+def _b64(datos):
+    return base64.urlsafe_b64encode(datos).rstrip(b'=').decode('ascii')
+
+
+def _desde_b64(texto):
+    return base64.urlsafe_b64decode(texto + '=' * (-len(texto) % 4))
+
+
+def _firma(carga, secreto):
+    return hmac.new(secreto, carga.encode('ascii'), hashlib.sha256).digest()
+
+
+def emitir_token(usuario, plan, ttl=TOKEN_TTL, secreto=SECRETO, ahora=None):
+    """Token '<carga>.<firma>' con el usuario, el plan y la caducidad (epoch en segundos) en la carga."""
+    ahora = time.time() if ahora is None else ahora
+    carga = _b64(json.dumps({"usuario": usuario, "plan": plan, "exp": int(ahora + ttl)}, separators=(',', ':')).encode('utf-8'))
+    return f"{carga}.{_b64(_firma(carga, secreto))}"
+
+
+class VerificadorTokens:
+    """
+    Comprueba la firma (en tiempo constante) y la caducidad de los tokens de emitir_token.
+    Guarda en una LRU los tokens ya verificados para que las peticiones siguientes no recalculen el HMAC;
+    la caducidad se comprueba siempre.
+    """
+
+    def __init__(self, secreto=SECRETO, max_tokens=MAX_TOKENS_VERIFICADOS, reloj=time.time):
+        self.secreto = secreto
+        self.max_tokens = max_tokens
+        self._reloj = reloj
+        self._verificados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def verificar(self, token):
+        """Devuelve {"usuario", "plan", "exp"} si el token es válido y no ha caducado, o None."""
+        if not token:
+            return None
+        with self._lock:
+            datos = self._verificados.get(token)
+            if datos is not None:
+                self._verificados.move_to_end(token)
+        if datos is None:
+            datos = self._verificar_firma(token)
+            if datos is None:
+                return None
+            with self._lock:
+                self._verificados[token] = datos
+                if len(self._verificados) > self.max_tokens:
+                    self._verificados.popitem(last=False)
+        if datos["exp"] <= self._reloj():
+            return None
+        return datos
+
+    def _verificar_firma(self, token):
+        carga, _, firma = token.partition('.')
+        try:
+            if not hmac.compare_digest(_desde_b64(firma), _firma(carga, self.secreto)):
+                return None
+            datos = json.loads(_desde_b64(carga))
+        except (ValueError, UnicodeError):
+            return None
+        if not isinstance(datos, dict) or not {"usuario", "plan", "exp"} <= datos.keys():
+            return None
+        return datos
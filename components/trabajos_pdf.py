@@ -0,0 +1,176 @@
+# Cola local de trabajos de PDF en segundo plano, sin broker externo
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+MAX_TRABAJADORES_PDF = int(os.environ.get('OPTICAMP_PDF_TRABAJADORES', 2))
+MAX_COLA_PDF = int(os.environ.get('OPTICAMP_PDF_MAX_COLA', 20))
+TIMEOUT_PDF = float(os.environ.get('OPTICAMP_PDF_TIMEOUT', 300))
+# Segundos que se conservan los PDF terminados (y los errores) antes de borrarlos
+TTL_PDF = float(os.environ.get('OPTICAMP_PDF_TTL', 3600))
+
+ESTADOS_FINALES = ('completado', 'error')
+
+
+class ColaLlena(Exception):
+    pass
+
+
+class TrabajoPDF:
+    """Estado de un trabajo: en_cola -> procesando (con su etapa) -> completado o error."""
+
+    def __init__(self, directorio, nombre_archivo, motor, usuario=None):
+        self.id = uuid.uuid4().hex
+        self.usuario = usuario
+        self.directorio = directorio
+        self.nombre_archivo = nombre_archivo
+        self.motor = motor
+        self.estado = 'en_cola'
+        self.etapa = None
+        self.progreso = 0
+        self.error = None
+        self.creado = time.time()
+        self.terminado = None
+
+    @property
+    def ruta_csv(self):
+        return os.path.join(self.directorio, 'entrada.csv')
+
+    @property
+    def ruta_pdf(self):
+        return os.path.join(self.directorio, 'dashboard.pdf')
+
+    def avanzar(self, etapa, progreso):
+        self.etapa = etapa
+        self.progreso = progreso
+
+    def a_dict(self):
+        return {
+            "id": self.id,
+            "estado": self.estado,
+            "etapa": self.etapa,
+            "progreso": self.progreso,
+            "motor": self.motor,
+            "error": self.error,
+            "creado": self.creado,
+            "terminado": self.terminado
+        }
+
+
+class ColaTrabajosPDF:
+    """
+    Cola acotada de trabajos atendida por max_trabajadores tareas asyncio. procesar(trabajo) es una corrutina
+    que lee trabajo.ruta_csv y devuelve los bytes del PDF; cada trabajo tiene timeout segundos como máximo.
+    Los trabajos terminados y sus archivos se borran ttl segundos después de terminar.
+    Las tareas arrancan con el primer trabajo (o con iniciar()) y se paran con detener().
+    """
+
+    def __init__(self, procesar, max_trabajadores=MAX_TRABAJADORES_PDF, max_cola=MAX_COLA_PDF, timeout=TIMEOUT_PDF, ttl=TTL_PDF, directorio=None):
+        self.procesar = procesar
+        self.max_trabajadores = max_trabajadores
+        self.max_cola = max_cola
+        self.timeout = timeout
+        self.ttl = ttl
+        self.directorio = directorio
+        self._trabajos = {}
+        self._cola = None
+        self._tareas = []
+
+    def iniciar(self):
+        if self._tareas:
+            return
+        if self.directorio is None:
+            self.directorio = tempfile.mkdtemp(prefix='opticamp_pdf_')
+        self._cola = asyncio.Queue(maxsize=self.max_cola)
+        self._tareas = [asyncio.create_task(self._trabajador()) for _ in range(self.max_trabajadores)]
+        self._tareas.append(asyncio.create_task(self._limpiador()))
+
+    async def detener(self):
+        for tarea in self._tareas:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        self._tareas = []
+        if self.directorio is not None:
+            shutil.rmtree(self.directorio, ignore_errors=True)
+            self.directorio = None
+        self._trabajos.clear()
+
+    def crear(self, nombre_archivo, motor, usuario=None):
+        """
+        Reserva un trabajo con su directorio para que quien llama escriba la entrada en trabajo.ruta_csv
+        antes de encolarlo. Lanza ColaLlena si ya hay max_cola trabajos esperando.
+        """
+        self.iniciar()
+        if self._cola.full():
+            raise ColaLlena(f"Hay {self.max_cola} trabajos de PDF en cola")
+        directorio = tempfile.mkdtemp(dir=self.directorio)
+        trabajo = TrabajoPDF(directorio, nombre_archivo, motor, usuario)
+        self._trabajos[trabajo.id] = trabajo
+        return trabajo
+
+    def encolar(self, trabajo):
+        try:
+            self._cola.put_nowait(trabajo)
+        except asyncio.QueueFull:
+            self._borrar(trabajo)
+            raise ColaLlena(f"Hay {self.max_cola} trabajos de PDF en cola")
+
+    def descartar(self, trabajo):
+        self._borrar(trabajo)
+
+    def obtener(self, id_trabajo):
+        return self._trabajos.get(id_trabajo)
+
+    async def _trabajador(self):
+        while True:
+            trabajo = await self._cola.get()
+            try:
+                trabajo.estado = 'procesando'
+                pdf_bytes = await asyncio.wait_for(self.procesar(trabajo), self.timeout)
+                with open(trabajo.ruta_pdf, 'wb') as f:
+                    f.write(pdf_bytes)
+                trabajo.estado = 'completado'
+                trabajo.avanzar(None, 100)
+            except asyncio.TimeoutError:
+                # La tarea de un executor no se puede interrumpir: termina en segundo plano y su resultado se descarta
+                trabajo.estado = 'error'
+                trabajo.error = f"Tiempo máximo de {self.timeout:g} s superado"
+            except Exception as e:
+                trabajo.estado = 'error'
+                trabajo.error = str(e)
+            finally:
+                trabajo.terminado = time.time()
+                if os.path.exists(trabajo.ruta_csv):
+                    os.remove(trabajo.ruta_csv)
+                self._cola.task_done()
+
+    async def _limpiador(self):
+        while True:
+            await asyncio.sleep(min(self.ttl, 60))
+            self.limpiar_caducados()
+
+    def limpiar_caducados(self, ahora=None):
+        ahora = time.time() if ahora is None else ahora
+        for trabajo in list(self._trabajos.values()):
+            if trabajo.estado in ESTADOS_FINALES and trabajo.terminado + self.ttl < ahora:
+                self._borrar(trabajo)
+
+    def _borrar(self, trabajo):
+        self._trabajos.pop(trabajo.id, None)
+        shutil.rmtree(trabajo.directorio, ignore_errors=True)
+
+    def estadisticas(self):
+        estados = {}
+        for trabajo in self._trabajos.values():
+            estados[trabajo.estado] = estados.get(trabajo.estado, 0) + 1
+        return {
+            "max_trabajadores": self.max_trabajadores,
+            "max_cola": self.max_cola,
+            "timeout": self.timeout,
+            "ttl": self.ttl,
+            "en_cola": self._cola.qsize() if self._cola is not None else 0,
+            "trabajos": estados
+        }
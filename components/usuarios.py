@@ -0,0 +1,133 @@
+# Almacén de usuarios compartido por la API (/login/) y el login de Streamlit
+import json
+import os
+import sqlite3
+import threading
+import bcrypt
+
+USUARIOS_PATH = os.path.join(os.path.dirname(__file__), 'usuarios.json')
+# Ruta al JSON de usuarios o 'sqlite:///ruta.db' para usar la base de datos SQLite
+ALMACEN_USUARIOS = os.environ.get('OPTICAMP_USUARIOS', USUARIOS_PATH)
+
+
+class UsuariosJSON:
+    """
+    Usuarios de un archivo JSON (lista de {"usuario", "password_hash", "plan"}) indexados por nombre en un dict.
+    Solo se vuelve a leer el archivo cuando cambian su mtime o su tamaño; si no se puede leer (corrupto o
+    a medio escribir) se siguen usando los usuarios leídos antes. Sin archivo no hay usuarios.
+    """
+
+    def __init__(self, ruta=USUARIOS_PATH):
+        self.ruta = ruta
+        self._indice = {}
+        self._firma = None
+        self._lock = threading.Lock()
+
+    def _actualizar(self):
+        try:
+            estado = os.stat(self.ruta)
+            firma = (estado.st_mtime_ns, estado.st_size)
+        except FileNotFoundError:
+            firma = None
+        if firma == self._firma:
+            return
+        with self._lock:
+            if firma == self._firma:
+                return
+            usuarios = []
+            try:
+                if firma is not None:
+                    with open(self.ruta, 'r', encoding='utf-8') as f:
+                        usuarios = json.load(f)
+                indice = {u['usuario']: u for u in usuarios}
+            except (OSError, ValueError, KeyError, TypeError):
+                # Archivo corrupto o a medio escribir: se sigue con los usuarios anteriores y se relee en la siguiente llamada
+                return
+            self._indice = indice
+            self._firma = firma
+
+    def obtener(self, usuario):
+        self._actualizar()
+        return self._indice.get(usuario)
+
+    def todos(self):
+        self._actualizar()
+        return list(self._indice.values())
+
+
+class UsuariosSQLite:
+    """
+    Usuarios en una tabla SQLite con el nombre como clave primaria, para crecer más allá de un JSON.
+    Cada hilo usa su propia conexión.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        with self._conexion() as conexion:
+            conexion.execute("CREATE TABLE IF NOT EXISTS usuarios (usuario TEXT PRIMARY KEY, password_hash TEXT NOT NULL, plan TEXT NOT NULL DEFAULT 'BASIC')")
+
+    def _conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta)
+            conexion.row_factory = sqlite3.Row
+            self._local.conexion = conexion
+        return conexion
+
+    def obtener(self, usuario):
+        fila = self._conexion().execute("SELECT usuario, password_hash, plan FROM usuarios WHERE usuario = ?", (usuario,)).fetchone()
+        return dict(fila) if fila is not None else None
+
+    def todos(self):
+        return [dict(fila) for fila in self._conexion().execute("SELECT usuario, password_hash, plan FROM usuarios")]
+
+    def guardar(self, usuario, password_hash, plan='BASIC'):
+        with self._conexion() as conexion:
+            conexion.execute("INSERT OR REPLACE INTO usuarios (usuario, password_hash, plan) VALUES (?, ?, ?)", (usuario, password_hash, plan))
+
+    def importar_json(self, ruta=USUARIOS_PATH):
+        """Copia (o actualiza) los usuarios de un JSON en la tabla. Devuelve cuántos se han importado."""
+        usuarios = UsuariosJSON(ruta).todos()
+        with self._conexion() as conexion:
+            conexion.executemany(
+                "INSERT OR REPLACE INTO usuarios (usuario, password_hash, plan) VALUES (?, ?, ?)",
+                [(u['usuario'], u['password_hash'], u.get('plan', 'BASIC')) for u in usuarios]
+            )
+        return len(usuarios)
+
+
+def crear_almacen(origen=None):
+    origen = origen or ALMACEN_USUARIOS
+    if origen.startswith('sqlite:///'):
+        return UsuariosSQLite(origen[len('sqlite:///'):])
+    return UsuariosJSON(origen)
+
+
+_almacen = None
+
+def almacen_usuarios():
+    """Almacén compartido del proceso, creado la primera vez que se usa."""
+    global _almacen
+    if _almacen is None:
+        _almacen = crear_almacen()
+    return _almacen
+
+
+def cargar_usuarios():
+    return almacen_usuarios().todos()
+
+
+def verificar_password(password, password_hash):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    except Exception:
+        return False
+
+
+def autenticar(usuario, password, almacen=None):
+    """Devuelve el usuario ({"usuario", "password_hash", "plan"}) si la contraseña es correcta, o None."""
+    user = (almacen or almacen_usuarios()).obtener(usuario)
+    if user is None or not verificar_password(password, user['password_hash']):
+        return None
+    return user
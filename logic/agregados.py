@@ -0,0 +1,208 @@
+# Agregación de KPIs globales y por campaña en una sola pasada sobre las filas
+import numpy as np
+import pandas as pd
+
+
+def _especificacion(df):
+    # Sumas y conteos que bastan para recomponer todos los KPIs a cualquier nivel
+    especificacion = {}
+    if 'Gasto' in df.columns:
+        especificacion['gasto'] = ('Gasto', 'sum')
+    if 'Conversiones' in df.columns:
+        especificacion['conversiones'] = ('Conversiones', 'sum')
+    if 'CTR' in df.columns:
+        especificacion['ctr_suma'] = ('CTR', 'sum')
+        especificacion['ctr_n'] = ('CTR', 'count')
+    return especificacion
+
+
+def _metricas_float64(df, especificacion):
+    # Las métricas float32 de un df compactado se suman en float64: en float32 el total pierde precisión con muchas filas
+    reducidas = {col for col, _ in especificacion.values() if df[col].dtype == 'float32'}
+    if not reducidas:
+        return df
+    return df.assign(**{col: df[col].astype('float64') for col in reducidas})
+
+
+def _kpis(totales):
+    """KPIs a partir de una fila de sumas (gasto, conversiones, ctr_suma, ctr_n)."""
+    gasto = totales.get('gasto')
+    conversiones = totales.get('conversiones')
+    ctr = None
+    if 'ctr_suma' in totales:
+        ctr = float(totales['ctr_suma'] / totales['ctr_n']) if totales['ctr_n'] else float('nan')
+    return {
+        "gasto": float(gasto) if gasto is not None else None,
+        "conversiones": int(conversiones) if conversiones is not None else None,
+        "ctr": ctr,
+        "cpa": float(gasto / conversiones) if gasto is not None and conversiones is not None and conversiones > 0 else None
+    }
+
+
+def agregar_filas(df):
+    """
+    Agregado de las filas de df (o de un bloque de filas) por (Campaña, Mes) con las sumas de _especificacion
+    y la primera recomendación de cada grupo. Sin esas columnas devuelve una única fila con los totales.
+    """
+    especificacion = _especificacion(df)
+    df = _metricas_float64(df, especificacion)
+    claves = [col for col in ['Campaña', 'Mes'] if col in df.columns]
+    if 'Campaña' in claves and 'Recomendación' in df.columns:
+        especificacion['recomendacion'] = ('Recomendación', 'first')
+    if claves:
+        return df.groupby(claves, sort=False, dropna=False, observed=True).agg(**especificacion)
+    return pd.DataFrame([{nombre: df[col].agg(func) for nombre, (col, func) in especificacion.items()}])
+
+
+def _claves(agregado):
+    return [nombre for nombre in agregado.index.names if nombre is not None]
+
+
+def _funciones(agregado):
+    return {nombre: 'first' if nombre == 'recomendacion' else 'sum' for nombre in agregado.columns}
+
+
+def reducir_claves(agregado, claves):
+    """Suma un agregado de agregar_filas sobre los niveles que no están en claves (sin claves, una fila de totales)."""
+    if _claves(agregado) == claves:
+        return agregado
+    if not claves:
+        return pd.DataFrame([agregado.drop(columns='recomendacion', errors='ignore').sum().to_dict()])
+    return agregado.groupby(level=claves, sort=False, dropna=False, observed=True).agg(_funciones(agregado))
+
+
+def combinar_agregados(agregados):
+    """
+    Combina agregados parciales de agregar_filas (p. ej. de bloques consecutivos de un mismo archivo)
+    en uno solo, conservando el orden de aparición de los grupos. Si no todos tienen las mismas claves
+    (archivos de plataformas distintas), se combinan al nivel de las claves comunes.
+    """
+    if len(agregados) == 1:
+        return agregados[0]
+    claves = [clave for clave in _claves(agregados[0]) if all(clave in _claves(a) for a in agregados[1:])]
+    agregados = [reducir_claves(a, claves) for a in agregados]
+    # Solo se suman las métricas que tienen todos los agregados
+    columnas = [col for col in agregados[0].columns if all(col in a.columns for a in agregados[1:])]
+    juntos = pd.concat([a[columnas] for a in agregados])
+    if not claves:
+        return pd.DataFrame([juntos.drop(columns='recomendacion', errors='ignore').sum().to_dict()])
+    return juntos.groupby(level=claves, sort=False, dropna=False, observed=True).agg(_funciones(juntos))
+
+
+def _kpis_columnas(sumas):
+    """Versión por columnas de _kpis: un array por KPI con un valor por fila de sumas (NaN donde _kpis da None o NaN)."""
+    gasto = sumas['gasto'].to_numpy(dtype='float64') if 'gasto' in sumas.columns else None
+    conversiones = sumas['conversiones'].to_numpy(dtype='float64') if 'conversiones' in sumas.columns else None
+    ctr = cpa = None
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if 'ctr_suma' in sumas.columns:
+            n = sumas['ctr_n'].to_numpy(dtype='float64')
+            ctr = np.where(n > 0, sumas['ctr_suma'].to_numpy(dtype='float64') / n, np.nan)
+        if gasto is not None and conversiones is not None:
+            cpa = np.where(conversiones > 0, gasto / conversiones, np.nan)
+    return {
+        "gasto": gasto,
+        "conversiones": conversiones.astype('int64') if conversiones is not None else None,
+        "ctr": ctr,
+        "cpa": cpa
+    }
+
+
+def _campanas_columnas(agregado, claves, sumas):
+    # KPIs, feedback y series mensuales de todas las campañas (ordenadas por nombre) como arrays, sin recorrer fila a fila
+    por_campana = agregado[sumas].groupby(level='Campaña', sort=True).sum()
+    nombres = por_campana.index
+    feedback = [""] * len(nombres)
+    if 'recomendacion' in agregado.columns:
+        feedback = agregado['recomendacion'].groupby(level='Campaña', sort=True).first().reindex(nombres).tolist()
+    graficas = None
+    if 'Mes' in claves and 'gasto' in agregado.columns:
+        # Los pares (campaña, mes) de cada campaña, juntos y en orden de aparición
+        codigos = nombres.get_indexer(agregado.index.get_level_values('Campaña'))
+        orden = np.argsort(codigos, kind='stable')
+        limites = np.searchsorted(codigos[orden], np.arange(len(nombres) + 1))
+        meses = agregado.index.get_level_values('Mes').to_numpy()[orden]
+        gastos = agregado['gasto'].to_numpy(dtype='float64')[orden]
+        graficas = {
+            "labels": [meses[limites[i]:limites[i + 1]].tolist() for i in range(len(nombres))],
+            "gasto": [gastos[limites[i]:limites[i + 1]] for i in range(len(nombres))]
+        }
+    return {"nombre": nombres.tolist(), "kpis": _kpis_columnas(por_campana), "feedback": feedback, "grafica": graficas}
+
+
+def _campanas_filas(columnas):
+    # Lista de campañas de la respuesta (un dict por campaña) a partir de _campanas_columnas
+    kpis = {}
+    for nombre, valores in columnas["kpis"].items():
+        kpis[nombre] = valores.tolist() if valores is not None else [None] * len(columnas["nombre"])
+    # Como en _kpis: sin conversiones el CPA es None, no NaN
+    kpis["cpa"] = [None if cpa != cpa else cpa for cpa in kpis["cpa"]]
+    graficas = columnas["grafica"]
+    campanas = []
+    for i, nombre in enumerate(columnas["nombre"]):
+        campanas.append({
+            "nombre": nombre,
+            "kpis": {kpi: valores[i] for kpi, valores in kpis.items()},
+            "feedback": columnas["feedback"][i],
+            "grafica": {"labels": graficas["labels"][i], "gasto": graficas["gasto"][i].tolist()} if graficas else None
+        })
+    return campanas
+
+
+def resumir_agregado(agregado, formato='filas'):
+    """
+    KPIs globales y por campaña y series de gasto mensual a partir de un agregado de agregar_filas.
+    Los niveles superiores se obtienen sumando el agregado, no volviendo a recorrer las filas.
+    Con formato='columnas' las campañas van como un array por campo (ver _campanas_columnas) en lugar de una lista.
+    """
+    claves = _claves(agregado)
+    sumas = [nombre for nombre in agregado.columns if nombre != 'recomendacion']
+    kpis_globales = _kpis(agregado[sumas].sum().to_dict())
+    grafica_global = None
+    if 'Mes' in claves and 'gasto' in agregado.columns:
+        por_mes = agregado['gasto'].groupby(level='Mes', sort=False, dropna=False).sum()
+        grafica_global = {"labels": por_mes.index.tolist(), "gasto": por_mes.to_numpy(dtype='float64')}
+        if formato == 'filas':
+            grafica_global["gasto"] = grafica_global["gasto"].tolist()
+    campanas = [] if formato == 'filas' else None
+    if 'Campaña' in claves:
+        campanas = _campanas_columnas(agregado, claves, sumas)
+        if formato == 'filas':
+            campanas = _campanas_filas(campanas)
+    return kpis_globales, grafica_global, campanas
+
+
+class AgregadorCampanas:
+    """
+    Versión incremental de agregar_campanas: acumula los agregados de cada bloque con anadir()
+    y los compacta cada max_parciales bloques, así la memoria depende del número de grupos
+    (campaña, mes) y no del número de filas.
+    """
+
+    def __init__(self, max_parciales=32):
+        self.max_parciales = max_parciales
+        self._parciales = []
+
+    def anadir(self, bloque):
+        self._parciales.append(agregar_filas(bloque))
+        if len(self._parciales) >= self.max_parciales:
+            self._parciales = [combinar_agregados(self._parciales)]
+
+    def agregado(self):
+        self._parciales = [combinar_agregados(self._parciales)]
+        return self._parciales[0]
+
+    def resultado(self, formato='filas'):
+        """Devuelve (kpis_globales, grafica_global, campanas) como agregar_campanas."""
+        return resumir_agregado(self.agregado(), formato)
+
+
+def agregar_campanas(df):
+    """
+    Calcula con un único groupby(['Campaña', 'Mes']) los KPIs globales y por campaña
+    (gasto, conversiones, CTR medio y CPA) y las series de gasto mensual.
+    Devuelve (kpis_globales, grafica_global, campanas) con la forma de la respuesta de /analizar/
+    (los KPIs con las claves gasto, conversiones, ctr y cpa): las campañas van ordenadas por nombre
+    y los meses en orden de aparición.
+    """
+    return resumir_agregado(agregar_filas(df))
@@ -0,0 +1,107 @@
+# Caché en memoria de resultados, indexada por el contenido del archivo subido
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Cambiar al modificar el pipeline (lectura, normalización, reglas, agregación o PDF) para invalidar lo cacheado
+VERSION_PIPELINE = '3'
+CACHE_MAX_BYTES = int(os.environ.get('OPTICAMP_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+CACHE_TTL = float(os.environ.get('OPTICAMP_CACHE_TTL', 3600))
+# DataFrames procesados que se consultan por páginas con /datasets/ (ver api.py)
+DATASETS_MAX_BYTES = int(os.environ.get('OPTICAMP_DATASETS_MAX_BYTES', 512 * 1024 * 1024))
+DATASETS_TTL = float(os.environ.get('OPTICAMP_DATASETS_TTL', 1800))
+
+
+def huella_contenido(archivo, version=VERSION_PIPELINE, bloque=1024 * 1024):
+    """
+    Hash del contenido de un archivo binario junto con la versión del pipeline.
+    Lee desde la posición actual y deja el archivo donde estaba.
+    """
+    inicio = archivo.tell()
+    h = hashlib.blake2b(digest_size=20)
+    h.update(version.encode('utf-8') + b'\0')
+    for trozo in iter(lambda: archivo.read(bloque), b''):
+        h.update(trozo)
+    archivo.seek(inicio)
+    return h.hexdigest()
+
+
+def tamano_aproximado(valor):
+    if isinstance(valor, (bytes, bytearray)):
+        return len(valor)
+    if hasattr(valor, 'memory_usage'):
+        return int(valor.memory_usage(deep=True).sum())
+    return sys.getsizeof(valor)
+
+
+class CacheResultados:
+    """
+    LRU acotada por bytes y con caducidad. Cada entrada se identifica por (huella, tipo),
+    p. ej. (huella, 'df'), (huella, 'analizar') o (huella, 'pdf-reportlab').
+    Los valores se devuelven tal cual: quien los use no debe modificarlos.
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL, reloj=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._reloj = reloj
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def obtener(self, huella, tipo):
+        clave = (huella, tipo)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[2] < self._reloj():
+                self._quitar(clave)
+                entrada = None
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[0]
+
+    def guardar(self, huella, tipo, valor, tamano=None):
+        """Guarda valor y devuelve True, o False si por sí solo ya supera max_bytes."""
+        tamano = tamano_aproximado(valor) if tamano is None else tamano
+        if tamano > self.max_bytes:
+            return False
+        clave = (huella, tipo)
+        with self._lock:
+            if clave in self._entradas:
+                self._quitar(clave)
+            self._entradas[clave] = (valor, tamano, self._reloj() + self.ttl)
+            self._bytes += tamano
+            while self._bytes > self.max_bytes:
+                self._quitar(next(iter(self._entradas)))
+                self.expulsiones += 1
+        return True
+
+    def _quitar(self, clave):
+        _, tamano, _ = self._entradas.pop(clave)
+        self._bytes -= tamano
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "expulsiones": self.expulsiones
+            }
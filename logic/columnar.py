@@ -0,0 +1,143 @@
+# Subidas y descargas en formatos por columnas (Parquet y Arrow IPC), con pyarrow si está instalado
+import pandas as pd
+from .esquemas import parametros_lectura
+from .compactar import expandir_colores, comprobar_columnas
+from .instrumentacion import etapa, contar
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Tipo MIME y extensión de las descargas de /datasets/{id}/descargar
+FORMATOS_DESCARGA = {
+    'parquet': ('application/vnd.apache.parquet', '.parquet'),
+    'arrow': ('application/vnd.apache.arrow.file', '.arrow'),
+}
+
+NOMBRES_FORMATO = {'parquet': 'Parquet', 'arrow': 'Arrow IPC', 'arrow_flujo': 'Arrow IPC (stream)'}
+
+
+def formato_columnar(archivo):
+    """
+    'parquet', 'arrow' (formato de archivo de Arrow IPC / Feather v2), 'arrow_flujo' (formato de stream)
+    o None (texto, p. ej. CSV) según la firma del principio del archivo binario, sin moverlo de su posición.
+    """
+    inicio = archivo.tell()
+    firma = archivo.read(6)
+    archivo.seek(inicio)
+    if firma[:4] == b'PAR1':
+        return 'parquet'
+    if firma == b'ARROW1':
+        return 'arrow'
+    # Los streams de Arrow empiezan por el marcador de continuación 0xFFFFFFFF
+    if firma[:4] == b'\xff\xff\xff\xff':
+        return 'arrow_flujo'
+    return None
+
+
+def _a_pandas(tabla, dtype):
+    # Los identificadores como texto, igual que en la lectura de CSV (un Mes de tipo fecha pasa a '2024-01-31')
+    df = tabla.to_pandas()
+    for columna in dtype or {}:
+        if columna in df.columns and not pd.api.types.is_string_dtype(df[columna]):
+            df[columna] = df[columna].astype('str').where(df[columna].notna())
+    return df
+
+
+def _abrir(f, formato):
+    # (lector, nombres de columna) del archivo columnar abierto
+    if formato == 'parquet':
+        lector = pyarrow.parquet.ParquetFile(f)
+        return lector, lector.schema_arrow.names
+    lector = pyarrow.ipc.open_file(f) if formato == 'arrow' else pyarrow.ipc.open_stream(f)
+    return lector, lector.schema.names
+
+
+def _sin_pyarrow(formato):
+    return f"Archivo {NOMBRES_FORMATO[formato]}: para leerlo hace falta pyarrow en el servidor (pip install pyarrow)"
+
+
+def leer_columnar(f, formato):
+    """
+    DataFrame de un archivo Parquet o Arrow IPC abierto, sin detección de encoding ni delimitador y leyendo
+    solo las columnas que usa la aplicación (ver esquemas.parametros_lectura).
+    Devuelve (df, None) o (None, mensaje de error).
+    """
+    if pyarrow is None:
+        return None, _sin_pyarrow(formato)
+    contar('intentos_lectura')
+    try:
+        with etapa('lectura'):
+            lector, columnas = _abrir(f, formato)
+            usecols, dtype = parametros_lectura(columnas)
+            if formato == 'parquet':
+                tabla = lector.read(columns=usecols)
+            else:
+                tabla = lector.read_all()
+                if usecols is not None:
+                    tabla = tabla.select(usecols)
+            return _a_pandas(tabla, dtype), None
+    except Exception as e:
+        return None, f"No se pudo leer el archivo {NOMBRES_FORMATO[formato]}: {e}"
+
+
+def leer_columnar_por_bloques(f, formato, crear_consumidor, filas_bloque):
+    """
+    Como leer_columnar pero pasando el contenido a consumidor = crear_consumidor() por bloques (ver
+    procesar_archivo.leer_csv_por_bloques): de filas_bloque filas en Parquet y de los record batches del archivo en Arrow.
+    Devuelve (consumidor, None) o (None, mensaje de error).
+    """
+    if pyarrow is None:
+        return None, _sin_pyarrow(formato)
+    contar('intentos_lectura')
+    try:
+        lector, columnas = _abrir(f, formato)
+        usecols, dtype = parametros_lectura(columnas)
+        if formato == 'parquet':
+            lotes = lector.iter_batches(batch_size=filas_bloque, columns=usecols)
+        elif formato == 'arrow':
+            lotes = (lector.get_batch(i) for i in range(lector.num_record_batches))
+        else:
+            lotes = iter(lector)
+        consumidor = crear_consumidor()
+        while True:
+            with etapa('lectura'):
+                lote = next(lotes, None)
+                if lote is None:
+                    break
+                if usecols is not None and formato != 'parquet':
+                    lote = lote.select(usecols)
+                bloque = _a_pandas(pyarrow.Table.from_batches([lote]), dtype)
+            if consumidor(bloque) is False:
+                break
+        return consumidor, None
+    except Exception as e:
+        return None, f"No se pudo leer el archivo {NOMBRES_FORMATO[formato]}: {e}"
+
+
+def escribir_columnar(df, formato, columnas=None):
+    """
+    df (un dataset guardado, compactado o no) como bytes de Parquet o de Arrow IPC en formato de archivo,
+    con solo las columnas pedidas. Lanza ValueError si alguna columna no existe y RuntimeError sin pyarrow.
+    """
+    if pyarrow is None:
+        raise RuntimeError("Las descargas en Parquet y Arrow necesitan pyarrow en el servidor (pip install pyarrow)")
+    if columnas:
+        comprobar_columnas(df, columnas)
+    df = expandir_colores(df)
+    if columnas:
+        df = df[columnas]
+    # Sin attrs: pyarrow los copiaría a los metadatos del archivo (los de la compactación no le sirven a nadie)
+    df = df.copy(deep=False)
+    df.attrs = {}
+    tabla = pyarrow.Table.from_pandas(df, preserve_index=False)
+    destino = pyarrow.BufferOutputStream()
+    if formato == 'parquet':
+        pyarrow.parquet.write_table(tabla, destino)
+    else:
+        with pyarrow.ipc.new_file(destino, tabla.schema) as escritor:
+            escritor.write_table(tabla)
+    return destino.getvalue().to_pybytes()
@@ -0,0 +1,88 @@
+# Representación compacta en memoria de los DataFrames procesados (para guardarlos en caché o sesión)
+import numpy as np
+import pandas as pd
+
+COLUMNAS_CATEGORICAS = ['Nombre', 'Campaña', 'Mes', 'Recomendación', 'Canal', 'Tipo']
+
+
+class ColoresCampana(dict):
+    """
+    Diccionario nombre -> color que no se modifica después de crearlo. pandas copia df.attrs con deepcopy
+    en casi cada operación; así la copia no cuesta nada aunque haya miles de campañas.
+    """
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def _float32_sin_perdida(serie):
+    valores = serie.to_numpy()
+    reducidos = valores.astype('float32')
+    with np.errstate(over='ignore', invalid='ignore'):
+        return np.array_equal(reducidos.astype('float64'), valores, equal_nan=True)
+
+
+def _int32_sin_perdida(serie):
+    info = np.iinfo('int32')
+    return serie.empty or (serie.min() >= info.min and serie.max() <= info.max)
+
+
+def compactar_dataset(df):
+    """
+    Copia compacta de un DataFrame de procesar_archivo: textos repetidos como categorías, métricas en
+    float32/int32 solo si ningún valor cambia, y ColorCampaña como un diccionario por campaña en
+    df.attrs['colores_campana'] en lugar de una columna (ver expandir_colores).
+    Devuelve (df_compacto, informe) con los bytes de memory_usage(deep=True) antes y después, en total y por columna.
+    """
+    antes = df.memory_usage(deep=True, index=False)
+    compacto = df.copy(deep=False)
+    compacto.attrs['columnas_originales'] = list(df.columns)
+    if 'ColorCampaña' in compacto.columns and 'Nombre' in compacto.columns:
+        colores = compacto[['Nombre', 'ColorCampaña']].drop_duplicates('Nombre')
+        compacto.attrs['colores_campana'] = ColoresCampana(zip(colores['Nombre'], colores['ColorCampaña']))
+        compacto = compacto.drop(columns='ColorCampaña')
+    # Por posición, por si hay nombres de columna repetidos
+    for i, columna in enumerate(compacto.columns):
+        serie = compacto.iloc[:, i]
+        if columna in COLUMNAS_CATEGORICAS:
+            # Solo compensa si los valores se repiten
+            if not isinstance(serie.dtype, pd.CategoricalDtype) and serie.nunique(dropna=True) <= len(serie) // 2:
+                compacto.isetitem(i, serie.astype('category'))
+        elif serie.dtype == 'float64' and _float32_sin_perdida(serie):
+            compacto.isetitem(i, serie.astype('float32'))
+        elif serie.dtype == 'int64' and _int32_sin_perdida(serie):
+            compacto.isetitem(i, serie.astype('int32'))
+    antes = antes.groupby(level=0, sort=False).sum()
+    despues = compacto.memory_usage(deep=True, index=False).groupby(level=0, sort=False).sum()
+    informe = {
+        "bytes_antes": int(antes.sum()),
+        "bytes_despues": int(despues.sum()),
+        "columnas": {columna: [int(antes[columna]), int(despues.get(columna, 0))] for columna in antes.index}
+    }
+    compacto.attrs['compactacion'] = informe
+    return compacto, informe
+
+
+def expandir_colores(df):
+    """
+    Vuelve a poner la columna ColorCampaña, en su posición original, en un DataFrame compactado
+    (o en una selección de sus filas) a partir de df.attrs. Sin colores guardados devuelve df tal cual.
+    """
+    colores = df.attrs.get('colores_campana')
+    if colores is None or 'ColorCampaña' in df.columns or 'Nombre' not in df.columns:
+        return df
+    expandido = df.assign(**{'ColorCampaña': df['Nombre'].map(colores).astype(object)})
+    return expandido[[col for col in df.attrs['columnas_originales'] if col in expandido.columns]]
+
+
+def columnas_dataset(df):
+    """Columnas de df tal como eran antes de compactarlo (con ColorCampaña)."""
+    return df.attrs.get('columnas_originales', list(df.columns))
+
+
+def comprobar_columnas(df, columnas):
+    """Lanza ValueError si alguna de columnas no es de df (ColorCampaña cuenta aunque df esté compactado)."""
+    disponibles = columnas_dataset(df)
+    desconocidas = [col for col in columnas if col not in disponibles]
+    if desconocidas:
+        raise ValueError(f"Columnas desconocidas {desconocidas}: columnas disponibles {disponibles}")
@@ -0,0 +1,310 @@
+# Almacén persistente por cuenta de las filas normalizadas de sus exports, para anexar exports diarios
+# sin volver a subir ni procesar el histórico.
+# Los segmentos son .npy por columna y no Parquet: se abren con mmap sin copiar ni descomprimir (un anexo
+# solo lee las columnas del agregado), el histórico funciona sin pyarrow, que es opcional, y son solo numpy.
+import hashlib
+import json
+import os
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+from .agregados import agregar_filas
+
+CUENTAS_DIR = os.environ.get('OPTICAMP_CUENTAS_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'csv_importados', 'cuentas'))
+# Con más segmentos que esto (un segmento por export anexado) se reescriben todas las filas vigentes en uno solo
+MAX_SEGMENTOS = int(os.environ.get('OPTICAMP_CUENTAS_MAX_SEGMENTOS', 30))
+
+# Una fila nueva con el mismo Nombre y Mes que una guardada la sustituye
+CLAVES_FILA = ['Nombre', 'Mes']
+CLAVES_AGREGADO = ['Campaña', 'Mes']
+# Columnas que usa agregar_filas: las únicas que se leen del histórico para recalcular el agregado
+COLUMNAS_AGREGADO = CLAVES_AGREGADO + ['Gasto', 'Conversiones', 'CTR', 'Recomendación']
+
+
+def _escribir_json(ruta, contenido):
+    # Escritura atómica: o queda el archivo anterior o el nuevo completo
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(contenido, f, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+
+def _leer_json(ruta):
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def guardar_columnas(df, directorio):
+    """
+    Guarda df por columnas en directorio: un .npy por columna numérica y, para las de texto, los códigos
+    en .npy y los valores distintos en .json (sin pickle). Las columnas van por posición en esquema.json.
+    """
+    os.makedirs(directorio)
+    columnas = []
+    for i, nombre in enumerate(df.columns):
+        serie = df.iloc[:, i]
+        ruta = os.path.join(directorio, f'{i}.npy')
+        if isinstance(serie.dtype, np.dtype) and serie.dtype.kind in 'biufM':
+            np.save(ruta, serie.to_numpy(), allow_pickle=False)
+            tipo = str(serie.dtype)
+        else:
+            codigos, valores = pd.factorize(serie)
+            np.save(ruta, codigos.astype('int32'), allow_pickle=False)
+            _escribir_json(os.path.join(directorio, f'{i}.json'), [str(valor) for valor in valores])
+            tipo = 'texto'
+        columnas.append({"nombre": nombre, "tipo": tipo})
+    _escribir_json(os.path.join(directorio, 'esquema.json'), {"filas": len(df), "columnas": columnas})
+
+
+def leer_columnas(directorio, columnas=None):
+    """
+    DataFrame guardado con guardar_columnas, con solo las columnas pedidas (las que falten se ignoran).
+    Los .npy se abren con mmap, así que solo se leen del disco las columnas pedidas; las de texto salen como categorías.
+    """
+    esquema = _leer_json(os.path.join(directorio, 'esquema.json'))
+    nombres, valores = [], []
+    for i, columna in enumerate(esquema["columnas"]):
+        if columnas is not None and columna["nombre"] not in columnas:
+            continue
+        datos = np.load(os.path.join(directorio, f'{i}.npy'), mmap_mode='r')
+        if columna["tipo"] == 'texto':
+            datos = pd.Categorical.from_codes(datos, categories=_leer_json(os.path.join(directorio, f'{i}.json')))
+        nombres.append(columna["nombre"])
+        valores.append(datos)
+    df = pd.DataFrame(dict(enumerate(valores)), index=pd.RangeIndex(esquema["filas"]))
+    df.columns = nombres
+    return df
+
+
+def _codigos(indice, serie):
+    # Posición de cada valor de serie en indice (-1 si no está); NaN coincide con NaN
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        por_categoria = indice.get_indexer(serie.cat.categories)
+        codigos = serie.cat.codes.to_numpy()
+        return np.where(codigos >= 0, por_categoria[codigos], indice.get_indexer([np.nan])[0])
+    return indice.get_indexer(serie)
+
+
+def posiciones_en(df, referencia, columnas):
+    """
+    Para cada fila de df, la posición de la fila de referencia con las mismas claves (columnas), o -1.
+    referencia no debe tener claves repetidas. Compara códigos enteros en lugar de tuplas, así que vale
+    igual para columnas de texto que de categorías (las del almacén) y recorre df una vez por columna.
+    """
+    clave_df = np.zeros(len(df), dtype='int64')
+    clave_referencia = np.zeros(len(referencia), dtype='int64')
+    encontradas = np.ones(len(df), dtype=bool)
+    for columna in columnas:
+        codigos_referencia, valores = pd.factorize(referencia[columna].astype(object), use_na_sentinel=False)
+        codigos = _codigos(pd.Index(valores, dtype=object), df[columna])
+        encontradas &= codigos >= 0
+        clave_df = clave_df * len(valores) + codigos
+        clave_referencia = clave_referencia * len(valores) + codigos_referencia
+    posiciones = pd.Index(clave_referencia).get_indexer(clave_df)
+    posiciones[~encontradas] = -1
+    return posiciones
+
+
+class AlmacenCuentas:
+    """
+    Filas normalizadas (salida de procesar_subida sin RankingGasto ni ColorCampaña, que dependen de cada archivo)
+    de cada cuenta en disco, en segmentos por columnas (ver guardar_columnas), uno por export anexado,
+    y el agregado de agregar_filas de todas ellas materializado.
+
+    anexar() guarda el export como un segmento nuevo, marca como sustituidas las filas anteriores con el mismo
+    (Nombre, Mes) y recalcula solo los grupos (Campaña, Mes) afectados del agregado: el coste depende del export
+    y no del histórico, del que solo se leen las columnas de claves.
+    Cada cambio escribe una versión nueva de los archivos que modifica y estado.json al final, así que
+    si se interrumpe queda la versión anterior completa.
+    """
+
+    def __init__(self, raiz=CUENTAS_DIR, max_segmentos=MAX_SEGMENTOS):
+        self.raiz = raiz
+        self.max_segmentos = max_segmentos
+        self._bloqueos = {}
+        self._lock = threading.Lock()
+
+    def _directorio(self, cuenta):
+        # El nombre de usuario puede tener cualquier carácter: el directorio es su hash
+        return os.path.join(self.raiz, hashlib.blake2b(cuenta.encode('utf-8'), digest_size=16).hexdigest())
+
+    def _bloqueo(self, cuenta):
+        with self._lock:
+            return self._bloqueos.setdefault(cuenta, threading.Lock())
+
+    def _estado(self, directorio):
+        ruta = os.path.join(directorio, 'estado.json')
+        return _leer_json(ruta) if os.path.exists(ruta) else None
+
+    def _vigentes(self, directorio, segmento):
+        # Máscara de las filas no sustituidas de un segmento (sin archivo, todas)
+        if segmento["vigentes"] is None:
+            return np.ones(segmento["filas"], dtype=bool)
+        return np.load(os.path.join(directorio, 'segmentos', segmento["id"], f'vigentes-{segmento["vigentes"]}.npy'))
+
+    def _filas_vigentes(self, directorio, estado, columnas=None, grupos=None):
+        # Filas vigentes de todos los segmentos, en orden de anexado; con grupos, solo las de esos grupos del agregado
+        partes = []
+        for segmento in estado["segmentos"]:
+            ruta = os.path.join(directorio, 'segmentos', segmento["id"])
+            mascara = self._vigentes(directorio, segmento)
+            if grupos is not None:
+                claves = leer_columnas(ruta, estado["claves"]).reindex(columns=estado["claves"])
+                mascara &= posiciones_en(claves, grupos, estado["claves"]) >= 0
+            if mascara.any():
+                partes.append(leer_columnas(ruta, columnas)[mascara])
+        if not partes:
+            return pd.DataFrame(columns=columnas if columnas is not None else estado["columnas"])
+        # Segmentos de exports distintos pueden no tener las mismas columnas
+        return pd.concat(partes, ignore_index=True).reindex(columns=columnas if columnas is not None else estado["columnas"])
+
+    def anexar(self, cuenta, df):
+        """
+        Añade a la cuenta las filas normalizadas de un export. Las filas con el mismo (Nombre, Mes) que otras ya
+        guardadas (o que otras posteriores del mismo export) las sustituyen. Devuelve el agregado actualizado y
+        {"filas_nuevas", "filas_sustituidas", "filas", "segmentos"}.
+        """
+        faltantes = [col for col in CLAVES_FILA if col not in df.columns]
+        if faltantes:
+            raise ValueError(f"Para anexar a la cuenta el export necesita las columnas {CLAVES_FILA}; faltan {faltantes}")
+        df = df[~df.duplicated(CLAVES_FILA, keep='last')].reset_index(drop=True)
+        with self._bloqueo(cuenta):
+            directorio = self._directorio(cuenta)
+            estado = self._estado(directorio) or {"version": 0, "segmentos": [], "columnas": [], "claves": None, "filas": 0}
+            version = estado["version"] + 1
+            columnas = estado["columnas"] + [col for col in df.columns if col not in estado["columnas"]]
+            claves = [col for col in CLAVES_AGREGADO if col in columnas]
+            # El agregado se puede actualizar por grupos si el export no trae columnas nuevas (cambiarían las claves o las sumas)
+            incremental = columnas == estado["columnas"] and estado["filas"] > 0
+            grupos = [df.reindex(columns=claves)]
+            segmentos, sustituidas = [], 0
+            for segmento in estado["segmentos"]:
+                ruta = os.path.join(directorio, 'segmentos', segmento["id"])
+                columnas_claves = list(dict.fromkeys(CLAVES_FILA + claves))
+                guardadas = leer_columnas(ruta, columnas_claves).reindex(columns=columnas_claves)
+                vigentes = self._vigentes(directorio, segmento)
+                repetidas = vigentes & (posiciones_en(guardadas, df, CLAVES_FILA) >= 0)
+                if repetidas.any():
+                    grupos.append(guardadas.loc[repetidas, claves])
+                    np.save(os.path.join(ruta, f'vigentes-{version}.npy'), vigentes & ~repetidas, allow_pickle=False)
+                    segmento = {**segmento, "vigentes": version, "vigentes_filas": segmento["vigentes_filas"] - int(repetidas.sum())}
+                    sustituidas += int(repetidas.sum())
+                segmentos.append(segmento)
+            segmento_nuevo = f'{version:06d}'
+            guardar_columnas(df, os.path.join(directorio, 'segmentos', segmento_nuevo))
+            segmentos.append({"id": segmento_nuevo, "filas": len(df), "vigentes": None, "vigentes_filas": len(df)})
+            estado_nuevo = {
+                "version": version,
+                "segmentos": [s for s in segmentos if s["vigentes_filas"] > 0],
+                "columnas": columnas,
+                "claves": claves,
+                "filas": sum(s["vigentes_filas"] for s in segmentos)
+            }
+            columnas_agregado = [col for col in columnas if col in COLUMNAS_AGREGADO]
+            if incremental:
+                afectados = pd.concat([g.astype(object) for g in grupos], ignore_index=True).drop_duplicates()
+                recalculado = agregar_filas(self._filas_vigentes(directorio, estado_nuevo, columnas_agregado, afectados))
+                agregado = _sustituir_grupos(self._leer_agregado(directorio, estado), recalculado, afectados, claves)
+            else:
+                agregado = agregar_filas(self._filas_vigentes(directorio, estado_nuevo, columnas_agregado))
+            if len(estado_nuevo["segmentos"]) > self.max_segmentos:
+                estado_nuevo = self._compactar(directorio, estado_nuevo, version)
+            guardar_columnas(agregado.reset_index(), os.path.join(directorio, f'agregado-{version}'))
+            _escribir_json(os.path.join(directorio, 'estado.json'), estado_nuevo)
+            self._limpiar(directorio, estado_nuevo)
+            return agregado, {
+                "filas_nuevas": len(df),
+                "filas_sustituidas": sustituidas,
+                "filas": estado_nuevo["filas"],
+                "segmentos": len(estado_nuevo["segmentos"])
+            }
+
+    def _compactar(self, directorio, estado, version):
+        # Todas las filas vigentes en un único segmento nuevo, sin máscaras de sustituidas
+        filas = self._filas_vigentes(directorio, estado)
+        segmento = f'{version:06d}-c'
+        guardar_columnas(filas, os.path.join(directorio, 'segmentos', segmento))
+        return {**estado, "segmentos": [{"id": segmento, "filas": len(filas), "vigentes": None, "vigentes_filas": len(filas)}]}
+
+    def _limpiar(self, directorio, estado):
+        # Borra lo que no usa la versión actual: segmentos compactados, máscaras y agregados anteriores
+        # y lo que haya dejado a medias un anexado interrumpido
+        segmentos = {s["id"]: s for s in estado["segmentos"]}
+        for nombre in os.listdir(os.path.join(directorio, 'segmentos')):
+            ruta = os.path.join(directorio, 'segmentos', nombre)
+            if nombre not in segmentos:
+                shutil.rmtree(ruta, ignore_errors=True)
+                continue
+            for archivo in os.listdir(ruta):
+                if archivo.startswith('vigentes-') and archivo != f'vigentes-{segmentos[nombre]["vigentes"]}.npy':
+                    os.remove(os.path.join(ruta, archivo))
+        for nombre in os.listdir(directorio):
+            if nombre.startswith('agregado-') and nombre != f'agregado-{estado["version"]}':
+                shutil.rmtree(os.path.join(directorio, nombre), ignore_errors=True)
+
+    def _leer_agregado(self, directorio, estado):
+        agregado = leer_columnas(os.path.join(directorio, f'agregado-{estado["version"]}'))
+        # Las claves vuelven como categorías: se guardan como texto, igual que en agregar_filas sobre el CSV
+        for clave in estado["claves"]:
+            agregado[clave] = agregado[clave].astype(object).where(agregado[clave].notna(), np.nan)
+        if 'recomendacion' in agregado.columns:
+            agregado['recomendacion'] = agregado['recomendacion'].astype(object)
+        return agregado.set_index(estado["claves"]) if estado["claves"] else agregado
+
+    def agregado(self, cuenta):
+        """Agregado materializado de todas las filas vigentes de la cuenta, sin leerlas. None si la cuenta está vacía."""
+        directorio = self._directorio(cuenta)
+        with self._bloqueo(cuenta):
+            estado = self._estado(directorio)
+            if estado is None:
+                return None
+            return self._leer_agregado(directorio, estado)
+
+    def filas(self, cuenta, columnas=None):
+        """Filas vigentes de la cuenta en orden de anexado (None si la cuenta está vacía)."""
+        directorio = self._directorio(cuenta)
+        with self._bloqueo(cuenta):
+            estado = self._estado(directorio)
+            if estado is None:
+                return None
+            return self._filas_vigentes(directorio, estado, columnas)
+
+    def estadisticas(self, cuenta):
+        """Filas, columnas, segmentos y bytes en disco de la cuenta (None si está vacía)."""
+        directorio = self._directorio(cuenta)
+        with self._bloqueo(cuenta):
+            estado = self._estado(directorio)
+            if estado is None:
+                return None
+            bytes_disco = sum(os.path.getsize(os.path.join(raiz, archivo)) for raiz, _, archivos in os.walk(directorio) for archivo in archivos)
+            return {"filas": estado["filas"], "columnas": estado["columnas"], "segmentos": len(estado["segmentos"]), "bytes_disco": bytes_disco}
+
+    def borrar(self, cuenta):
+        """Borra todos los datos de la cuenta. Devuelve si había algo que borrar."""
+        directorio = self._directorio(cuenta)
+        with self._bloqueo(cuenta):
+            if not os.path.exists(directorio):
+                return False
+            shutil.rmtree(directorio)
+            return True
+
+
+def _sustituir_grupos(agregado, recalculado, afectados, claves):
+    """
+    agregado con los grupos afectados sustituidos por los de recalculado: los que ya estaban conservan su posición,
+    los nuevos van al final y los que se han quedado sin filas (todas sustituidas por otras de otro grupo) desaparecen.
+    """
+    agregado, recalculado = agregado.reset_index(), recalculado.reset_index()
+    posiciones = posiciones_en(agregado, recalculado, claves)
+    quedan = (posiciones >= 0) | (posiciones_en(agregado, afectados, claves) < 0)
+    agregado, posiciones = agregado[quedan].reset_index(drop=True), posiciones[quedan]
+    comunes = posiciones >= 0
+    # Columna a columna para que cada una conserve su tipo
+    for columna in agregado.columns.drop(claves):
+        agregado.loc[comunes, columna] = recalculado[columna].to_numpy()[posiciones[comunes]]
+    nuevos = recalculado.drop(index=posiciones[comunes])
+    juntos = pd.concat([agregado, nuevos], ignore_index=True)
+    for clave in claves:
+        juntos[clave] = juntos[clave].astype(object)
+    return juntos.set_index(claves)
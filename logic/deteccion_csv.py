@@ -0,0 +1,117 @@
+# Detección de encoding, delimitador y línea de cabecera de un CSV a partir de una muestra
+import codecs
+import csv
+import io
+from collections import Counter
+from .instrumentacion import contar
+
+# Bytes del principio del archivo que se inspeccionan (el resto solo se lee en el parseo final)
+TAMANO_MUESTRA = 64 * 1024
+DELIMITADORES = [';', ',', '\t']
+ENCODINGS_POR_DEFECTO = ['utf-8', 'utf-8-sig', 'latin1', 'utf-16', 'utf-16le', 'utf-16be']
+
+
+def _patron_utf16(muestra):
+    """
+    Sin BOM, un texto utf-16 con caracteres latinos tiene un byte nulo en cada par:
+    en las posiciones impares si es little endian y en las pares si es big endian.
+    """
+    bloque = muestra[:4096]
+    pares, impares = bloque[0::2], bloque[1::2]
+    if not impares:
+        return None
+    nulos_pares = pares.count(0) / len(pares)
+    nulos_impares = impares.count(0) / len(impares)
+    if nulos_impares > 0.4 and nulos_pares < 0.1:
+        return 'utf-16le'
+    if nulos_pares > 0.4 and nulos_impares < 0.1:
+        return 'utf-16be'
+    return None
+
+
+def _decodificar(muestra, encoding, completa):
+    # El decoder incremental tolera que la muestra corte un carácter multibyte por la mitad
+    decoder = codecs.getincrementaldecoder(encoding)(errors='strict')
+    return decoder.decode(muestra, final=completa)
+
+
+def detectar_encoding(muestra, encodings=None, completa=False):
+    """
+    Elige el encoding mirando BOM, patrón de nulos de utf-16 y validez utf-8 de la muestra.
+    Si el detectado no está entre los permitidos, usa el primero de ellos que decodifique la muestra.
+    Devuelve (encoding, texto decodificado) o (None, None).
+    """
+    if encodings is None:
+        encodings = ENCODINGS_POR_DEFECTO
+    if muestra.startswith(codecs.BOM_UTF8):
+        detectado = 'utf-8-sig'
+    elif muestra.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        detectado = 'utf-16'
+    else:
+        detectado = _patron_utf16(muestra) or 'utf-8'
+    # Lo que pasa por utf-8 pero no valida suele ser latin1/cp1252 (exports de Excel en español)
+    preferidos = [detectado, 'latin1'] if detectado == 'utf-8' else [detectado]
+    candidatos = [e for e in preferidos if e in encodings] + [e for e in encodings if e not in preferidos]
+    for encoding in candidatos:
+        contar('intentos_encoding')
+        try:
+            return encoding, _decodificar(muestra, encoding, completa)
+        except (UnicodeDecodeError, LookupError):
+            continue
+    return None, None
+
+
+def _filas_muestra(texto, delim, completa):
+    """
+    Devuelve [(número de campos, primera línea física de la fila)] para la muestra.
+    Si la muestra no llega al final del archivo, la última fila puede estar cortada y se descarta.
+    """
+    lector = csv.reader(io.StringIO(texto), delimiter=delim)
+    filas = []
+    linea = 0
+    try:
+        for campos in lector:
+            filas.append((len(campos), linea))
+            linea = lector.line_num
+    except csv.Error:
+        pass
+    if not completa and filas:
+        filas.pop()
+    return filas
+
+
+def detectar_delimitador(texto, completa=False):
+    """
+    Para cada delimitador candidato busca el número de campos más frecuente (>1) entre las filas
+    de la muestra; gana el que más filas tiene con ese número (a igualdad, más columnas y luego
+    el orden de DELIMITADORES). La cabecera es la primera fila con ese número de campos, lo que
+    salta los preámbulos de los exports de Google Ads ('Informe de campaña', rango de fechas...).
+    Devuelve (delim, línea física de la cabecera) o (None, None).
+    """
+    mejor = None
+    for prioridad, delim in enumerate(DELIMITADORES):
+        filas = _filas_muestra(texto, delim, completa)
+        conteo = Counter(n for n, _ in filas if n > 1)
+        if not conteo:
+            continue
+        n_campos, repeticiones = max(conteo.items(), key=lambda item: (item[1], item[0]))
+        puntuacion = (repeticiones, n_campos, -prioridad)
+        if mejor is None or puntuacion > mejor[0]:
+            cabecera = next(linea for n, linea in filas if n == n_campos)
+            mejor = (puntuacion, delim, cabecera)
+    if mejor is None:
+        return None, None
+    return mejor[1], mejor[2]
+
+
+def detectar_formato(muestra, encodings=None, completa=False):
+    """
+    Detecta (delim, encoding, header_idx) a partir de los primeros bytes de un CSV.
+    completa indica si la muestra contiene el archivo entero.
+    Devuelve (delim, encoding, header_idx, texto) con None en lo que no se haya podido detectar.
+    """
+    encoding, texto = detectar_encoding(muestra, encodings, completa)
+    if texto is None:
+        return None, None, None, None
+    delim, header_idx = detectar_delimitador(texto, completa)
+    return delim, encoding, header_idx, texto
@@ -0,0 +1,100 @@
+# Registro de esquemas de exportación por plataforma y su mapeo al esquema común de procesar_archivo
+import csv
+import io
+
+# Columnas de cada plataforma -> nombre en el esquema común
+ESQUEMAS = {
+    'google_es': {
+        'Mes': 'Mes',
+        'Campaña': 'Nombre',  # Solo mapea Campaña a Nombre
+        'Clics': 'Clics',
+        'Impr.': 'Impresiones',
+        'CTR': 'CTR',
+        'CPC medio': 'CPC',
+        'Coste': 'Gasto',
+        'Conversiones': 'Conversiones',
+        'Coste/conv.': 'CPA',
+        'Tasa de conv.': 'CVR',
+    },
+    'google_en': {
+        'Campaign': 'Nombre',
+        'Cost': 'Gasto',
+        'Clicks': 'Clics',
+        'All conversions': 'Conversiones',
+        'Impressions': 'Impresiones',
+        'Avg. CPC': 'CPC',
+    },
+    'facebook': {
+        'Campaign name': 'Nombre',
+        'Amount spent': 'Gasto',
+        'Link clicks': 'Clics',
+        'Results': 'Conversiones',
+        'Impressions': 'Impresiones',
+        'Cost per link click': 'CPC',
+    },
+    'pinterest': {
+        'Campaign name': 'Nombre',
+        'Spend': 'Gasto',
+        'Clicks': 'Clics',
+        'Conversions': 'Conversiones',
+        'Impressions': 'Impresiones',
+        'CPM': 'CPM',
+    },
+    'tiktok': {
+        'Ad name': 'Nombre',
+        'Total spend': 'Gasto',
+        'Website clicks': 'Clics',
+        'Reach': 'Impresiones',
+        'Click-through rate': 'CTR',
+        'Cost per click': 'CPC',
+        'Conversions': 'Conversiones',
+    },
+    'meta_es': {
+        'Mes': 'Mes',
+        'Nombre del grupo publicitario': 'Nombre',
+        'Gasto total': 'Gasto',
+        'Clics en el Pin': 'Clics',
+        'Resultado': 'Conversiones',
+        'Campaña de Performance': 'Campaña',
+        'Campaña Premiere Spotlight': 'Campaña',
+        'CPM': 'CPM',
+        'CTR': 'CTR',
+    },
+}
+
+# Un único mapeo con las columnas de todas las plataformas: un archivo puede mezclar nombres de varias
+MAPEO_COLUMNAS = {}
+for _esquema in ESQUEMAS.values():
+    MAPEO_COLUMNAS.update(_esquema)
+
+COLUMNAS_REQUERIDAS = ['Nombre', 'Gasto', 'Clics', 'Conversiones']
+# Columnas del esquema común que usa la aplicación aunque no vengan de ningún mapeo (se leen tal cual)
+COLUMNAS_COMUNES = {
+    'Nombre', 'Campaña', 'Mes', 'Gasto', 'Clics', 'Conversiones', 'Impresiones', 'CTR', 'CPC', 'CPA', 'CVR',
+    'ROAS', 'CPM', 'Canal', 'Tipo', 'Recomendación'
+}
+# Identificadores que se leen siempre como texto (una campaña llamada "2024" no es un número)
+COLUMNAS_TEXTO = {'Nombre', 'Campaña', 'Mes', 'Canal', 'Tipo', 'Recomendación'}
+
+
+def columnas_cabecera(texto, header_idx, delim):
+    """Nombres de columna de la línea física header_idx de la muestra decodificada."""
+    lineas = texto.splitlines()
+    if header_idx is None or header_idx >= len(lineas):
+        return []
+    return next(csv.reader(io.StringIO(lineas[header_idx]), delimiter=delim), [])
+
+
+def parametros_lectura(columnas):
+    """
+    usecols y dtype para read_csv a partir de la cabecera: solo las columnas con mapeo o del esquema común,
+    y las de identificadores como texto. Devuelve (usecols, dtype); usecols es None (leer todas)
+    si la cabecera tiene nombres repetidos o no aporta las columnas requeridas, para que el error
+    de columnas faltantes siga listando todas las encontradas.
+    """
+    destinos = {col: MAPEO_COLUMNAS.get(col.strip(), col.strip()) for col in columnas}
+    utiles = [col for col in columnas if col.strip() in MAPEO_COLUMNAS or col.strip() in COLUMNAS_COMUNES]
+    dtype = {col: 'str' for col in utiles if destinos[col] in COLUMNAS_TEXTO}
+    if len(set(columnas)) < len(columnas) or not set(COLUMNAS_REQUERIDAS) <= {destinos[col] for col in utiles}:
+        return None, dtype or None
+    return utiles if len(utiles) < len(columnas) else None, dtype or None
@@ -1,4 +1,16 @@
 # Funciones de feedback y parseo para el dashboard
+import operator
+import numpy as np
+import pandas as pd
+
+OPERADORES = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+# Reglas de recomendación por campaña: se evalúan en orden y gana la primera que se cumple
+REGLAS_RECOMENDACION = [
+    {'columna': 'CTR', 'operador': '<', 'umbral': 1, 'mensaje': "Mejorar creatividades para aumentar CTR"},
+    {'columna': 'CPA', 'operador': '>', 'umbral': 50, 'mensaje': "Optimizar segmentación para reducir CPA"},
+]
+RECOMENDACION_POR_DEFECTO = "Rendimiento bueno, seguir monitoreando"
 
 def parse_float(value):
     try:
@@ -17,10 +29,36 @@ def analizar_grupo(row):
         'CPA': parse_float(row.get('CPA', 0))
     }
 
-def recomendar(analisis):
-    if analisis['CTR'] < 1:
-        return "Mejorar creatividades para aumentar CTR"
-    elif analisis['CPA'] > 50:
-        return "Optimizar segmentación para reducir CPA"
+def recomendar(analisis, reglas=None, por_defecto=None):
+    reglas = REGLAS_RECOMENDACION if reglas is None else reglas
+    for regla in reglas:
+        if OPERADORES[regla['operador']](analisis[regla['columna']], regla['umbral']):
+            return regla['mensaje']
+    return RECOMENDACION_POR_DEFECTO if por_defecto is None else por_defecto
+
+def _metrica(df, columna):
+    # Misma semántica que parse_float en analizar_grupo: 0 si falta la columna y
+    # las columnas numéricas ya limpias (salida de procesar_archivo) se usan sin reparsear
+    if columna not in df.columns:
+        return np.zeros(len(df))
+    serie = df[columna]
+    if isinstance(serie.dtype, np.dtype) and serie.dtype.kind in 'iuf':
+        return serie.to_numpy(dtype='float64')
+    return np.array([parse_float(x) for x in serie.to_numpy(dtype=object)], dtype='float64')
+
+def recomendar_columnas(df, reglas=None, por_defecto=None):
+    """
+    Versión vectorizada de df.apply(analizar_grupo, axis=1).apply(recomendar): evalúa cada regla
+    sobre la columna entera y devuelve una Serie categórica 'Recomendación' con el índice de df.
+    """
+    reglas = REGLAS_RECOMENDACION if reglas is None else reglas
+    por_defecto = RECOMENDACION_POR_DEFECTO if por_defecto is None else por_defecto
+    categorias = list(dict.fromkeys([regla['mensaje'] for regla in reglas] + [por_defecto]))
+    defecto = categorias.index(por_defecto)
+    if reglas:
+        # np.select se queda con la primera condición que se cumple, igual que recomendar()
+        condiciones = [OPERADORES[regla['operador']](_metrica(df, regla['columna']), regla['umbral']) for regla in reglas]
+        codigos = np.select(condiciones, [categorias.index(regla['mensaje']) for regla in reglas], default=defecto)
     else:
-        return "Rendimiento bueno, seguir monitoreando"
+        codigos = np.full(len(df), defecto)
+    return pd.Series(pd.Categorical.from_codes(codigos, categorias), index=df.index, name='Recomendación')
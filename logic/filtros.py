@@ -1,14 +1,162 @@
 # Funciones de filtros y utilidades para el dashboard
+import numpy as np
 import pandas as pd
-from .feedback import analizar_grupo, recomendar
+from .feedback import recomendar_columnas
+from .compactar import expandir_colores, columnas_dataset, comprobar_columnas
+from .serializacion import columnas_json
+
+def mascara_filtros(df, canal, tipo, rango_gasto):
+    """Máscara booleana de las filas de df que pasan los filtros de aplicar_filtros, en una sola pasada."""
+    mascara = (df['Gasto'] >= rango_gasto[0]) & (df['Gasto'] <= rango_gasto[1])
+    if canal != 'Todos' and 'Canal' in df.columns:
+        mascara &= df['Canal'] == canal
+    if tipo != 'Todos' and 'Tipo' in df.columns:
+        mascara &= df['Tipo'] == tipo
+    return mascara
 
 def aplicar_filtros(df, canal, tipo, rango_gasto):
-    df_filtrado = df.copy()
-    if canal != 'Todos' and 'Canal' in df_filtrado.columns:
-        df_filtrado = df_filtrado[df_filtrado['Canal'] == canal]
-    if tipo != 'Todos' and 'Tipo' in df_filtrado.columns:
-        df_filtrado = df_filtrado[df_filtrado['Tipo'] == tipo]
-    df_filtrado = df_filtrado[(df_filtrado['Gasto'] >= rango_gasto[0]) & (df_filtrado['Gasto'] <= rango_gasto[1])]
+    # Se copian solo las filas seleccionadas, no el DataFrame entero antes de filtrar
+    df_filtrado = df[mascara_filtros(df, canal, tipo, rango_gasto)]
     if 'Recomendación' not in df_filtrado.columns:
-        df_filtrado['Recomendación'] = df_filtrado.apply(analizar_grupo, axis=1).apply(recomendar)
+        df_filtrado = df_filtrado.assign(**{'Recomendación': recomendar_columnas(df_filtrado)})
     return df_filtrado
+
+
+def ordenar_posiciones(df, orden):
+    """
+    Posiciones de las filas de df ordenadas según orden: lista de columnas, con '-' delante para
+    orden descendente (p. ej. ['-Gasto', 'Nombre']). Orden estable y con los vacíos al final.
+    Solo ordena las columnas de orden, no el DataFrame entero.
+    """
+    columnas = [col.lstrip('-') for col in orden]
+    desconocidas = [col for col in columnas if col not in df.columns]
+    if desconocidas:
+        raise ValueError(f"No se puede ordenar por {desconocidas}: columnas disponibles {list(df.columns)}")
+    claves = df[columnas].reset_index(drop=True)
+    claves.columns = range(len(columnas))
+    ascendente = [not col.startswith('-') for col in orden]
+    return claves.sort_values(list(claves.columns), ascending=ascendente, kind='stable', na_position='last').index.to_numpy()
+
+
+def filas_json(df):
+    """Filas de df como lista de dicts con los vacíos (NaN) como None, para serializar a JSON."""
+    return df.astype(object).where(df.notna(), None).to_dict(orient='records')
+
+
+def _posiciones_por_valor(serie):
+    # {valor: posiciones (ascendentes) de las filas con ese valor}, con un solo factorize y un argsort estable
+    codigos, valores = pd.factorize(serie)
+    orden = np.argsort(codigos, kind='stable')
+    limites = np.searchsorted(codigos[orden], np.arange(len(valores) + 1))
+    return {valor: orden[limites[i]:limites[i + 1]] for i, valor in enumerate(valores)}
+
+
+class DatasetIndexado:
+    """
+    Índices de un DataFrame procesado, construidos una vez, para filtrar con la semántica de aplicar_filtros
+    sin copiar ni recorrer todo el DataFrame en cada consulta: las posiciones de las filas de cada valor
+    de Canal y Tipo y el Gasto ordenado para buscar rangos con searchsorted. Los filtros devuelven
+    posiciones de fila y solo se materializan las filas de la página pedida.
+    Los órdenes completos (ver ordenar_posiciones) se guardan para las últimas max_ordenes combinaciones.
+    """
+
+    COLUMNAS_INDEXADAS = ('Canal', 'Tipo')
+
+    def __init__(self, df, max_ordenes=4):
+        if 'Recomendación' not in df.columns:
+            df = df.assign(**{'Recomendación': recomendar_columnas(df)})
+        self.df = df
+        self.max_ordenes = max_ordenes
+        self._posiciones = {col: _posiciones_por_valor(df[col]) for col in self.COLUMNAS_INDEXADAS if col in df.columns}
+        gasto = df['Gasto'].to_numpy(dtype='float64')
+        # Los NaN quedan al final y ningún rango los incluye, igual que con >= y <=
+        self._orden_gasto = np.argsort(gasto, kind='stable')
+        self._gasto_ordenado = gasto[self._orden_gasto]
+        # Sin filtros (o con un rango que lo cubre todo) son todas las filas con gasto: se calcula una vez
+        con_gasto = int(np.count_nonzero(~np.isnan(gasto)))
+        self._con_gasto = np.arange(len(df)) if con_gasto == len(df) else np.sort(self._orden_gasto[:con_gasto])
+        self._ordenes = {}
+
+    def memoria(self):
+        """Bytes de los índices (sin el DataFrame, que se comparte), contando el máximo de órdenes guardados."""
+        indices = sum(pos.nbytes for valores in self._posiciones.values() for pos in valores.values())
+        return indices + self._orden_gasto.nbytes * (3 + self.max_ordenes)
+
+    def posiciones(self, canal='Todos', tipo='Todos', rango_gasto=None):
+        """Posiciones ascendentes de las filas que pasarían aplicar_filtros; sin rango_gasto, las de Gasto no vacío."""
+        minimo, maximo = (-np.inf, np.inf) if rango_gasto is None else rango_gasto
+        inicio = np.searchsorted(self._gasto_ordenado, minimo, side='left')
+        fin = max(inicio, np.searchsorted(self._gasto_ordenado, maximo, side='right'))
+        conjuntos = []
+        for columna, valor in (('Canal', canal), ('Tipo', tipo)):
+            if valor != 'Todos' and columna in self._posiciones:
+                conjuntos.append(self._posiciones[columna].get(valor, np.empty(0, dtype=np.intp)))
+        if not conjuntos:
+            if inicio == 0 and fin == len(self._con_gasto):
+                return self._con_gasto
+            return np.sort(self._orden_gasto[inicio:fin])
+        seleccion = conjuntos[0]
+        for otro in conjuntos[1:]:
+            seleccion = np.intersect1d(seleccion, otro, assume_unique=True)
+        if inicio > 0 or fin < len(self._gasto_ordenado):
+            # Con pocas filas ya seleccionadas es más barato comprobar su gasto que cruzar con el rango
+            valores = self.df['Gasto'].to_numpy(dtype='float64')[seleccion]
+            seleccion = seleccion[(valores >= minimo) & (valores <= maximo)]
+        return seleccion
+
+    def ordenar(self, posiciones, orden):
+        """posiciones reordenadas según orden, filtrando un orden completo del DataFrame calculado una sola vez."""
+        clave = tuple(orden)
+        completo = self._ordenes.pop(clave, None)
+        if completo is None:
+            completo = ordenar_posiciones(self.df, orden)
+        self._ordenes[clave] = completo
+        while len(self._ordenes) > self.max_ordenes:
+            del self._ordenes[next(iter(self._ordenes))]
+        if len(posiciones) == len(completo):
+            return completo
+        incluida = np.zeros(len(completo), dtype=bool)
+        incluida[posiciones] = True
+        return completo[incluida[completo]]
+
+    def pagina(self, canal='Todos', tipo='Todos', rango_gasto=None, orden=None, pagina=1, por_pagina=50, columnas=None, formato='filas'):
+        """
+        Página pagina (desde 1) de las filas filtradas, ordenadas según orden (ver ordenar_posiciones)
+        y con solo las columnas pedidas. Devuelve {"total", "pagina", "por_pagina", "paginas", "filas"};
+        con formato='columnas', "filas" es {columna: array} en lugar de una lista de objetos.
+        """
+        if columnas:
+            comprobar_columnas(self.df, columnas)
+        posiciones = self.posiciones(canal, tipo, rango_gasto)
+        if orden:
+            posiciones = self.ordenar(posiciones, orden)
+        inicio = (pagina - 1) * por_pagina
+        # Un dataset compactado guarda ColorCampaña aparte: se recompone solo para las filas de la página
+        seleccion = expandir_colores(self.df.iloc[posiciones[inicio:inicio + por_pagina]])
+        if columnas:
+            seleccion = seleccion[columnas]
+        total = len(posiciones)
+        return {
+            "total": total,
+            "pagina": pagina,
+            "por_pagina": por_pagina,
+            "paginas": -(-total // por_pagina),
+            "filas": columnas_json(seleccion) if formato == 'columnas' else filas_json(seleccion)
+        }
+
+
+def describir_dataset(df):
+    """
+    Columnas, número de filas y valores posibles de los filtros (Canal, Tipo y rango de Gasto) de un dataset,
+    y la memoria antes y después de compactarlo si se ha compactado.
+    """
+    gasto = df['Gasto'] if 'Gasto' in df.columns else pd.Series(dtype=float)
+    compactacion = df.attrs.get('compactacion')
+    return {
+        "filas": len(df),
+        "columnas": columnas_dataset(df),
+        "canales": sorted(df['Canal'].dropna().unique().tolist()) if 'Canal' in df.columns else [],
+        "tipos": sorted(df['Tipo'].dropna().unique().tolist()) if 'Tipo' in df.columns else [],
+        "gasto": [float(gasto.min()), float(gasto.max())] if gasto.notna().any() else None,
+        "memoria": {"bytes_antes": compactacion["bytes_antes"], "bytes_despues": compactacion["bytes_despues"]} if compactacion else None
+    }
@@ -0,0 +1,85 @@
+# Acceso uniforme al contenido de un CSV: ruta, bytes en memoria u objeto tipo archivo
+import io
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+# Por encima de este tamaño, los flujos que no admiten seek() se vuelcan a disco en vez de a memoria
+UMBRAL_DISCO = 16 * 1024 * 1024
+
+
+@contextmanager
+def abrir_origen(origen, umbral_disco=UMBRAL_DISCO):
+    """
+    Devuelve un objeto binario con read() y seek(), posicionado al principio del contenido.
+    - Ruta (str/PathLike): se abre el archivo.
+    - bytes: BytesIO sobre el mismo buffer, sin copiarlo.
+    - bytearray/memoryview: BytesIO (que copia el contenido una vez).
+    - Objeto tipo archivo con seek() (UploadFile.file, BytesIO...): se usa tal cual, desde su posición
+      actual, y no se cierra.
+    - Flujo sin seek(): se copia a un SpooledTemporaryFile que pasa a disco al superar umbral_disco.
+    """
+    if isinstance(origen, (str, os.PathLike)):
+        with open(origen, 'rb') as f:
+            yield f
+    elif isinstance(origen, (bytes, bytearray, memoryview)):
+        yield io.BytesIO(origen)
+    elif hasattr(origen, 'seekable') and origen.seekable():
+        yield origen
+    elif hasattr(origen, 'read'):
+        with tempfile.SpooledTemporaryFile(max_size=umbral_disco) as copia:
+            shutil.copyfileobj(origen, copia)
+            copia.seek(0)
+            yield copia
+    else:
+        raise TypeError(f"Origen de CSV no soportado: {type(origen).__name__}")
+
+
+
+def volcar_a_temporal(archivo, sufijo='.csv'):
+    """
+    Copia un archivo binario (desde la posición actual) a un temporal con nombre y devuelve su ruta,
+    p. ej. para pasar una subida grande a otro proceso sin serializar su contenido.
+    Deja el archivo donde estaba; quien llama debe borrar el temporal.
+    """
+    inicio = archivo.tell()
+    with tempfile.NamedTemporaryFile(suffix=sufijo, delete=False) as destino:
+        shutil.copyfileobj(archivo, destino)
+    archivo.seek(inicio)
+    return destino.name
+
+
+def es_zip(archivo):
+    """Mira la firma 'PK\\x03\\x04' del principio del archivo binario, sin moverlo de su posición."""
+    inicio = archivo.tell()
+    firma = archivo.read(4)
+    archivo.seek(inicio)
+    return firma == b'PK\x03\x04'
+
+
+def extraer_zip(archivo, directorio, max_archivos=50, max_bytes=1024 * 1024 * 1024):
+    """
+    Extrae a directorio los .csv de un ZIP (ignora carpetas y metadatos de macOS) y devuelve [(nombre, ruta)].
+    Lanza ValueError si hay más de max_archivos CSV o si descomprimidos ocupan más de max_bytes,
+    contando los bytes realmente extraídos y no solo los que declara el ZIP.
+    """
+    import zipfile
+    with zipfile.ZipFile(archivo) as zip_:
+        entradas = [info for info in zip_.infolist()
+                    if not info.is_dir() and info.filename.lower().endswith('.csv')
+                    and not os.path.basename(info.filename).startswith('._') and '__MACOSX/' not in info.filename]
+        if len(entradas) > max_archivos:
+            raise ValueError(f"El ZIP contiene {len(entradas)} CSV; el máximo es {max_archivos}")
+        extraidos = []
+        restantes = max_bytes
+        for i, info in enumerate(entradas):
+            ruta = os.path.join(directorio, f"{i}.csv")
+            with zip_.open(info) as origen, open(ruta, 'wb') as destino:
+                for trozo in iter(lambda: origen.read(1024 * 1024), b''):
+                    restantes -= len(trozo)
+                    if restantes < 0:
+                        raise ValueError(f"El contenido del ZIP supera {max_bytes} bytes descomprimido")
+                    destino.write(trozo)
+            extraidos.append((info.filename, ruta))
+        return extraidos
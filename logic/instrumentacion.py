@@ -0,0 +1,189 @@
+# Tiempos por etapa y contadores de cada petición, y su acumulado en histogramas con formato Prometheus
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+# OPTICAMP_METRICAS=0 desactiva la instrumentación: etapa() y contar() no hacen nada
+METRICAS_ACTIVAS = os.environ.get('OPTICAMP_METRICAS', '1') != '0'
+
+_actual = ContextVar('opticamp_mediciones', default=None)
+_NADA = nullcontext()
+
+
+class Mediciones:
+    """Segundos acumulados por etapa y contadores (filas, intentos de detección, bytes...) de una petición."""
+
+    def __init__(self):
+        self.etapas = {}
+        self.contadores = {}
+
+    def a_dict(self):
+        return {"etapas": self.etapas, "contadores": self.contadores}
+
+    def fusionar(self, datos):
+        for nombre, segundos in datos["etapas"].items():
+            self.etapas[nombre] = self.etapas.get(nombre, 0.0) + segundos
+        for nombre, valor in datos["contadores"].items():
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + valor
+
+
+def activas():
+    return _actual.get()
+
+
+@contextmanager
+def _cronometrar(mediciones, nombre):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        mediciones.etapas[nombre] = mediciones.etapas.get(nombre, 0.0) + time.perf_counter() - inicio
+
+
+def etapa(nombre):
+    """
+    Context manager que suma la duración del bloque a la etapa nombre de la petición en curso.
+    Fuera de una petición medida (o con las métricas desactivadas) no hace nada.
+    """
+    mediciones = _actual.get()
+    if mediciones is None:
+        return _NADA
+    return _cronometrar(mediciones, nombre)
+
+
+def medir_etapa(nombre):
+    """Decorador equivalente a envolver la función en etapa(nombre)."""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with etapa(nombre):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def contar(nombre, valor=1):
+    mediciones = _actual.get()
+    if mediciones is not None:
+        mediciones.contadores[nombre] = mediciones.contadores.get(nombre, 0) + valor
+
+
+@contextmanager
+def medir_peticion():
+    """Activa unas Mediciones nuevas para el bloque (una petición) y las devuelve."""
+    mediciones = Mediciones()
+    token = _actual.set(mediciones)
+    try:
+        yield mediciones
+    finally:
+        _actual.reset(token)
+
+
+def ejecutar_medido(funcion, *args, **kwargs):
+    """
+    Ejecuta funcion con sus propias Mediciones y devuelve (resultado, mediciones como dict).
+    Sirve para traer las mediciones de un hilo o proceso del pool, donde no llega el contexto de la petición.
+    """
+    with medir_peticion() as mediciones:
+        resultado = funcion(*args, **kwargs)
+    return resultado, mediciones.a_dict()
+
+
+def server_timing(mediciones):
+    """Valor de la cabecera Server-Timing (milisegundos por etapa)."""
+    return ', '.join(f"{nombre};dur={segundos * 1000:.1f}" for nombre, segundos in mediciones.etapas.items())
+
+
+class Histograma:
+    """Histograma acumulativo por etiqueta, con el formato de exposición de Prometheus."""
+
+    def __init__(self, nombre, ayuda, limites, etiqueta=None):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.limites = list(limites)
+        self.etiqueta = etiqueta
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, etiqueta=None):
+        with self._lock:
+            serie = self._series.get(etiqueta)
+            if serie is None:
+                serie = self._series[etiqueta] = [[0] * len(self.limites), 0, 0.0]
+            cubetas = serie[0]
+            for i, limite in enumerate(self.limites):
+                if valor <= limite:
+                    cubetas[i] += 1
+            serie[1] += 1
+            serie[2] += valor
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            for etiqueta, (cubetas, total, suma) in sorted(self._series.items(), key=lambda item: str(item[0])):
+                base = f'{self.etiqueta}="{etiqueta}",' if self.etiqueta else ''
+                for limite, n in zip(self.limites, cubetas):
+                    lineas.append(f'{self.nombre}_bucket{{{base}le="{limite:g}"}} {n}')
+                lineas.append(f'{self.nombre}_bucket{{{base}le="+Inf"}} {total}')
+                sufijo = f'{{{base.rstrip(",")}}}' if base else ''
+                lineas.append(f"{self.nombre}_sum{sufijo} {suma:g}")
+                lineas.append(f"{self.nombre}_count{sufijo} {total}")
+        return '\n'.join(lineas)
+
+
+_SEGUNDOS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+HISTOGRAMAS = {
+    'peticion': Histograma('opticamp_peticion_segundos', 'Duración de las peticiones por ruta', _SEGUNDOS, 'ruta'),
+    'etapa': Histograma('opticamp_etapa_segundos', 'Duración de cada etapa del pipeline', _SEGUNDOS, 'etapa'),
+    'filas': Histograma('opticamp_filas', 'Filas procesadas por subida', [100, 1_000, 10_000, 100_000, 1_000_000, 5_000_000]),
+    'intentos_encoding': Histograma('opticamp_intentos_encoding', 'Encodings probados al detectar el formato del CSV', [1, 2, 3, 4, 5]),
+    'intentos_lectura': Histograma('opticamp_intentos_lectura', 'Parseos completos del CSV (más de 1 = reintento en latin1)', [1, 2, 3]),
+    'bytes_subida': Histograma('opticamp_subida_bytes', 'Tamaño de los archivos subidos', [10_000, 100_000, 1_000_000, 10_000_000, 100_000_000, 500_000_000]),
+}
+
+
+def registrar(mediciones, ruta, segundos):
+    """Acumula en los histogramas las mediciones de una petición terminada."""
+    HISTOGRAMAS['peticion'].observar(segundos, ruta)
+    for nombre, duracion in mediciones.etapas.items():
+        HISTOGRAMAS['etapa'].observar(duracion, nombre)
+    for nombre, valor in mediciones.contadores.items():
+        if nombre in HISTOGRAMAS:
+            HISTOGRAMAS[nombre].observar(valor)
+
+
+def exponer_metricas():
+    return '\n'.join(h.exponer() for h in HISTOGRAMAS.values()) + '\n'
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI que mide cada petición HTTP, añade la cabecera Server-Timing con las etapas
+    y acumula las mediciones en los histogramas de /metrics.
+    """
+
+    def __init__(self, app, activa=METRICAS_ACTIVAS, excluir=('/metrics',)):
+        self.app = app
+        self.activa = activa
+        self.excluir = set(excluir)
+
+    async def __call__(self, scope, receive, send):
+        if not self.activa or scope['type'] != 'http' or scope['path'] in self.excluir:
+            await self.app(scope, receive, send)
+            return
+        inicio = time.perf_counter()
+        with medir_peticion() as mediciones:
+            async def enviar(mensaje):
+                if mensaje['type'] == 'http.response.start' and mediciones.etapas:
+                    mensaje['headers'] = list(mensaje.get('headers', [])) + [(b'server-timing', server_timing(mediciones).encode('latin1'))]
+                await send(mensaje)
+            try:
+                await self.app(scope, receive, enviar)
+            finally:
+                # La plantilla de la ruta (no la URL) para no crear una serie por id; lo que no es una ruta va junto
+                ruta = scope['route'].path if scope.get('route') is not None else 'otras'
+                registrar(mediciones, ruta, time.perf_counter() - inicio)
@@ -0,0 +1,151 @@
+# Normalización vectorizada de columnas numéricas
+import numpy as np
+import pandas as pd
+
+# Celdas más largas que esto se convierten una a una para no inflar la matriz de caracteres
+ANCHO_MAXIMO = 64
+# Filas por bloque al recorrer la matriz de caracteres (acota la memoria temporal)
+FILAS_POR_BLOQUE = 65536
+
+# Clases de carácter, según lo que hacen con ellos parse_float_robusto y float()
+_NUNCA, _DIGITO, _PUNTO, _SIGNO, _ELIMINADO, _SEPARADOR, _DUDOSO = range(7)
+_tabla_clases = None
+
+
+def _clases_caracter():
+    """
+    Tabla (BMP) con la clase de cada punto de código. Se construye la primera vez que se usa.
+    _DUDOSO marca lo que float() acepta solo en ciertos contextos (exponentes, inf/nan,
+    guiones bajos, espacios y dígitos no ASCII): esas celdas se convierten una a una.
+    """
+    global _tabla_clases
+    if _tabla_clases is None:
+        tabla = np.full(0x10000, _NUNCA, dtype=np.uint8)
+        for i in range(0x80, 0x10000):
+            c = chr(i)
+            if c.isdecimal() or c.isspace():
+                tabla[i] = _DUDOSO
+        for c in ' \t\n\v\f\r\x1c\x1d\x1e\x1f_eEinfityaINFITYA':
+            tabla[ord(c)] = _DUDOSO
+        tabla[ord('0'):ord('9') + 1] = _DIGITO
+        tabla[[ord('.'), ord(',')]] = _PUNTO
+        tabla[[ord('+'), ord('-')]] = _SIGNO
+        tabla[[ord(c) for c in '% \u202f\xa0"']] = _ELIMINADO
+        tabla[[ord(c) for c in ';\t|']] = _SEPARADOR
+        _tabla_clases = tabla
+    return _tabla_clases
+
+
+def _float_o_cero(x):
+    try:
+        return float(x)
+    except Exception:
+        return 0.0
+
+
+def _no_texto_a_float(x):
+    # Misma rama que parse_float_robusto para valores que no son str
+    if pd.isnull(x):
+        return 0.0
+    if isinstance(x, (int, float)):
+        return float(x)
+    return 0.0
+
+
+def _texto_a_float(x):
+    # Limpieza de parse_float_robusto celda a celda
+    x = x.replace('%', '').replace(' ', '').replace('\u202f', '').replace('\xa0', '').replace('"', '')
+    x = x.replace(',', '.')
+    for sep in [';', '\t', '|']:
+        if sep in x:
+            x = x.split(sep)[0]
+    return _float_o_cero(x)
+
+
+def _convertir_bloque(codigos, largos):
+    """
+    Convierte un bloque de celdas dado como matriz (ancho, filas) de puntos de código.
+    Recorre la matriz columna a columna, cada paso sobre todas las filas a la vez.
+    Devuelve (valores, una_a_una): las filas marcadas en una_a_una no se resuelven
+    aquí y deben pasar por _texto_a_float.
+    """
+    ancho, filas = codigos.shape
+    clases = _clases_caracter().take(codigos, mode='clip')
+    clases[codigos > 0xFFFF] = _DUDOSO
+    cortada = np.zeros(filas, dtype=bool)
+    empezada = np.zeros(filas, dtype=bool)
+    con_punto = np.zeros(filas, dtype=bool)
+    negativa = np.zeros(filas, dtype=bool)
+    invalida = np.zeros(filas, dtype=bool)
+    mal_formada = np.zeros(filas, dtype=bool)
+    dudosa = np.zeros(filas, dtype=bool)
+    n_digitos = np.zeros(filas, dtype=np.int64)
+    decimales = np.zeros(filas, dtype=np.int64)
+    mantisa = np.zeros(filas, dtype=np.int64)
+    for j in range(ancho):
+        c, k = codigos[j], clases[j]
+        activo = (j < largos) & ~cortada
+        # Lo que va tras el primer separador se descarta
+        cortada |= activo & (k == _SEPARADOR)
+        activo &= (k != _SEPARADOR) & (k != _ELIMINADO)
+        digito = activo & (k == _DIGITO)
+        punto = activo & (k == _PUNTO)
+        signo = activo & (k == _SIGNO)
+        # Solo dígitos, un punto como mucho y un signo opcional al principio
+        invalida |= activo & (k == _NUNCA)
+        mal_formada |= (punto & con_punto) | (signo & empezada)
+        dudosa |= activo & (k == _DUDOSO)
+        negativa |= signo & (c == ord('-'))
+        mantisa = np.where(digito, mantisa * 10 + c - ord('0'), mantisa)
+        decimales += digito & con_punto
+        n_digitos += digito
+        con_punto |= punto
+        empezada |= activo
+    # Un carácter que float() nunca acepta invalida la celda aunque haya otros dudosos
+    dudosa &= ~invalida
+    sencilla = ~invalida & ~dudosa & ~mal_formada & (n_digitos > 0)
+    # Con 15 dígitos o menos, mantisa / 10**k en doble precisión coincide exactamente con float()
+    rapida = sencilla & (n_digitos <= 15)
+    magnitud = np.where(rapida, mantisa, 0) / 10.0 ** decimales
+    valores = np.where(negativa, -magnitud, magnitud)
+    valores[~rapida] = 0.0
+    una_a_una = dudosa | (sencilla & ~rapida)
+    return valores, una_a_una
+
+
+def _textos_a_float(textos):
+    """Convierte un array object de str con la semántica de parse_float_robusto."""
+    resultado = np.zeros(len(textos), dtype='float64')
+    largos = np.fromiter(map(len, textos), dtype=np.int64, count=len(textos))
+    una_a_una = largos > ANCHO_MAXIMO
+    cortas = np.flatnonzero(~una_a_una)
+    for inicio in range(0, len(cortas), FILAS_POR_BLOQUE):
+        indices = cortas[inicio:inicio + FILAS_POR_BLOQUE]
+        unicode = textos[indices].astype('U')
+        codigos = np.ascontiguousarray(unicode.view(np.uint32).reshape(len(indices), -1).T)
+        valores, pendientes = _convertir_bloque(codigos, largos[indices])
+        resultado[indices] = valores
+        una_a_una[indices[pendientes]] = True
+    resultado[una_a_una] = [_texto_a_float(x) for x in textos[una_a_una]]
+    return resultado
+
+
+def normalizar_numerica(serie):
+    """
+    Equivalente vectorizado de serie.apply(parse_float_robusto).
+    Devuelve una Serie float64 con el mismo índice y nombre; lo que no se puede
+    convertir queda como 0.0, igual que en la versión por celda.
+    """
+    if pd.api.types.is_bool_dtype(serie) or pd.api.types.is_numeric_dtype(serie):
+        return serie.astype('float64').fillna(0.0)
+    valores = serie.to_numpy(dtype=object)
+    resultado = np.zeros(len(valores), dtype='float64')
+    if pd.api.types.infer_dtype(valores, skipna=True) in ('string', 'empty'):
+        es_texto = serie.notna().to_numpy()
+    else:
+        es_texto = np.fromiter((isinstance(x, str) for x in valores), dtype=bool, count=len(valores))
+        otros = ~es_texto
+        resultado[otros] = [_no_texto_a_float(x) for x in valores[otros]]
+    if es_texto.any():
+        resultado[es_texto] = _textos_a_float(valores[es_texto])
+    return pd.Series(resultado, index=serie.index, name=serie.name)
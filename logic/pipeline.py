@@ -0,0 +1,222 @@
+# Pipeline completo de una subida: lectura, normalización, recomendaciones y resumen JSON.
+# Son funciones de módulo que reciben y devuelven datos serializables para poder ejecutarse
+# en un proceso aparte (ver components/ejecutores.py).
+from .procesar_archivo import procesar_archivo, leer_csv_robusto, leer_csv_por_bloques, FILAS_BLOQUE
+from .feedback import recomendar_columnas
+from .ingesta import abrir_origen
+from .columnar import formato_columnar, leer_columnar, leer_columnar_por_bloques
+from .agregados import agregar_filas, combinar_agregados, resumir_agregado, AgregadorCampanas
+from .instrumentacion import etapa
+from .serializacion import serializar_json, registros_a_columnas
+
+COLUMNAS_TABLA = ['Campaña', 'Nombre', 'Gasto', 'Clics', 'Conversiones', 'CTR', 'CPC', 'CPA', 'ROAS', 'CPM', 'Recomendación']
+FILAS_TABLA = 20
+
+
+def con_dataset_id(cuerpo, dataset_id):
+    """Añade la clave dataset_id al final de un cuerpo JSON de objeto ya serializado, sin volver a serializarlo."""
+    return cuerpo[:-1] + b',"dataset_id":' + serializar_json(dataset_id) + b'}'
+
+
+def _error_lectura(error_info):
+    return {
+        "error": "No se pudo leer el archivo CSV. Prueba con otro delimitador o revisa el formato.",
+        "diagnostico": error_info
+    }
+
+
+def _error_columnas(columnas_faltantes, columnas_encontradas):
+    return {
+        "error": f"Faltan columnas requeridas: {columnas_faltantes}. Columnas encontradas: {columnas_encontradas}"
+    }
+
+
+def _leer_tabla(origen):
+    # CSV, o Parquet/Arrow IPC si lo dice la firma del archivo (sin detectar encoding ni delimitador)
+    with abrir_origen(origen) as f:
+        formato = formato_columnar(f)
+        if formato is not None:
+            df_raw, error = leer_columnar(f, formato)
+            return df_raw, {"error": error} if error else None
+        df_raw, delim, error_info = leer_csv_robusto(f)
+        return df_raw, _error_lectura(error_info) if df_raw is None else None
+
+
+def _leer_por_bloques(origen, crear_consumidor, filas_bloque=FILAS_BLOQUE):
+    # Como _leer_tabla pero por bloques: devuelve (consumidor, None) o (None, contenido JSON del error)
+    with abrir_origen(origen) as f:
+        formato = formato_columnar(f)
+        if formato is not None:
+            consumidor, error = leer_columnar_por_bloques(f, formato, crear_consumidor, filas_bloque)
+            return consumidor, {"error": error} if error else None
+        consumidor, delim, error_info = leer_csv_por_bloques(f, crear_consumidor, filas_bloque)
+        return consumidor, _error_lectura(error_info) if consumidor is None else None
+
+
+def procesar_subida(origen, nombre_archivo, columnas_globales=True):
+    """
+    Lee y normaliza el CSV, Parquet o Arrow IPC (ruta, bytes u objeto tipo archivo) y añade la columna de recomendación.
+    Devuelve (df, None) o (None, contenido JSON del error).
+    """
+    df_raw, error = _leer_tabla(origen)
+    if error is not None:
+        return None, error
+    df, columnas_faltantes, columnas_encontradas = procesar_archivo(df_raw, nombre_archivo, columnas_globales)
+    if columnas_faltantes:
+        return None, _error_columnas(columnas_faltantes, columnas_encontradas)
+    # Añadir columna de recomendación si no existe
+    if 'Recomendación' not in df.columns:
+        with etapa('recomendacion'):
+            df['Recomendación'] = recomendar_columnas(df)
+    return df, None
+
+
+def _resumen(kpis, grafica_global, campanas, tabla, formato='filas'):
+    conversiones = kpis["conversiones"]
+    ctr = kpis["ctr"]
+    cpa = kpis["cpa"]
+    # Feedback global sencillo
+    if conversiones == 0:
+        feedback = "No se han registrado conversiones. Revisa la segmentación, la oferta y la landing page."
+    elif ctr and ctr < 1:
+        feedback = "El CTR es bajo. Prueba nuevas creatividades y segmentaciones."
+    elif cpa and cpa > 50:
+        feedback = "El CPA es alto. Optimiza la segmentación y revisa la oferta."
+    else:
+        feedback = "Buen rendimiento general. Sigue optimizando y probando cambios."
+    return {
+        "kpis": {
+            "gasto_total": kpis["gasto"],
+            "conversiones": conversiones,
+            "ctr": ctr,
+            "cpa": cpa
+        },
+        "feedback": feedback,
+        "grafica_global": grafica_global,
+        "campanas": campanas,
+        "tabla": registros_a_columnas(tabla) if formato == 'columnas' and tabla is not None else tabla
+    }
+
+
+def _analisis(df, formato='filas'):
+    # Resumen de /analizar/ y el agregado (Campaña, Mes) del que sale, para reutilizarlo en el resumen de un lote
+    # KPIs globales y por campaña y gráficas mensuales en una sola agregación
+    with etapa('agregacion'):
+        agregado = agregar_filas(df)
+        kpis, grafica_global, campanas = resumir_agregado(agregado, formato)
+    # Tabla resumen (primeras 20 filas)
+    with etapa('tabla'):
+        columnas_tabla = [col for col in COLUMNAS_TABLA if col in df.columns]
+        tabla = df[columnas_tabla].head(FILAS_TABLA).to_dict(orient="records")
+    return _resumen(kpis, grafica_global, campanas, tabla, formato), agregado
+
+
+def resumen_analisis(df, formato='filas'):
+    """
+    KPIs, feedback, gráficas globales e individuales y tabla resumen de /analizar/ (modo BASIC mejorado).
+    Con formato='columnas' las campañas y la tabla van como un array por campo en lugar de una lista de objetos.
+    """
+    return _analisis(df, formato)[0]
+
+
+class AnalisisPorBloques:
+    """
+    Consumidor para leer_csv_por_bloques: normaliza cada bloque, le añade la recomendación y lo acumula
+    en un AgregadorCampanas, guardando solo las primeras FILAS_TABLA filas para la tabla resumen.
+    Se detiene en el primer bloque si faltan columnas requeridas.
+    """
+
+    def __init__(self, nombre_archivo):
+        self.nombre_archivo = nombre_archivo
+        self.agregador = AgregadorCampanas()
+        self.tabla = []
+        self.error = None
+
+    def __call__(self, bloque):
+        df, columnas_faltantes, columnas_encontradas = procesar_archivo(bloque, self.nombre_archivo, columnas_globales=False)
+        if columnas_faltantes:
+            self.error = _error_columnas(columnas_faltantes, columnas_encontradas)
+            return False
+        if 'Recomendación' not in df.columns:
+            with etapa('recomendacion'):
+                df['Recomendación'] = recomendar_columnas(df)
+        with etapa('agregacion'):
+            self.agregador.anadir(df)
+        if len(self.tabla) < FILAS_TABLA:
+            columnas_tabla = [col for col in COLUMNAS_TABLA if col in df.columns]
+            self.tabla.extend(df[columnas_tabla].head(FILAS_TABLA - len(self.tabla)).to_dict(orient="records"))
+        return True
+
+    def resumen(self, formato='filas'):
+        with etapa('agregacion'):
+            kpis, grafica_global, campanas = self.agregador.resultado(formato)
+        return _resumen(kpis, grafica_global, campanas, self.tabla, formato)
+
+    def agregado(self):
+        return self.agregador.agregado()
+
+
+def analizar_subida(origen, nombre_archivo, formato='filas'):
+    """
+    Pipeline completo de /analizar/. Devuelve (df, cuerpo JSON en bytes, status HTTP);
+    df es None si el archivo no se ha podido procesar.
+    """
+    df, error = procesar_subida(origen, nombre_archivo)
+    if error is not None:
+        return None, serializar_json(error), 400
+    return df, serializar_json(resumen_analisis(df, formato)), 200
+
+
+def analizar_subida_por_bloques(origen, nombre_archivo, filas_bloque=FILAS_BLOQUE, formato='filas'):
+    """
+    Igual que analizar_subida pero leyendo el CSV por bloques, con memoria acotada por filas_bloque
+    en lugar del tamaño del archivo. No construye el DataFrame completo, así que df es siempre None.
+    """
+    analisis, error = _leer_por_bloques(origen, lambda: AnalisisPorBloques(nombre_archivo), filas_bloque)
+    if error is not None:
+        return None, serializar_json(error), 400
+    if analisis.error is not None:
+        return None, serializar_json(analisis.error), 400
+    return None, serializar_json(analisis.resumen(formato)), 200
+
+
+def analizar_para_lote(origen, nombre_archivo, por_bloques=False):
+    """
+    Análisis de un archivo de /analizar_lote/. Devuelve (status HTTP, contenido, agregado): el contenido es
+    el de /analizar/ (o el del error) sin serializar y el agregado, el de agregar_filas sobre el esquema común
+    (None si hay error), para combinarlo con los del resto del lote.
+    """
+    if por_bloques:
+        analisis, error = _leer_por_bloques(origen, lambda: AnalisisPorBloques(nombre_archivo))
+        if error is not None:
+            return 400, error, None
+        if analisis.error is not None:
+            return 400, analisis.error, None
+        return 200, analisis.resumen(), analisis.agregado()
+    df, error = procesar_subida(origen, nombre_archivo)
+    if error is not None:
+        return 400, error, None
+    contenido, agregado = _analisis(df)
+    return 200, contenido, agregado
+
+
+def resumen_agregado(agregado, formato='filas'):
+    """KPIs, feedback y gráficas de un agregado de agregar_filas ya calculado (sin tabla: no hay filas a mano)."""
+    with etapa('agregacion'):
+        kpis, grafica_global, campanas = resumir_agregado(agregado, formato)
+    contenido = _resumen(kpis, grafica_global, campanas, None, formato)
+    del contenido["tabla"]
+    return contenido
+
+
+def resumen_lote(resultados):
+    """
+    Resumen conjunto de un lote a partir de [(nombre_archivo, contenido, agregado)] de los archivos correctos:
+    KPIs, feedback y gráfica del total combinando los agregados al nivel de las claves comunes
+    (p. ej. solo por mes si unos exports tienen Campaña y otros no), y los KPIs de cada archivo.
+    """
+    with etapa('agregacion'):
+        agregado = combinar_agregados([agregado for _, _, agregado in resultados])
+    contenido = resumen_agregado(agregado)
+    contenido["archivos"] = [{"archivo": nombre, "kpis": c["kpis"]} for nombre, c, _ in resultados]
+    return contenido
@@ -1,6 +1,17 @@
 # Funciones para procesar y normalizar archivos CSV
+import os
 import pandas as pd
-from .feedback import parse_float
+from .normalizar import normalizar_numerica
+from .ingesta import abrir_origen
+from .deteccion_csv import TAMANO_MUESTRA, DELIMITADORES, ENCODINGS_POR_DEFECTO, detectar_formato
+from .esquemas import MAPEO_COLUMNAS, COLUMNAS_REQUERIDAS, columnas_cabecera, parametros_lectura
+from .instrumentacion import etapa, medir_etapa, contar
+
+# Filas por bloque en la lectura por bloques: la memoria pico depende de este valor y no del tamaño del archivo
+FILAS_BLOQUE = 100000
+# OPTICAMP_MOTOR_CSV=pyarrow parsea las lecturas completas (no las de por bloques) con el motor de pyarrow,
+# si está instalado; si no, o si no admite alguna opción, se usa el de C
+MOTOR_CSV = os.environ.get('OPTICAMP_MOTOR_CSV', 'c')
 
 def parse_float_robusto(x):
     if pd.isnull(x):
@@ -21,68 +32,30 @@ def parse_float_robusto(x):
             return 0.0
     return 0.0
 
-def procesar_archivo(df, archivo_nombre):
+@medir_etapa('normalizacion')
+def procesar_archivo(df, archivo_nombre, columnas_globales=True):
+    """
+    Renombra las columnas de cada plataforma al esquema común (ver esquemas.ESQUEMAS) y normaliza las métricas.
+    Con columnas_globales=False (bloques de una lectura por bloques) no se añaden RankingGasto
+    ni ColorCampaña, que dependen del archivo completo.
+    """
     df.columns = df.columns.str.strip()
-    mapeo_columnas = {
-        # Google Ads (ES)
-        'Mes': 'Mes',
-        'Campaña': 'Nombre',  # Solo mapea Campaña a Nombre
-        'Clics': 'Clics',
-        'Impr.': 'Impresiones',
-        'CTR': 'CTR',
-        'CPC medio': 'CPC',
-        'Coste': 'Gasto',
-        'Conversiones': 'Conversiones',
-        'Coste/conv.': 'CPA',
-        'Tasa de conv.': 'CVR',
-        # Google Ads (EN)
-        'Campaign': 'Nombre',
-        'Cost': 'Gasto',
-        'Clicks': 'Clics',
-        'All conversions': 'Conversiones',
-        'Impressions': 'Impresiones',
-        'Avg. CPC': 'CPC',
-        # Facebook Ads (EN)
-        'Campaign name': 'Nombre',
-        'Amount spent': 'Gasto',
-        'Link clicks': 'Clics',
-        'Results': 'Conversiones',
-        'Impressions': 'Impresiones',
-        'Cost per link click': 'CPC',
-        # Pinterest
-        'Spend': 'Gasto',
-        'Clicks': 'Clics',
-        'Conversions': 'Conversiones',
-        # TikTok
-        'Ad name': 'Nombre',
-        'Total spend': 'Gasto',
-        'Website clicks': 'Clics',
-        'Reach': 'Impresiones',
-        'Click-through rate': 'CTR',
-        'Cost per click': 'CPC',
-        # Meta/Facebook Ads (ES)
-        'Nombre del grupo publicitario': 'Nombre',
-        'Gasto total': 'Gasto',
-        'Clics en el Pin': 'Clics',
-        'Resultado': 'Conversiones',
-        'Campaña de Performance': 'Campaña',
-        'Campaña Premiere Spotlight': 'Campaña',
-        'CPM': 'CPM',
-    }
-    df = df.rename(columns=mapeo_columnas)
-    columnas_requeridas = ['Nombre', 'Gasto', 'Clics', 'Conversiones']
-    columnas_faltantes = [col for col in columnas_requeridas if col not in df.columns]
+    df = df.rename(columns=MAPEO_COLUMNAS)
+    contar('filas', len(df))
+    columnas_faltantes = [col for col in COLUMNAS_REQUERIDAS if col not in df.columns]
     if columnas_faltantes:
         return None, columnas_faltantes, list(df.columns)
     for col in ['Gasto', 'Clics', 'Conversiones', 'CTR', 'CPC', 'CPA', 'CVR', 'Impresiones']:
         if col in df.columns:
-            df[col] = df[col].apply(parse_float_robusto)
+            df[col] = normalizar_numerica(df[col])
     if 'CTR' not in df.columns and 'Impresiones' in df.columns:
         df['CTR'] = (df['Clics'] / df['Impresiones'].replace(0, 1)) * 100
     if 'CPC' not in df.columns:
         df['CPC'] = df['Gasto'] / df['Clics'].replace(0, 1)
     if 'CVR' not in df.columns:
         df['CVR'] = (df['Conversiones'] / df['Clics'].replace(0, 1)) * 100
+    if not columnas_globales:
+        return df, None, None
     # Añadir columna de ranking por gasto
     if 'Gasto' in df.columns:
         df['RankingGasto'] = df['Gasto'].rank(ascending=False, method='min').astype(int)
@@ -94,72 +67,110 @@ def procesar_archivo(df, archivo_nombre):
         df['ColorCampaña'] = df['Nombre'].map(color_map)
     return df, None, None
 
-def leer_csv_robusto(archivo_path, encodings=None):
+def leer_csv_robusto(origen, encodings=None):
     """
-    Intenta leer un CSV probando varios delimitadores y encodings. Si falla, prueba autodetección de delimitador con utf-16/utf-16le.
-    Devuelve el DataFrame, el delimitador y encoding usados, y si falla, un preview de las primeras filas y columnas detectadas.
+    Lee un CSV detectando encoding, delimitador y línea de cabecera sobre una muestra de los primeros
+    bytes (ver deteccion_csv) y parseándolo una sola vez con esos parámetros.
+    origen puede ser una ruta, bytes o un objeto tipo archivo binario (ver ingesta.abrir_origen).
+    Devuelve el DataFrame y (delim, encoding), o (delim, encoding, header_idx) si la cabecera no está en la
+    primera línea. Si falla, devuelve los errores, un preview de las primeras filas y las columnas detectadas.
     """
-    import pandas as pd
-    if encodings is None:
-        encodings = ['utf-8', 'utf-8-sig', 'latin1', 'utf-16', 'utf-16le']
-    delimitadores = [';', ',', '\t']
-    errores = []
-    # 1. Prueba todos los delimitadores con todos los encodings
-    for encoding in encodings:
-        for delim in delimitadores:
-            try:
-                df = pd.read_csv(archivo_path, delimiter=delim, encoding=encoding)
-                if len(df.columns) > 1:
-                    return df, (delim, encoding), None
-            except Exception as e:
-                errores.append(f"Delimitador '{delim}', encoding '{encoding}': {str(e)}")
-    # 2. Prueba delimitador ';' explícitamente con utf-16 y utf-16le (por si BOM y delimitador juntos)
-    for encoding in ['utf-16', 'utf-16le']:
-        try:
-            df = pd.read_csv(archivo_path, delimiter=';', encoding=encoding)
-            if len(df.columns) > 1:
-                return df, (';', encoding), None
-        except Exception as e:
-            errores.append(f"Delimitador ';', encoding '{encoding}' (extra): {str(e)}")
-    # 3. Prueba autodetección de delimitador con utf-16 y utf-16le
-    for encoding in ['utf-16', 'utf-16le']:
-        try:
-            df = pd.read_csv(archivo_path, encoding=encoding)
-            if len(df.columns) > 1:
-                return df, (None, encoding), None
-        except Exception as e:
-            errores.append(f"Autodetect, encoding '{encoding}': {str(e)}")
-    # 4. Preview de error (lectura manual si todo falla)
-    try:
-        # Buscar la línea de cabecera real (la que contiene 'Mes\tCampaña')
-        with open(archivo_path, encoding='utf-16') as f:
-            lineas = []
-            header_idx = None
-            for idx, linea in enumerate(f):
-                lineas.append(linea)
-                if 'Mes\tCampaña' in linea:
-                    header_idx = idx
-                    break
-            # Leer 4 líneas más para preview
-            for _ in range(4):
-                try:
-                    lineas.append(next(f))
-                except StopIteration:
+    with abrir_origen(origen) as f:
+        return _leer_csv_abierto(f, encodings)
+
+
+def leer_csv_por_bloques(origen, crear_consumidor, filas_bloque=FILAS_BLOQUE, encodings=None):
+    """
+    Como leer_csv_robusto, pero sin construir el DataFrame completo: parsea el CSV en bloques de
+    filas_bloque filas y se los pasa a consumidor = crear_consumidor(), que los procesa y puede
+    devolver False para dejar de leer. Si el archivo tiene que releerse en latin1 se crea un consumidor nuevo.
+    Devuelve el consumidor en lugar del DataFrame, con los mismos formato y diagnóstico que leer_csv_robusto.
+    """
+    with abrir_origen(origen) as f:
+        return _leer_csv_abierto(f, encodings, crear_consumidor, filas_bloque)
+
+
+def _consumir_bloques(lector, consumidor):
+    # Devuelve las columnas del primer bloque (siempre hay al menos uno, aunque no tenga filas)
+    columnas = None
+    with lector:
+        while True:
+            # Solo se mide el parseo: lo que haga el consumidor con el bloque lleva sus propias etapas
+            with etapa('lectura'):
+                bloque = next(lector, None)
+            if bloque is None:
+                break
+            if columnas is None:
+                columnas = bloque.columns
+                if len(columnas) <= 1:
                     break
-        # Si se encontró la cabecera, intentar leer con pandas desde esa línea
-        if header_idx is not None:
+            if consumidor(bloque) is False:
+                break
+    return columnas
+
+
+def _opciones_c(opciones):
+    # El motor de C admite usecols como función: una columna de la lista que pandas lea con otro nombre
+    # (comillas raras en la cabecera) se ignora en lugar de hacer fallar la lectura
+    if opciones['usecols'] is None:
+        return opciones
+    incluidas = set(opciones['usecols'])
+    return {**opciones, 'usecols': lambda columna: columna in incluidas}
+
+
+def _read_csv(f, inicio, opciones):
+    if MOTOR_CSV == 'pyarrow':
+        try:
+            return pd.read_csv(f, engine='pyarrow', **opciones)
+        except (ImportError, ValueError):
+            # Sin pyarrow instalado o con opciones que su motor no admite
+            f.seek(inicio)
+    return pd.read_csv(f, **_opciones_c(opciones))
+
+
+def _leer_csv_abierto(f, encodings, crear_consumidor=None, filas_bloque=None):
+    inicio = f.tell()
+    with etapa('deteccion'):
+        muestra = f.read(TAMANO_MUESTRA + 1)
+        completa = len(muestra) <= TAMANO_MUESTRA
+        delim, encoding, header_idx, texto = detectar_formato(muestra[:TAMANO_MUESTRA], encodings, completa)
+    errores = []
+    if encoding is None:
+        errores.append(f"Ningún encoding de {encodings or ENCODINGS_POR_DEFECTO} decodifica el principio del archivo")
+    elif delim is None:
+        errores.append(f"Encoding '{encoding}': ningún delimitador de {DELIMITADORES} separa más de una columna")
+    else:
+        # Una muestra ASCII no distingue utf-8 de latin1: si más adelante aparece una 'ñ' en latin1,
+        # el parseo utf-8 falla y se repite una única vez en latin1
+        reintentos = ['latin1'] if encoding == 'utf-8' and not completa and 'latin1' in (encodings or ENCODINGS_POR_DEFECTO) else []
+        # Con la cabecera de la muestra se leen solo las columnas que se usan, con los identificadores como texto
+        with etapa('deteccion'):
+            usecols, dtype = parametros_lectura(columnas_cabecera(texto, header_idx, delim))
+        for enc in [encoding] + reintentos:
+            f.seek(inicio)
+            contar('intentos_lectura')
+            opciones = {'delimiter': delim, 'encoding': enc, 'skiprows': header_idx, 'usecols': usecols, 'dtype': dtype}
             try:
-                df = pd.read_csv(archivo_path, delimiter='\t', encoding='utf-16', header=header_idx)
-                if len(df.columns) > 1:
-                    return df, ('\t', 'utf-16', header_idx), None
+                if crear_consumidor is None:
+                    with etapa('lectura'):
+                        df = _read_csv(f, inicio, opciones)
+                    columnas = df.columns
+                else:
+                    df = crear_consumidor()
+                    columnas = _consumir_bloques(pd.read_csv(f, chunksize=filas_bloque, **_opciones_c(opciones)), df)
+                if len(columnas) > 1:
+                    return df, (delim, enc, header_idx) if header_idx else (delim, enc), None
+                errores.append(f"Delimitador '{delim}', encoding '{enc}': solo se ha leído una columna")
+            except UnicodeDecodeError as e:
+                errores.append(f"Delimitador '{delim}', encoding '{enc}': {str(e)}")
+                continue
             except Exception as e:
-                errores.append(f"Lectura avanzada con header en línea {header_idx}: {str(e)}")
-        # Preview manual
-        preview_manual = [l.strip().split('\t') for l in lineas]
-        columnas = preview_manual[header_idx] if header_idx is not None else []
-    except Exception as e:
-        preview_manual = str(e)
-        columnas = []
+                errores.append(f"Delimitador '{delim}', encoding '{enc}': {str(e)}")
+            break
+    # Preview manual con lo que se haya podido decodificar de la muestra
+    lineas = texto.splitlines()[:(header_idx or 0) + 5] if texto else []
+    preview_manual = [l.strip().split(delim or '\t') for l in lineas]
+    columnas = preview_manual[header_idx] if header_idx is not None and header_idx < len(preview_manual) else []
     return None, None, {
         'errores': errores,
         'preview_manual': preview_manual,
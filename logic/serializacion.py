@@ -0,0 +1,123 @@
+# Serialización JSON de las respuestas: con orjson directamente desde arrays de NumPy, o con json de la biblioteca estándar
+import json
+import math
+import os
+import zlib
+import numpy as np
+import pandas as pd
+from .compactar import expandir_colores
+from .instrumentacion import medir_etapa
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 'orjson' (por defecto si está instalado) o 'json'. Las dos dan el mismo JSON salvo el formato de algunos
+# números (1e16 frente a 1e+16)
+MOTOR_JSON = os.environ.get('OPTICAMP_MOTOR_JSON', 'orjson' if orjson is not None else 'json')
+
+# Formatos de las listas de la respuesta: 'filas' (lista de objetos) o 'columnas' (un array por campo)
+FORMATOS = ('filas', 'columnas')
+
+# Tipo MIME y extensión de las exportaciones completas (ver exportar_filas)
+FORMATOS_EXPORTACION = {
+    'ndjson': ('application/x-ndjson', '.ndjson'),
+    'csv': ('text/csv; charset=utf-8', '.csv'),
+}
+
+# Filas que se serializan de una vez en las exportaciones: la memoria de una exportación depende de esto, no del dataset
+FILAS_LOTE_EXPORTACION = int(os.environ.get('OPTICAMP_EXPORTAR_FILAS_LOTE', 10000))
+
+
+def _por_defecto(valor):
+    # Lo que orjson no serializa por sí mismo: arrays de objetos (textos), no contiguos o de otros tipos,
+    # escalares de NumPy y los vacíos de pandas
+    if isinstance(valor, np.ndarray):
+        return valor.tolist()
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if valor is pd.NA or valor is pd.NaT:
+        return None
+    raise TypeError(f"Tipo no serializable a JSON: {type(valor).__name__}")
+
+
+def _normalizar(valor):
+    # Para json de la biblioteca estándar: arrays y escalares de NumPy a tipos de Python y NaN/inf a None
+    if isinstance(valor, dict):
+        return {clave: _normalizar(v) for clave, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_normalizar(v) for v in valor]
+    if isinstance(valor, float):
+        return valor if math.isfinite(valor) else None
+    if isinstance(valor, (np.ndarray, np.generic)):
+        return _normalizar(valor.tolist())
+    if valor is pd.NA or valor is pd.NaT:
+        return None
+    return valor
+
+
+@medir_etapa('serializacion')
+def serializar_json(contenido):
+    """
+    JSON compacto en UTF-8 de contenido, que puede llevar arrays y escalares de NumPy.
+    NaN, inf y -inf (p. ej. un CTR sin impresiones) se escriben como null en lugar de dar error.
+    """
+    if MOTOR_JSON == 'orjson' and orjson is not None:
+        return orjson.dumps(contenido, default=_por_defecto, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(_normalizar(contenido), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def columnas_json(df):
+    """Columnas de df como {columna: array}, la versión por columnas de filas_json (los vacíos salen como null)."""
+    return {columna: df.iloc[:, i].to_numpy() for i, columna in enumerate(df.columns)}
+
+
+def registros_a_columnas(registros):
+    """Lista de dicts (p. ej. la tabla resumen) como {campo: lista de valores}, con los campos en orden de aparición."""
+    campos = {}
+    for registro in registros:
+        for campo in registro:
+            campos.setdefault(campo, None)
+    return {campo: [registro.get(campo) for registro in registros] for campo in campos}
+
+
+def _lineas_json(registros):
+    # Un objeto JSON por línea (NDJSON) con los mismos tipos que serializar_json
+    if MOTOR_JSON == 'orjson' and orjson is not None:
+        return b"".join(orjson.dumps(r, default=_por_defecto, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE) for r in registros)
+    return "".join(json.dumps(_normalizar(r), ensure_ascii=False, allow_nan=False, separators=(",", ":")) + "\n" for r in registros).encode("utf-8")
+
+
+def exportar_filas(df, formato, columnas=None, filas_lote=FILAS_LOTE_EXPORTACION):
+    """
+    Generador con el contenido de df (un dataset guardado, compactado o no) en 'ndjson' (un objeto por fila)
+    o 'csv' (con cabecera), en trozos de bytes de filas_lote filas y solo con las columnas pedidas.
+    Las columnas se comprueban antes con compactar.comprobar_columnas.
+    """
+    if formato == 'csv':
+        yield pd.DataFrame(columns=columnas or expandir_colores(df.iloc[:0]).columns).to_csv(index=False).encode("utf-8")
+    for inicio in range(0, len(df), filas_lote):
+        lote = expandir_colores(df.iloc[inicio:inicio + filas_lote])
+        if columnas:
+            lote = lote[columnas]
+        if formato == 'csv':
+            yield lote.to_csv(index=False, header=False).encode("utf-8")
+        else:
+            # Más rápido que to_dict(orient='records'), que convierte celda a celda
+            valores = [lote.iloc[:, i].tolist() for i in range(lote.shape[1])]
+            nombres = list(lote.columns)
+            yield _lineas_json(dict(zip(nombres, fila)) for fila in zip(*valores))
+
+
+def comprimir_gzip(trozos, nivel=1):
+    """
+    Generador con los trozos de bytes comprimidos en gzip a medida que llegan (para Content-Encoding: gzip).
+    El nivel 1 comprime unas 5 veces más rápido que el 6 por defecto de gzip y ocupa solo algo más.
+    """
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+    for trozo in trozos:
+        comprimido = compresor.compress(trozo)
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
@@ -0,0 +1,7 @@
+# Los tests importan el paquete como gpt: se añade al path la carpeta que lo contiene (igual que en benchmarks/)
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
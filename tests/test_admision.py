@@ -0,0 +1,142 @@
+import asyncio
+
+from gpt.components.admision import Compuerta, ControlAdmision, MiddlewareAdmision
+from gpt.components.tokens import VerificadorTokens, emitir_token
+
+RUTA = '/analizar/'
+
+
+def test_compuerta_cola_llena_y_espera_agotada():
+    async def probar():
+        compuerta = Compuerta(1, max_espera=1, espera_maxima=0.05)
+        assert await compuerta.entrar() is None
+        esperando = asyncio.ensure_future(compuerta.entrar())
+        await asyncio.sleep(0)
+        assert compuerta.esperando == 1
+        # Ocupada y con la cola llena: se rechaza sin esperar
+        assert await compuerta.entrar() == 'cola_llena'
+        assert await esperando == 'espera_agotada'
+        assert (compuerta.en_curso, compuerta.esperando) == (1, 0)
+        # Al salir la primera, la siguiente en la cola pasa
+        esperando = asyncio.ensure_future(compuerta.entrar())
+        await asyncio.sleep(0)
+        compuerta.salir()
+        assert await esperando is None
+        assert compuerta.en_curso == 1
+
+    asyncio.run(probar())
+
+
+def test_compuerta_sin_limite():
+    async def probar():
+        compuerta = Compuerta(0, max_espera=0)
+        assert [await compuerta.entrar() for _ in range(5)] == [None] * 5
+        assert compuerta.en_curso == 5
+
+    asyncio.run(probar())
+
+
+class Aplicacion:
+    """App ASGI que lee todo el cuerpo y espera a `soltar` antes de responder 200."""
+
+    def __init__(self):
+        self.soltar = asyncio.Event()
+        self.dentro = 0
+
+    async def __call__(self, scope, receive, send):
+        self.dentro += 1
+        while True:
+            mensaje = await receive()
+            if mensaje['type'] == 'http.disconnect' or not mensaje.get('more_body'):
+                break
+        await self.soltar.wait()
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b'ok'})
+
+
+async def _peticion(app, trozos=(b'x',), cabeceras=()):
+    scope = {'type': 'http', 'method': 'POST', 'path': RUTA, 'headers': [(k.encode(), v.encode()) for k, v in cabeceras]}
+    mensajes = [{'type': 'http.request', 'body': t, 'more_body': i < len(trozos) - 1} for i, t in enumerate(trozos)]
+
+    async def recibir():
+        return mensajes.pop(0) if mensajes else {'type': 'http.disconnect'}
+
+    respuesta = {}
+
+    async def enviar(mensaje):
+        if mensaje['type'] == 'http.response.start':
+            respuesta['status'] = mensaje['status']
+            respuesta['cabeceras'] = {k.decode().lower(): v.decode() for k, v in mensaje['headers']}
+
+    await app(scope, recibir, enviar)
+    return respuesta
+
+
+def _middleware(app, **kwargs):
+    control = ControlAdmision({RUTA: 1}, max_bytes=kwargs.pop('max_bytes', 100), max_espera=kwargs.pop('max_espera', 1), espera_maxima=0.05, **kwargs)
+    return control, MiddlewareAdmision(app, control, autenticacion=False)
+
+
+def test_saturado_responde_429_o_503_con_retry_after():
+    async def probar():
+        app = Aplicacion()
+        control, middleware = _middleware(app)
+        primera = asyncio.ensure_future(_peticion(middleware))
+        await asyncio.sleep(0.01)
+        # La segunda espera turno y la tercera encuentra la cola llena
+        segunda = asyncio.ensure_future(_peticion(middleware))
+        await asyncio.sleep(0)
+        tercera = await _peticion(middleware)
+        assert tercera['status'] == 429
+        assert tercera['cabeceras']['retry-after'] == '1'
+        segunda = await segunda
+        assert segunda['status'] == 503
+        assert 'retry-after' in segunda['cabeceras']
+        app.soltar.set()
+        assert (await primera)['status'] == 200
+        # Sin nadie en curso se admite de nuevo
+        assert (await _peticion(middleware))['status'] == 200
+        assert app.dentro == 2
+        rutas = control.estadisticas()['rutas'][RUTA]
+        assert (rutas['admitida'], rutas['cola_llena'], rutas['espera_agotada'], rutas['en_curso']) == (2, 1, 1, 0)
+        assert f'opticamp_admision_total{{ruta="{RUTA}",resultado="cola_llena"}} 1' in control.exponer()
+
+    asyncio.run(probar())
+
+
+def test_subida_demasiado_grande_responde_413():
+    async def probar():
+        app = Aplicacion()
+        app.soltar.set()
+        control, middleware = _middleware(app)
+        # Por Content-Length, sin llegar a la aplicación
+        assert (await _peticion(middleware, cabeceras=[('content-length', '101')]))['status'] == 413
+        assert app.dentro == 0
+        # Sin Content-Length: se corta al pasar del máximo mientras llega
+        assert (await _peticion(middleware, trozos=[b'x' * 60, b'x' * 60]))['status'] == 413
+        assert (await _peticion(middleware, trozos=[b'x' * 50, b'x' * 50]))['status'] == 200
+        assert control.estadisticas()['rutas'][RUTA]['demasiado_grande'] == 2
+        assert control.compuertas[RUTA].en_curso == 0
+
+    asyncio.run(probar())
+
+
+def test_limite_de_subidas_simultaneas_del_plan():
+    async def probar():
+        app = Aplicacion()
+        verificador = VerificadorTokens(secreto=b's')
+        control = ControlAdmision({RUTA: 0}, max_bytes=0, limites_plan={'BASIC': {'bytes': 10, 'simultaneas': 1}})
+        middleware = MiddlewareAdmision(app, control, verificador=verificador, autenticacion=True)
+        cabeceras = [('authorization', 'Bearer ' + emitir_token('ana', 'BASIC', secreto=b's'))]
+        primera = asyncio.ensure_future(_peticion(middleware, cabeceras=cabeceras))
+        await asyncio.sleep(0.01)
+        segunda = await _peticion(middleware, cabeceras=cabeceras)
+        assert segunda['status'] == 429
+        # Máximo de bytes del plan
+        assert (await _peticion(middleware, cabeceras=[('authorization', 'Bearer ' + emitir_token('luis', 'BASIC', secreto=b's')),
+                                                        ('content-length', '11')]))['status'] == 413
+        app.soltar.set()
+        assert (await primera)['status'] == 200
+        assert control.estadisticas()['usuarios_con_subidas'] == 0
+
+    asyncio.run(probar())
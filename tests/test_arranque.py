@@ -0,0 +1,10 @@
+from gpt.benchmarks.tiempo_arranque import MODULOS_PESADOS, informe_importacion
+
+# El tiempo de `import gpt.api` no se comprueba aquí (depende de la carga de la máquina): en CI, con
+# python -m gpt.benchmarks.tiempo_arranque --presupuesto-ms
+
+
+def test_importar_api_no_carga_modulos_pesados():
+    # En un proceso nuevo: en este ya están importados pandas y demás
+    informe = informe_importacion('gpt.api')
+    assert informe['pesados_importados'] == [], f"gpt.api no debe importar {MODULOS_PESADOS}"
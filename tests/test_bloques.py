@@ -0,0 +1,50 @@
+import json
+import math
+
+import pytest
+
+from gpt.benchmarks.generador import PLATAFORMAS, generar_export
+from gpt.logic.pipeline import analizar_para_lote, analizar_subida, analizar_subida_por_bloques
+from gpt.logic.serializacion import serializar_json
+
+
+def _cercanos(a, b):
+    # Las sumas por bloques pueden diferir en el último decimal por el orden de suma
+    if isinstance(a, float) and isinstance(b, float):
+        return a == b or (math.isnan(a) and math.isnan(b)) or math.isclose(a, b, rel_tol=1e-9)
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(_cercanos(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return isinstance(b, list) and len(a) == len(b) and all(_cercanos(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+@pytest.mark.parametrize('plataforma', sorted(PLATAFORMAS))
+@pytest.mark.parametrize('formato', ['filas', 'columnas'])
+def test_por_bloques_igual_que_entero(plataforma, formato):
+    datos = generar_export(plataforma, 2_000, semilla=8)
+    _, entero, status = analizar_subida(datos, f'{plataforma}.csv', formato)
+    assert status == 200
+    for filas_bloque in [97, 999, 100_000]:
+        df, por_bloques, status = analizar_subida_por_bloques(datos, f'{plataforma}.csv', filas_bloque, formato)
+        assert status == 200 and df is None
+        assert _cercanos(json.loads(por_bloques), json.loads(entero)), filas_bloque
+
+
+def test_errores_iguales_por_bloques():
+    for datos in [b'a;b\n1;2\n', b'\x00\x01hola\nadios\n']:
+        _, entero, status = analizar_subida(datos, 'x.csv')
+        _, por_bloques, status_bloques = analizar_subida_por_bloques(datos, 'x.csv', 1)
+        assert (status_bloques, json.loads(por_bloques)) == (status, json.loads(entero))
+        assert status == 400
+
+
+def test_agregado_del_lote_igual_por_bloques():
+    datos = generar_export('pinterest', 3_000, semilla=2)
+    status, contenido, agregado = analizar_para_lote(datos, 'p.csv')
+    status_bloques, contenido_bloques, agregado_bloques = analizar_para_lote(datos, 'p.csv', por_bloques=True)
+    assert (status, status_bloques) == (200, 200)
+    assert _cercanos(json.loads(serializar_json(contenido_bloques)), json.loads(serializar_json(contenido)))
+    # El agregado (Campaña, Mes) que se combina con los del resto del lote
+    assert agregado_bloques.index.equals(agregado.index)
+    assert _cercanos(agregado_bloques['gasto'].tolist(), agregado['gasto'].tolist())
@@ -0,0 +1,111 @@
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+
+from gpt import api
+from gpt.components.autenticacion import AUTENTICACION_ACTIVA
+from gpt.components.tokens import emitir_token
+from gpt.logic.cache import CacheResultados, huella_contenido
+
+CSV = ("Campaña de Performance;Mes;Nombre del grupo publicitario;Gasto total;Clics en el Pin;Resultado;CTR\n"
+       + ''.join(f"C{i % 3};2024-0{i % 2 + 1};Grupo {i};{i},50 €;{i * 3};{i % 4};1.5%\n" for i in range(40))).encode()
+CABECERAS = {"Authorization": f"Bearer {emitir_token('ana', 'PRO')}"} if AUTENTICACION_ACTIVA else {}
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 0.0
+
+    def __call__(self):
+        return self.ahora
+
+
+def test_expulsa_los_menos_usados_al_pasar_de_max_bytes():
+    cache = CacheResultados(max_bytes=100, ttl=60)
+    assert cache.guardar('a', 'pdf', b'x' * 40)
+    assert cache.guardar('b', 'pdf', b'x' * 40)
+    # Usar 'a' la pasa al final: al guardar 'c' se expulsa 'b'
+    assert cache.obtener('a', 'pdf') is not None
+    assert cache.guardar('c', 'pdf', b'x' * 40)
+    assert cache.obtener('b', 'pdf') is None
+    assert cache.obtener('a', 'pdf') is not None
+    assert cache.obtener('c', 'pdf') is not None
+    estadisticas = cache.estadisticas()
+    assert estadisticas["bytes"] == 80
+    assert estadisticas["entradas"] == 2
+    assert estadisticas["expulsiones"] == 1
+
+
+def test_no_guarda_lo_que_no_cabe_y_reemplaza_sin_duplicar_bytes():
+    cache = CacheResultados(max_bytes=100, ttl=60)
+    assert not cache.guardar('a', 'pdf', b'x' * 101)
+    assert cache.estadisticas()["entradas"] == 0
+    cache.guardar('a', 'pdf', b'x' * 30)
+    cache.guardar('a', 'pdf', b'y' * 50)
+    assert cache.obtener('a', 'pdf') == b'y' * 50
+    assert cache.estadisticas()["bytes"] == 50
+    # Con tamano se cuenta ese tamaño y no el del valor
+    cache.guardar('b', 'df', object(), tamano=50)
+    assert cache.estadisticas()["bytes"] == 100
+
+
+def test_caduca_por_ttl():
+    reloj = Reloj()
+    cache = CacheResultados(max_bytes=100, ttl=10, reloj=reloj)
+    cache.guardar('a', 'analizar', b'{}')
+    reloj.ahora = 10
+    assert cache.obtener('a', 'analizar') == b'{}'
+    reloj.ahora = 10.5
+    assert cache.obtener('a', 'analizar') is None
+    estadisticas = cache.estadisticas()
+    assert estadisticas["bytes"] == 0
+    assert (estadisticas["aciertos"], estadisticas["fallos"]) == (1, 1)
+
+
+def test_huella_depende_del_contenido_y_la_version():
+    archivo = io.BytesIO(b'a;b\n1;2\n')
+    archivo.seek(2)
+    huella = huella_contenido(archivo)
+    # Deja el archivo donde estaba
+    assert archivo.tell() == 2
+    assert huella == huella_contenido(io.BytesIO(b'b\n1;2\n'))
+    assert huella != huella_contenido(io.BytesIO(b'b\n1;3\n'))
+    assert huella != huella_contenido(io.BytesIO(b'b\n1;2\n'), version='otra')
+
+
+@pytest.fixture
+def cliente():
+    api.cache.limpiar()
+    api.datasets.limpiar()
+    yield TestClient(api.app)
+    api.cache.limpiar()
+    api.datasets.limpiar()
+
+
+def _analizar(cliente):
+    respuesta = cliente.post('/analizar/', files={'file': ('informe.csv', CSV, 'text/csv')}, headers=CABECERAS)
+    assert respuesta.status_code == 200
+    return respuesta.json()
+
+
+def test_respuesta_cacheada_no_da_el_id_de_un_dataset_expulsado(cliente):
+    primera = _analizar(cliente)
+    assert primera['dataset_id'] is not None
+    # El dataset se va (LRU o TTL) pero el cuerpo con su dataset_id sigue en la caché de resultados
+    api.datasets.limpiar()
+    assert api.cache.obtener(primera['dataset_id'], 'analizar') is not None
+    segunda = _analizar(cliente)
+    assert segunda == primera
+    # Se ha vuelto a procesar y guardar: el id de la respuesta sirve
+    assert cliente.get(f"/datasets/{segunda['dataset_id']}", headers=CABECERAS).status_code == 200
+
+
+def test_respuesta_sin_dataset_se_sirve_de_la_cache(cliente, monkeypatch):
+    # Un dataset que no cabe en el almacén: la respuesta va con dataset_id null y vale mientras siga sin guardarse
+    monkeypatch.setattr(api.datasets, 'max_bytes', 1)
+    primera = _analizar(cliente)
+    assert primera['dataset_id'] is None
+    aciertos = api.cache.aciertos
+    assert _analizar(cliente) == primera
+    assert api.cache.aciertos == aciertos + 1
@@ -0,0 +1,92 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from gpt import api
+from gpt.components.autenticacion import AUTENTICACION_ACTIVA
+from gpt.components.tokens import emitir_token
+from gpt.logic import columnar
+
+# Un export de Pinterest con las métricas ya numéricas, como lo guardaría pandas/Polars en Parquet o Arrow
+EXPORT = pd.DataFrame({
+    'Campaña de Performance': [f"C{i % 3}" for i in range(60)],
+    'Mes': [f"2024-0{i % 2 + 1}" for i in range(60)],
+    'Nombre del grupo publicitario': [f"Grupo {i}" for i in range(60)],
+    'Gasto total': [i + 0.5 for i in range(60)],
+    'Clics en el Pin': [i * 3 for i in range(60)],
+    'Resultado': [i % 4 for i in range(60)],
+    'CTR': [1.5 + i % 5 for i in range(60)],
+})
+CABECERAS = {"Authorization": f"Bearer {emitir_token('ana', 'PRO')}"} if AUTENTICACION_ACTIVA else {}
+
+
+@pytest.fixture
+def cliente():
+    api.cache.limpiar()
+    api.datasets.limpiar()
+    return TestClient(api.app)
+
+
+def _analizar(cliente, nombre, contenido):
+    respuesta = cliente.post('/analizar/', files={'file': (nombre, contenido, 'application/octet-stream')}, headers=CABECERAS)
+    assert respuesta.status_code == 200, respuesta.text
+    cuerpo = respuesta.json()
+    return cuerpo.pop('dataset_id'), cuerpo
+
+
+def _escribir(df, formato):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.ipc
+    import pyarrow.parquet
+    tabla = pyarrow.Table.from_pandas(df, preserve_index=False)
+    destino = pyarrow.BufferOutputStream()
+    if formato == 'parquet':
+        pyarrow.parquet.write_table(tabla, destino)
+    else:
+        # Varios record batches, para pasar por la lectura por lotes
+        nuevo = pyarrow.ipc.new_file if formato == 'arrow' else pyarrow.ipc.new_stream
+        with nuevo(destino, tabla.schema) as escritor:
+            escritor.write_table(tabla, max_chunksize=25)
+    return destino.getvalue().to_pybytes()
+
+
+@pytest.mark.parametrize('formato', ['parquet', 'arrow', 'arrow_flujo'])
+def test_subida_columnar_da_los_kpis_del_csv(cliente, formato):
+    contenido = _escribir(EXPORT, formato)
+    assert columnar.formato_columnar(io.BytesIO(contenido)) == formato
+    _, esperado = _analizar(cliente, 'pinterest.csv', EXPORT.to_csv(sep=';', index=False).encode())
+    dataset_id, obtenido = _analizar(cliente, 'pinterest.bin', contenido)
+    assert obtenido == esperado
+    assert dataset_id is not None
+
+
+@pytest.mark.parametrize('formato', ['parquet', 'arrow'])
+def test_descarga_tiene_las_filas_y_kpis_de_la_subida(cliente, formato):
+    # Subida en Parquet y descarga en cada formato: mismas filas que /filas y mismos totales que el CSV
+    dataset_id, esperado = _analizar(cliente, 'pinterest.parquet', _escribir(EXPORT, 'parquet'))
+    respuesta = cliente.get(f'/datasets/{dataset_id}/descargar', params={'formato': formato}, headers=CABECERAS)
+    assert respuesta.status_code == 200
+    assert respuesta.headers['content-type'] == columnar.FORMATOS_DESCARGA[formato][0]
+    leer = pd.read_parquet if formato == 'parquet' else pd.read_feather
+    descargado = leer(io.BytesIO(respuesta.content))
+    filas = cliente.get(f'/datasets/{dataset_id}/filas', params={'por_pagina': 1000}, headers=CABECERAS).json()['filas']
+    pd.testing.assert_frame_equal(descargado[list(filas[0])].astype(object), pd.DataFrame(filas).astype(object), check_dtype=False)
+    _, csv = _analizar(cliente, 'pinterest.csv', EXPORT.to_csv(sep=';', index=False).encode())
+    assert esperado == csv
+    assert descargado['Gasto'].sum() == pytest.approx(csv['kpis']['gasto_total'])
+
+
+def test_sin_pyarrow_responde_error_claro(cliente, monkeypatch):
+    monkeypatch.setattr(columnar, 'pyarrow', None)
+    # En hilos, para que el módulo parcheado sea el que lee la subida
+    monkeypatch.setattr(api.ejecutores, 'procesos', None)
+    respuesta = cliente.post('/analizar/', files={'file': ('datos.parquet', b'PAR1' + bytes(64), 'application/octet-stream')}, headers=CABECERAS)
+    assert respuesta.status_code == 400
+    assert 'pyarrow' in respuesta.json()['error']
+    dataset_id, _ = _analizar(cliente, 'pinterest.csv', EXPORT.to_csv(sep=';', index=False).encode())
+    respuesta = cliente.get(f'/datasets/{dataset_id}/descargar', headers=CABECERAS)
+    assert respuesta.status_code == 501
+    assert 'pyarrow' in json.loads(respuesta.content)['error']
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from gpt.logic.compactar import compactar_dataset
+from gpt.logic.pipeline import procesar_subida, resumen_analisis
+from gpt.logic.serializacion import serializar_json
+
+FILAS = 500_000
+
+
+def _pinterest(rng):
+    # Con Campaña y Mes: se agrega por grupos
+    lineas = ["Campaña de Performance;Mes;Nombre del grupo publicitario;Gasto total;Clics en el Pin;Resultado;CTR"]
+    lineas += [f"C{c};2024-0{m};Grupo {c}-{m};{g},50 €;{k};{r};1.5%"
+               for c, m, g, k, r in zip(rng.integers(0, 8, FILAS), rng.integers(1, 4, FILAS), rng.integers(1, 2000, FILAS),
+                                        rng.integers(1, 500, FILAS), rng.integers(0, 20, FILAS))]
+    return lineas
+
+
+def _google(rng):
+    # Sin Campaña ni Mes: una sola fila de totales
+    lineas = ["Campaign,Clicks,Impr.,CTR,Cost,Conversions"]
+    lineas += [f"Camp {c},{k},{k * 10},10.0%,{g}.5,{r}"
+               for c, g, k, r in zip(rng.integers(0, 8, FILAS), rng.integers(1, 2000, FILAS),
+                                     rng.integers(1, 500, FILAS), rng.integers(0, 20, FILAS))]
+    return lineas
+
+
+@pytest.mark.parametrize('generar', [_pinterest, _google])
+def test_resumen_igual_sobre_el_dataset_compactado(generar):
+    # Gastos en medios euros: caben en float32 sin perder nada y compactar_dataset los reduce, pero su suma no
+    lineas = generar(np.random.default_rng(19))
+    df, error = procesar_subida(('\n'.join(lineas) + '\n').encode(), 'informe.csv')
+    assert error is None
+    compacto, informe = compactar_dataset(df)
+    assert compacto['Gasto'].dtype == 'float32'
+    assert informe['bytes_despues'] < informe['bytes_antes']
+    assert resumen_analisis(compacto) == resumen_analisis(df)
+    # Con arrays de numpy: se compara el JSON que devuelve /analizar/
+    assert serializar_json(resumen_analisis(compacto, 'columnas')) == serializar_json(resumen_analisis(df, 'columnas'))
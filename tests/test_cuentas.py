@@ -0,0 +1,98 @@
+import os
+
+import pandas as pd
+import pytest
+
+from gpt.logic.agregados import agregar_filas
+from gpt.logic.cuentas import AlmacenCuentas, COLUMNAS_AGREGADO
+from gpt.logic.pipeline import procesar_subida, resumen_agregado
+
+CABECERA = "Campaña de Performance;Mes;Nombre del grupo publicitario;Gasto total;Clics en el Pin;Resultado;CTR"
+
+
+def _fila(campana, mes, nombre, gasto, resultados=1):
+    return f"{campana};{mes};{nombre};{gasto},25 €;{gasto * 2};{resultados};1.5%"
+
+
+def _export(filas):
+    # Como en /cuenta/anexar/: sin RankingGasto ni ColorCampaña
+    df, error = procesar_subida(('\n'.join([CABECERA] + filas) + '\n').encode(), 'pinterest.csv', columnas_globales=False)
+    assert error is None
+    return df
+
+
+def _comprobar(almacen, cuenta, filas_vigentes):
+    # El agregado mantenido por grupos y las filas guardadas son los de procesar de una vez las filas vigentes
+    esperado = _export(filas_vigentes)
+    columnas = ['Nombre', 'Mes', 'Gasto']
+    guardadas = almacen.filas(cuenta, columnas)
+    pd.testing.assert_frame_equal(guardadas.astype(object), esperado[columnas].astype(object))
+    agregado = almacen.agregado(cuenta)
+    recalculado = agregar_filas(esperado[[col for col in COLUMNAS_AGREGADO if col in esperado.columns]])
+    assert resumen_agregado(agregado.sort_index()) == resumen_agregado(recalculado.sort_index())
+    assert almacen.estadisticas(cuenta)["filas"] == len(filas_vigentes)
+
+
+@pytest.fixture
+def almacen(tmp_path):
+    return AlmacenCuentas(raiz=str(tmp_path), max_segmentos=3)
+
+
+def test_anexar_exports_sin_repetidas(almacen):
+    dia1 = [_fila('C1', '2024-01', 'G1', 10), _fila('C2', '2024-01', 'G2', 20)]
+    dia2 = [_fila('C1', '2024-02', 'G1', 30), _fila('C3', '2024-02', 'G3', 40)]
+    _, anexado = almacen.anexar('ana', _export(dia1))
+    assert anexado == {"filas_nuevas": 2, "filas_sustituidas": 0, "filas": 2, "segmentos": 1}
+    _, anexado = almacen.anexar('ana', _export(dia2))
+    assert anexado == {"filas_nuevas": 2, "filas_sustituidas": 0, "filas": 4, "segmentos": 2}
+    _comprobar(almacen, 'ana', dia1 + dia2)
+
+
+def test_misma_fila_sustituye_a_la_guardada(almacen):
+    dia1 = [_fila('C1', '2024-01', 'G1', 10), _fila('C2', '2024-01', 'G2', 20), _fila('C2', '2024-01', 'G4', 5)]
+    almacen.anexar('ana', _export(dia1))
+    # G1 cambia de gasto; G2 pasa a otra campaña y C2 se queda solo con G4
+    dia2 = [_fila('C1', '2024-01', 'G1', 99), _fila('C5', '2024-01', 'G2', 7), _fila('C1', '2024-02', 'G1', 1)]
+    _, anexado = almacen.anexar('ana', _export(dia2))
+    assert anexado["filas_sustituidas"] == 2
+    assert anexado["filas"] == 4
+    _comprobar(almacen, 'ana', [dia1[2]] + dia2)
+    # Dentro de un mismo export gana la última fila repetida
+    dia3 = [_fila('C2', '2024-01', 'G4', 1), _fila('C2', '2024-01', 'G4', 2)]
+    _, anexado = almacen.anexar('ana', _export(dia3))
+    assert (anexado["filas_nuevas"], anexado["filas_sustituidas"]) == (1, 1)
+    _comprobar(almacen, 'ana', dia2 + dia3[1:])
+
+
+def test_segmentos_se_juntan_al_pasar_del_maximo(almacen):
+    vigentes = []
+    for dia in range(1, 6):
+        export = [_fila(f'C{dia % 2}', f'2024-0{dia}', f'G{i}', dia * 10 + i) for i in range(3)]
+        # Cada día reenvía también la última fila del anterior
+        if vigentes:
+            export.append(vigentes[-1].replace(',25 €', ',75 €'))
+            vigentes = vigentes[:-1]
+        _, anexado = almacen.anexar('ana', _export(export))
+        vigentes += export
+        assert anexado["segmentos"] <= almacen.max_segmentos
+    _comprobar(almacen, 'ana', vigentes)
+    # Tras juntar solo quedan en disco los segmentos y el agregado de la versión actual
+    directorio = almacen._directorio('ana')
+    estado = almacen._estado(directorio)
+    assert any(s["id"].endswith('-c') for s in estado["segmentos"])
+    assert sorted(os.listdir(os.path.join(directorio, 'segmentos'))) == sorted(s["id"] for s in estado["segmentos"])
+    assert [n for n in os.listdir(directorio) if n.startswith('agregado-')] == [f'agregado-{estado["version"]}']
+
+
+def test_cuentas_separadas_y_borrado(almacen):
+    almacen.anexar('ana', _export([_fila('C1', '2024-01', 'G1', 10)]))
+    almacen.anexar('luis', _export([_fila('C9', '2024-01', 'G1', 50)]))
+    assert almacen.borrar('ana')
+    assert almacen.agregado('ana') is None
+    assert not almacen.borrar('ana')
+    _comprobar(almacen, 'luis', [_fila('C9', '2024-01', 'G1', 50)])
+
+
+def test_export_sin_mes(almacen):
+    with pytest.raises(ValueError):
+        almacen.anexar('ana', _export([_fila('C1', '2024-01', 'G1', 10)]).drop(columns='Mes'))
@@ -0,0 +1,46 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from gpt import api
+from gpt.components.autenticacion import AUTENTICACION_ACTIVA
+from gpt.components.tokens import emitir_token
+
+CSV = ("Campaña de Performance;Mes;Nombre del grupo publicitario;Gasto total;Clics en el Pin;Resultado;CTR\n"
+       + ''.join(f"C{i % 3};2024-0{i % 2 + 1};Grupo {i};{i},50 €;{i * 3};{i % 4};1.5%\n" for i in range(40))).encode()
+
+pytestmark = pytest.mark.skipif(not AUTENTICACION_ACTIVA, reason="con OPTICAMP_AUTH=0 todos los datasets son de todos")
+
+
+def _cabeceras(usuario):
+    return {"Authorization": f"Bearer {emitir_token(usuario, 'PRO')}"}
+
+
+def _analizar(cliente, usuario):
+    respuesta = cliente.post('/analizar/', files={'file': ('informe.csv', CSV, 'text/csv')}, headers=_cabeceras(usuario))
+    assert respuesta.status_code == 200
+    return respuesta.json()['dataset_id']
+
+
+@pytest.fixture
+def cliente():
+    api.cache.limpiar()
+    api.datasets.limpiar()
+    return TestClient(api.app)
+
+
+def test_dataset_ajeno_responde_404(cliente):
+    dataset_id = _analizar(cliente, 'ana')
+    assert dataset_id is not None
+    for ruta in ['', '/filas', '/exportar']:
+        assert cliente.get(f'/datasets/{dataset_id}{ruta}', headers=_cabeceras('ana')).status_code == 200
+    for ruta in ['', '/filas', '/exportar', '/descargar']:
+        assert cliente.get(f'/datasets/{dataset_id}{ruta}', headers=_cabeceras('luis')).status_code == 404
+
+
+def test_subir_el_mismo_archivo_da_acceso(cliente):
+    dataset_id = _analizar(cliente, 'ana')
+    assert cliente.get(f'/datasets/{dataset_id}', headers=_cabeceras('luis')).status_code == 404
+    # La segunda subida sale del cuerpo cacheado, con el mismo id
+    assert _analizar(cliente, 'luis') == dataset_id
+    assert cliente.get(f'/datasets/{dataset_id}', headers=_cabeceras('luis')).status_code == 200
+    assert cliente.get(f'/datasets/{dataset_id}', headers=_cabeceras('ana')).status_code == 200
@@ -0,0 +1,26 @@
+import codecs
+
+import pandas as pd
+import pytest
+
+from gpt.logic.deteccion_csv import detectar_encoding
+from gpt.logic.procesar_archivo import leer_csv_robusto
+
+CSV = ("Campaña de Performance;Mes;Nombre del grupo publicitario;Gasto total;Clics en el Pin;Resultado;CTR\n"
+       + ''.join(f"Campaña {i % 3};2024-0{i % 2 + 1};Grupo ñ{i};{i},50 €;{i * 3};{i % 4};1.5%\n" for i in range(40)))
+
+
+@pytest.mark.parametrize('encoding, bom, esperado', [
+    ('utf-16-le', b'', 'utf-16le'),
+    ('utf-16-be', b'', 'utf-16be'),
+    ('utf-16-le', codecs.BOM_UTF16_LE, 'utf-16'),
+    ('utf-16-be', codecs.BOM_UTF16_BE, 'utf-16'),
+])
+def test_export_utf16_se_lee_como_el_utf8(encoding, bom, esperado):
+    # Sin BOM el encoding sale del patrón de nulos; big endian incluido
+    contenido = bom + CSV.encode(encoding)
+    assert detectar_encoding(contenido, completa=True) == (esperado, CSV)
+    df, formato, error = leer_csv_robusto(contenido)
+    assert error is None and formato == (';', esperado)
+    referencia, _, _ = leer_csv_robusto(CSV.encode('utf-8'))
+    pd.testing.assert_frame_equal(df, referencia)
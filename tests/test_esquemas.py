@@ -0,0 +1,28 @@
+import pytest
+
+from gpt.benchmarks.generador import PLATAFORMAS, generar_export
+from gpt.logic.esquemas import COLUMNAS_REQUERIDAS, COLUMNAS_TEXTO, MAPEO_COLUMNAS, parametros_lectura
+from gpt.logic.pipeline import procesar_subida
+
+
+@pytest.mark.parametrize('plataforma', sorted(PLATAFORMAS))
+def test_cabecera_de_cada_plataforma(plataforma):
+    cabecera = [nombre for nombre, _ in PLATAFORMAS[plataforma]['columnas']] + ['Extra 0', 'Extra 1']
+    usecols, dtype = parametros_lectura(cabecera)
+    # Solo las columnas con mapeo, con todas las requeridas, y los identificadores como texto
+    assert 'Extra 0' not in usecols and 'Extra 1' not in usecols
+    assert set(COLUMNAS_REQUERIDAS) <= {MAPEO_COLUMNAS.get(col, col) for col in usecols}
+    assert {col for col in usecols if MAPEO_COLUMNAS.get(col, col) in COLUMNAS_TEXTO} == set(dtype)
+
+
+@pytest.mark.parametrize('plataforma', sorted(PLATAFORMAS))
+def test_export_con_columnas_de_sobra(plataforma):
+    df, error = procesar_subida(generar_export(plataforma, 200, columnas_extra=6), f'{plataforma}.csv')
+    assert error is None
+    assert len(df) == 200
+    assert not [col for col in df.columns if col.startswith('Extra')]
+
+
+def test_cabecera_sin_requeridas_o_repetida_lee_todo():
+    assert parametros_lectura(['Campaign', 'Cost', 'Otra'])[0] is None
+    assert parametros_lectura(['Campaign', 'Cost', 'Clicks', 'Results', 'Cost'])[0] is None
@@ -0,0 +1,92 @@
+import io
+import json
+from functools import partial
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from gpt import api
+from gpt.components.autenticacion import AUTENTICACION_ACTIVA
+from gpt.components.tokens import emitir_token
+from gpt.logic import serializacion
+
+# Cada séptima fila sin campaña y cada undécima sin mes: vacíos en las columnas de texto
+CSV = ("Campaña de Performance;Mes;Nombre del grupo publicitario;Gasto total;Clics en el Pin;Resultado;CTR\n"
+       + ''.join(f"{'' if i % 7 == 0 else f'C{i % 3}'};{'' if i % 11 == 0 else f'2024-0{i % 2 + 1}'};Grupo {i};{i}.25;{i * 3};{i % 4};1.5%\n"
+                 for i in range(60))).encode()
+CABECERAS = {"Authorization": f"Bearer {emitir_token('ana', 'PRO')}"} if AUTENTICACION_ACTIVA else {}
+SIN_GZIP = {**CABECERAS, "Accept-Encoding": "identity"}
+CON_GZIP = {**CABECERAS, "Accept-Encoding": "gzip, deflate"}
+
+
+@pytest.fixture(params=[False, True], ids=['normal', 'compactado'])
+def dataset_id(request, monkeypatch):
+    monkeypatch.setattr(api, 'COMPACTAR_DATASETS', request.param)
+    # Lotes pequeños: la exportación sale en varios trozos
+    monkeypatch.setattr(serializacion, 'exportar_filas', partial(serializacion.exportar_filas, filas_lote=7))
+    api.cache.limpiar()
+    api.datasets.limpiar()
+    respuesta = TestClient(api.app).post('/analizar/', files={'file': ('informe.csv', CSV, 'text/csv')}, headers=CABECERAS)
+    dataset_id = respuesta.json()['dataset_id']
+    assert dataset_id is not None
+    yield dataset_id
+    api.cache.limpiar()
+    api.datasets.limpiar()
+
+
+def _filas(cliente, dataset_id):
+    # Todas las páginas de /datasets/{id}/filas
+    filas, pagina = [], 1
+    while True:
+        contenido = cliente.get(f'/datasets/{dataset_id}/filas', params={'pagina': pagina, 'por_pagina': 25}, headers=CABECERAS).json()
+        filas += contenido['filas']
+        if pagina >= contenido['paginas']:
+            return filas
+        pagina += 1
+
+
+@pytest.mark.parametrize('cabeceras, gzip', [(SIN_GZIP, False), (CON_GZIP, True)], ids=['identity', 'gzip'])
+def test_exportar_ndjson_da_las_filas_de_todas_las_paginas(dataset_id, cabeceras, gzip):
+    cliente = TestClient(api.app)
+    respuesta = cliente.get(f'/datasets/{dataset_id}/exportar', params={'formato': 'ndjson'}, headers=cabeceras)
+    assert respuesta.status_code == 200
+    assert respuesta.headers['content-type'] == 'application/x-ndjson'
+    assert respuesta.headers.get('content-encoding') == ('gzip' if gzip else None)
+    exportadas = [json.loads(linea) for linea in respuesta.text.splitlines()]
+    filas = _filas(cliente, dataset_id)
+    assert exportadas == filas
+    # Los vacíos salen como null y el color de cada fila expandido aunque el dataset esté compactado
+    assert exportadas[0]['Campaña'] is None and exportadas[0]['Mes'] is None
+    assert exportadas[1]['ColorCampaña'].startswith('#')
+    assert all(fila['ColorCampaña'] for fila in exportadas)
+
+
+@pytest.mark.parametrize('cabeceras, gzip', [(SIN_GZIP, False), (CON_GZIP, True)], ids=['identity', 'gzip'])
+def test_exportar_csv_da_las_filas_de_todas_las_paginas(dataset_id, cabeceras, gzip):
+    cliente = TestClient(api.app)
+    respuesta = cliente.get(f'/datasets/{dataset_id}/exportar', params={'formato': 'csv'}, headers=cabeceras)
+    assert respuesta.status_code == 200
+    assert respuesta.headers.get('content-encoding') == ('gzip' if gzip else None)
+    lineas = respuesta.text.splitlines()
+    # Una sola cabecera aunque vaya en varios lotes, y la fila sin campaña ni mes empieza con dos campos vacíos
+    assert lineas[0].startswith('Campaña,Mes,Nombre,') and lineas[1].startswith(',,Grupo 0,')
+    exportadas = pd.read_csv(io.StringIO(respuesta.text), dtype={'Campaña': str, 'Mes': str})
+    esperadas = pd.DataFrame(_filas(cliente, dataset_id))
+    pd.testing.assert_frame_equal(exportadas, esperadas, check_dtype=False)
+
+
+def test_comprimir_fuerza_o_desactiva_gzip(dataset_id):
+    cliente = TestClient(api.app)
+    ruta = f'/datasets/{dataset_id}/exportar'
+    assert cliente.get(ruta, params={'comprimir': 'true'}, headers=SIN_GZIP).headers.get('content-encoding') == 'gzip'
+    assert cliente.get(ruta, params={'comprimir': 'false'}, headers=CON_GZIP).headers.get('content-encoding') is None
+    assert cliente.get(ruta, headers={**CABECERAS, "Accept-Encoding": "gzip;q=0"}).headers.get('content-encoding') is None
+
+
+def test_acepta_gzip():
+    assert api.acepta_gzip('gzip, deflate, br')
+    assert api.acepta_gzip('br;q=1.0, GZIP;q=0.5')
+    assert not api.acepta_gzip('gzip;q=0')
+    assert not api.acepta_gzip('deflate')
+    assert not api.acepta_gzip('')
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from gpt.logic.feedback import analizar_grupo, recomendar, recomendar_columnas
+
+
+def _por_filas(df, reglas=None, por_defecto=None):
+    # La versión fila a fila que sustituye recomendar_columnas
+    return df.apply(analizar_grupo, axis=1).apply(lambda a: recomendar(a, reglas, por_defecto)).tolist()
+
+
+def _metricas(filas=2_000):
+    rng = np.random.default_rng(4)
+    return pd.DataFrame({
+        'Nombre': [f'C{i}' for i in range(filas)],
+        'CTR': rng.uniform(0, 3, filas).round(2),
+        'CPA': rng.uniform(0, 120, filas).round(1),
+        'Gasto': rng.uniform(0, 500, filas),
+    })
+
+
+def test_igual_que_por_filas_con_columnas_numericas():
+    df = _metricas()
+    # Los umbrales exactos también: CTR == 1 no es bajo y CPA == 50 no es alto
+    df.loc[:9, 'CTR'] = 1.0
+    df.loc[10:19, 'CPA'] = 50.0
+    assert recomendar_columnas(df).tolist() == _por_filas(df)
+
+
+def test_igual_que_por_filas_con_textos_y_columnas_que_faltan():
+    df = _metricas(500)
+    df['CTR'] = [f"{v:.2f}".replace('.', ',') + ' %' for v in df['CTR']]
+    df['CPA'] = [f"{v} €" if i % 7 else 'n/d' for i, v in enumerate(df['CPA'])]
+    assert recomendar_columnas(df).tolist() == _por_filas(df)
+    sin_cpa = df.drop(columns='CPA')
+    assert recomendar_columnas(sin_cpa).tolist() == _por_filas(sin_cpa)
+
+
+def test_reglas_propias_y_resultado_categorico():
+    df = _metricas(300)
+    reglas = [
+        {'columna': 'Gasto', 'operador': '>=', 'umbral': 400, 'mensaje': "Revisar presupuesto"},
+        {'columna': 'CPA', 'operador': '<=', 'umbral': 10, 'mensaje': "Escalar"},
+        {'columna': 'CTR', 'operador': '<', 'umbral': 0.5, 'mensaje': "Escalar"},
+    ]
+    df.index = range(100, 400)
+    recomendacion = recomendar_columnas(df, reglas, "Sin cambios")
+    assert recomendacion.tolist() == _por_filas(df, reglas, "Sin cambios")
+    assert recomendacion.index.equals(df.index)
+    assert list(recomendacion.cat.categories) == ["Revisar presupuesto", "Escalar", "Sin cambios"]
+    assert recomendar_columnas(df, [], "Sin cambios").tolist() == ["Sin cambios"] * len(df)
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from gpt.logic.compactar import compactar_dataset
+from gpt.logic.filtros import DatasetIndexado, aplicar_filtros, filas_json
+
+
+def _dataset(filas=3_000):
+    rng = np.random.default_rng(17)
+    gasto = rng.integers(0, 1000, filas).astype('float64')
+    gasto[::50] = np.nan
+    return pd.DataFrame({
+        'Nombre': [f'G{i % 400}' for i in range(filas)],
+        'Canal': rng.choice(['Search', 'Display', 'Video'], filas),
+        'Tipo': rng.choice(['Marca', 'Genérica'], filas),
+        'Gasto': gasto,
+        'CTR': rng.uniform(0, 3, filas),
+        'CPA': rng.uniform(0, 100, filas),
+    }, index=range(7, filas + 7))
+
+
+def test_aplicar_filtros_no_toca_el_original():
+    df = _dataset()
+    filtrado = aplicar_filtros(df, 'Search', 'Todos', (100, 500))
+    assert 'Recomendación' not in df.columns
+    assert filtrado['Recomendación'].notna().all()
+    assert ((filtrado['Canal'] == 'Search') & filtrado['Gasto'].between(100, 500)).all()
+
+
+CONSULTAS = [
+    ('Todos', 'Todos', None),
+    ('Todos', 'Todos', (-np.inf, np.inf)),
+    ('Search', 'Todos', (0, 1000)),
+    ('Video', 'Marca', (250, 600)),
+    ('Todos', 'Genérica', (999, 999)),
+    ('Radio', 'Todos', (0, 1000)),
+    ('Todos', 'Todos', (700, 100)),
+]
+
+
+@pytest.mark.parametrize('canal, tipo, rango', CONSULTAS)
+@pytest.mark.parametrize('compactar', [False, True])
+def test_indices_igual_que_aplicar_filtros(canal, tipo, rango, compactar):
+    df = _dataset()
+    indexado = DatasetIndexado(compactar_dataset(df)[0] if compactar else df)
+    esperado = aplicar_filtros(df, canal, tipo, rango or (-np.inf, np.inf))
+    for orden in [None, ['-Gasto', 'Nombre'], ['Canal', 'CTR']]:
+        ordenado = esperado.sort_values([c.lstrip('-') for c in orden], ascending=[not c.startswith('-') for c in orden],
+                                        kind='stable', na_position='last') if orden else esperado
+        resultado = indexado.pagina(canal, tipo, rango, orden=orden, pagina=2, por_pagina=40)
+        assert resultado["total"] == len(esperado)
+        assert resultado["filas"] == filas_json(ordenado.iloc[40:80].astype(object))
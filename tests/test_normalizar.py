@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from gpt.logic.normalizar import normalizar_numerica
+from gpt.logic.procesar_archivo import parse_float_robusto
+
+CASOS = ['12', '-3', '+4,5', '1.234', '1,5 %', '3,2%', '1 234,5', '2\xa0000', '"7,25"', '0,5;1,2', '8|9', '3\t4',
+         '', ' ', '--', 'x', '12 3,4', '1e3', '-1,5e-2', '1.2.3', '1,2,3', '.5', '5.', '-', '+', 'nan', 'inf', '€ 12',
+         '12 €', '٣', '1' * 40, '0' * 30 + '1,5', None, np.nan, 3, 2.5, True, object()]
+
+
+def _referencia(serie):
+    return serie.apply(parse_float_robusto).to_numpy(dtype='float64')
+
+
+def test_casos_limite():
+    serie = pd.Series(CASOS, dtype=object)
+    np.testing.assert_array_equal(normalizar_numerica(serie).to_numpy(), _referencia(serie))
+
+
+@pytest.mark.parametrize('dtype', [object, 'str'])
+def test_textos_aleatorios(dtype):
+    # Textos cortos con los caracteres que trata la versión vectorizada y alguno que no
+    rng = np.random.default_rng(1)
+    alfabeto = np.array(list('0123456789') * 3 + list('.,-+% ;|\t"e€\xa0 a'))
+    textos = [''.join(rng.choice(alfabeto, rng.integers(0, 14))) for _ in range(20_000)]
+    serie = pd.Series(textos + [None], dtype=dtype, index=range(5, 20_006), name='Gasto')
+    normalizada = normalizar_numerica(serie)
+    assert normalizada.index.equals(serie.index) and normalizada.name == 'Gasto'
+    np.testing.assert_array_equal(normalizada.to_numpy(), _referencia(serie))
+
+
+def test_columnas_ya_numericas():
+    for serie in [pd.Series([1, 2, 3]), pd.Series([1.5, np.nan]), pd.Series([True, False]), pd.Series([1, None], dtype='Int64')]:
+        np.testing.assert_array_equal(normalizar_numerica(serie).to_numpy(), _referencia(serie))
@@ -0,0 +1,63 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from gpt import api
+from gpt.components.autenticacion import AUTENTICACION_ACTIVA
+from gpt.components.tokens import VerificadorTokens, emitir_token
+
+SECRETO = b'secreto de prueba'
+AHORA = 1_700_000_000
+
+
+def _verificador(reloj=lambda: AHORA, **kwargs):
+    return VerificadorTokens(secreto=SECRETO, reloj=reloj, **kwargs)
+
+
+def test_token_valido():
+    token = emitir_token('ana', 'PRO', ttl=60, secreto=SECRETO, ahora=AHORA)
+    assert _verificador().verificar(token) == {"usuario": 'ana', "plan": 'PRO', "exp": AHORA + 60}
+
+
+def test_token_manipulado_o_de_otro_secreto():
+    token = emitir_token('ana', 'BASIC', ttl=60, secreto=SECRETO, ahora=AHORA)
+    carga, _, firma = token.partition('.')
+    otro = emitir_token('ana', 'PRO', ttl=60, secreto=SECRETO, ahora=AHORA).partition('.')[0]
+    verificador = _verificador()
+    assert verificador.verificar(f"{otro}.{firma}") is None
+    assert verificador.verificar(f"{carga}.{firma[:-2]}") is None
+    assert verificador.verificar(emitir_token('ana', 'BASIC', ttl=60, secreto=b'otro', ahora=AHORA)) is None
+    for basura in [None, '', 'sin-punto', '.', 'a.b.c', '%%%.###']:
+        assert verificador.verificar(basura) is None
+
+
+def test_token_caduca_aunque_este_verificado():
+    ahora = [AHORA]
+    verificador = _verificador(reloj=lambda: ahora[0])
+    token = emitir_token('ana', 'PRO', ttl=60, secreto=SECRETO, ahora=AHORA)
+    assert verificador.verificar(token) is not None
+    ahora[0] = AHORA + 59
+    assert verificador.verificar(token) is not None
+    # La caducidad se comprueba también para los tokens que ya están en la LRU
+    ahora[0] = AHORA + 60
+    assert verificador.verificar(token) is None
+
+
+def test_lru_de_tokens_verificados_acotada():
+    verificador = _verificador(max_tokens=2)
+    tokens = [emitir_token(f'u{i}', 'PRO', ttl=60, secreto=SECRETO, ahora=AHORA) for i in range(3)]
+    for token in tokens:
+        assert verificador.verificar(token)["usuario"] is not None
+    assert list(verificador._verificados) == tokens[1:]
+    # Un token expulsado se vuelve a verificar por la firma
+    assert verificador.verificar(tokens[0])["usuario"] == 'u0'
+
+
+@pytest.mark.skipif(not AUTENTICACION_ACTIVA, reason="con OPTICAMP_AUTH=0 no se piden tokens")
+def test_subida_sin_token_valido_responde_401():
+    cliente = TestClient(api.app)
+    caducado = emitir_token('ana', 'PRO', ttl=-1)
+    for cabeceras in [{}, {"Authorization": "Bearer x.y"}, {"Authorization": f"Bearer {caducado}"}]:
+        respuesta = cliente.post('/analizar/', files={'file': ('a.csv', b'a;b\n1;2\n', 'text/csv')}, headers=cabeceras)
+        assert respuesta.status_code == 401
+        assert respuesta.headers['WWW-Authenticate'] == 'Bearer'
+    assert cliente.get('/cuenta/', headers={"Authorization": f"Bearer {caducado}"}).status_code == 401
@@ -0,0 +1,214 @@
+import asyncio
+import io
+import os
+import threading
+import time
+
+import httpx
+import pytest
+from fastapi import UploadFile
+
+from gpt import api
+from gpt.components.autenticacion import AUTENTICACION_ACTIVA
+from gpt.components.tokens import emitir_token
+from gpt.components.trabajos_pdf import ColaTrabajosPDF, ColaLlena
+
+
+async def _sin_procesar(trabajo):
+    raise AssertionError("el trabajo no debería llegar a la cola")
+
+
+@pytest.fixture
+def cola(monkeypatch, tmp_path):
+    cola = ColaTrabajosPDF(_sin_procesar, directorio=str(tmp_path))
+    monkeypatch.setattr(api, 'trabajos_pdf', cola)
+    return cola
+
+
+def test_subida_cancelada_borra_el_trabajo(cola, monkeypatch):
+    empezada, seguir = threading.Event(), threading.Event()
+
+    def copiar_lenta(origen, ruta):
+        open(ruta, 'wb').close()
+        empezada.set()
+        seguir.wait(5)
+
+    monkeypatch.setattr(api, 'copiar_subida', copiar_lenta)
+
+    async def escenario():
+        subida = UploadFile(file=io.BytesIO(b"Campaign;Cost\n"), filename='informe.csv')
+        tarea = asyncio.create_task(api.crear_trabajo_pdf(file=subida, motor='reportlab', usuario=None))
+        while not empezada.is_set():
+            await asyncio.sleep(0.01)
+        directorio = next(iter(cola._trabajos.values())).directorio
+        # Como cuando el cliente se desconecta a mitad de la subida
+        tarea.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await tarea
+        seguir.set()
+        # Antes de detener(), que borra el directorio de toda la cola
+        assert not os.path.exists(directorio)
+        assert cola._trabajos == {}
+        await cola.detener()
+
+    asyncio.run(escenario())
+
+
+CSV = b"Campaign;Cost\nA;1\n"
+PDF = b"%PDF-1.4 prueba"
+
+
+def _cabeceras(usuario='ana'):
+    return {"Authorization": f"Bearer {emitir_token(usuario, 'PRO')}"} if AUTENTICACION_ACTIVA else {}
+
+
+class ProcesarFalso:
+    """procesar de la cola que espera a `soltar` (así se ve el estado procesando) y devuelve PDF."""
+
+    def __init__(self, espera=None):
+        self.soltar = asyncio.Event()
+        self.espera = espera
+        self.entradas = []
+
+    async def __call__(self, trabajo):
+        with open(trabajo.ruta_csv, 'rb') as f:
+            self.entradas.append(f.read())
+        trabajo.avanzar('graficas', 50)
+        if self.espera is not None:
+            await asyncio.sleep(self.espera)
+        await self.soltar.wait()
+        return PDF
+
+
+async def _esperar(condicion, limite=5):
+    final = time.monotonic() + limite
+    while not condicion():
+        assert time.monotonic() < final, "el trabajo no ha cambiado de estado"
+        await asyncio.sleep(0.01)
+
+
+def _cliente():
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url='http://prueba')
+
+
+def _probar(monkeypatch, cola, escenario):
+    # La app, la cola y sus trabajadores en el mismo event loop
+    monkeypatch.setattr(api, 'trabajos_pdf', cola)
+
+    async def principal():
+        try:
+            async with _cliente() as cliente:
+                await escenario(cliente)
+        finally:
+            await cola.detener()
+
+    asyncio.run(principal())
+
+
+def test_trabajo_pasa_por_los_estados_y_se_descarga(monkeypatch, tmp_path):
+    procesar = ProcesarFalso()
+    cola = ColaTrabajosPDF(procesar, max_trabajadores=1, timeout=5, ttl=60, directorio=str(tmp_path))
+
+    async def escenario(cliente):
+        respuesta = await cliente.post('/trabajos_pdf/', params={'motor': 'reportlab'}, files={'file': ('informe.csv', CSV)}, headers=_cabeceras())
+        assert respuesta.status_code == 202
+        assert respuesta.json()['estado'] == 'en_cola'
+        id_trabajo = respuesta.json()['id']
+        trabajo = cola.obtener(id_trabajo)
+        await _esperar(lambda: trabajo.estado == 'procesando')
+        estado = (await cliente.get(f'/trabajos_pdf/{id_trabajo}', headers=_cabeceras())).json()
+        assert (estado['estado'], estado['etapa'], estado['progreso']) == ('procesando', 'graficas', 50)
+        # Antes de terminar, 409 con el estado
+        respuesta = await cliente.get(f'/trabajos_pdf/{id_trabajo}/pdf', headers=_cabeceras())
+        assert respuesta.status_code == 409
+        assert respuesta.json()['estado'] == 'procesando'
+        procesar.soltar.set()
+        await _esperar(lambda: trabajo.estado == 'completado')
+        assert trabajo.progreso == 100 and trabajo.terminado is not None
+        respuesta = await cliente.get(f'/trabajos_pdf/{id_trabajo}/pdf', headers=_cabeceras())
+        assert respuesta.status_code == 200
+        assert respuesta.content == PDF
+        assert procesar.entradas == [CSV]
+        # La entrada se borra al terminar; el PDF se queda hasta que caduca
+        assert not os.path.exists(trabajo.ruta_csv)
+
+    _probar(monkeypatch, cola, escenario)
+
+
+def test_cola_llena_responde_429(monkeypatch, tmp_path):
+    # Sin trabajadores nadie saca trabajos de la cola
+    cola = ColaTrabajosPDF(ProcesarFalso(), max_trabajadores=0, max_cola=2, directorio=str(tmp_path))
+
+    async def escenario(cliente):
+        for _ in range(2):
+            respuesta = await cliente.post('/trabajos_pdf/', params={'motor': 'reportlab'}, files={'file': ('informe.csv', CSV)}, headers=_cabeceras())
+            assert respuesta.status_code == 202
+        respuesta = await cliente.post('/trabajos_pdf/', params={'motor': 'reportlab'}, files={'file': ('informe.csv', CSV)}, headers=_cabeceras())
+        assert respuesta.status_code == 429
+        assert respuesta.headers['Retry-After'] == '30'
+        assert cola.estadisticas()['trabajos'] == {'en_cola': 2}
+        with pytest.raises(ColaLlena):
+            cola.crear('informe.csv', 'reportlab')
+
+    _probar(monkeypatch, cola, escenario)
+
+
+@pytest.mark.skipif(not AUTENTICACION_ACTIVA, reason="con OPTICAMP_AUTH=0 los trabajos son de todos")
+def test_trabajo_ajeno_responde_404(monkeypatch, tmp_path):
+    procesar = ProcesarFalso()
+    procesar.soltar.set()
+    cola = ColaTrabajosPDF(procesar, max_trabajadores=1, directorio=str(tmp_path))
+
+    async def escenario(cliente):
+        respuesta = await cliente.post('/trabajos_pdf/', params={'motor': 'reportlab'}, files={'file': ('informe.csv', CSV)}, headers=_cabeceras('ana'))
+        id_trabajo = respuesta.json()['id']
+        await _esperar(lambda: cola.obtener(id_trabajo).estado == 'completado')
+        for ruta in ['', '/pdf']:
+            assert (await cliente.get(f'/trabajos_pdf/{id_trabajo}{ruta}', headers=_cabeceras('ana'))).status_code == 200
+            respuesta = await cliente.get(f'/trabajos_pdf/{id_trabajo}{ruta}', headers=_cabeceras('luis'))
+            assert respuesta.status_code == 404
+        assert (await cliente.get('/trabajos_pdf/no-existe', headers=_cabeceras('ana'))).status_code == 404
+
+    _probar(monkeypatch, cola, escenario)
+
+
+def test_timeout_marca_el_trabajo_con_error(tmp_path):
+    cola = ColaTrabajosPDF(ProcesarFalso(espera=10), max_trabajadores=1, timeout=0.05, directorio=str(tmp_path))
+
+    async def escenario():
+        trabajo = cola.crear('informe.csv', 'reportlab')
+        with open(trabajo.ruta_csv, 'wb') as f:
+            f.write(CSV)
+        cola.encolar(trabajo)
+        await _esperar(lambda: trabajo.estado == 'error')
+        await cola.detener()
+        return trabajo
+
+    trabajo = asyncio.run(escenario())
+    assert trabajo.error == "Tiempo máximo de 0.05 s superado"
+    assert trabajo.terminado is not None
+
+
+def test_limpiar_caducados_borra_trabajos_terminados(tmp_path):
+    procesar = ProcesarFalso()
+    procesar.soltar.set()
+    cola = ColaTrabajosPDF(procesar, max_trabajadores=1, ttl=30, directorio=str(tmp_path))
+
+    async def escenario():
+        trabajos = [cola.crear('informe.csv', 'reportlab') for _ in range(2)]
+        with open(trabajos[0].ruta_csv, 'wb') as f:
+            f.write(CSV)
+        cola.encolar(trabajos[0])
+        await _esperar(lambda: trabajos[0].estado == 'completado')
+        terminado = trabajos[0].terminado
+        # Antes del ttl sigue ahí; el que no ha terminado no caduca nunca
+        cola.limpiar_caducados(ahora=terminado + 29)
+        assert cola.obtener(trabajos[0].id) is trabajos[0]
+        cola.limpiar_caducados(ahora=terminado + 31)
+        assert cola.obtener(trabajos[0].id) is None
+        assert not os.path.exists(trabajos[0].directorio)
+        assert cola.obtener(trabajos[1].id) is trabajos[1]
+        assert os.path.exists(trabajos[1].directorio)
+        await cola.detener()
+
+    asyncio.run(escenario())
@@ -0,0 +1,85 @@
+import json
+import os
+
+import bcrypt
+import pytest
+
+from gpt.components.usuarios import UsuariosJSON, UsuariosSQLite, autenticar, crear_almacen
+
+
+def _hash(password):
+    # Pocas rondas: el coste de bcrypt no es lo que se prueba
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=4)).decode('utf-8')
+
+
+USUARIOS = [
+    {"usuario": "ana", "password_hash": _hash("secreta"), "plan": "PRO"},
+    {"usuario": "luis", "password_hash": _hash("otra"), "plan": "BASIC"},
+]
+
+
+def _escribir(ruta, contenido):
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write(contenido if isinstance(contenido, str) else json.dumps(contenido))
+    # Cada reescritura con otro mtime: en el test pueden caer en el mismo tic del reloj del sistema de archivos
+    _escribir.mtime = getattr(_escribir, 'mtime', 1_000_000_000) + 1
+    os.utime(ruta, (_escribir.mtime, _escribir.mtime))
+
+
+@pytest.fixture
+def ruta_json(tmp_path):
+    ruta = str(tmp_path / 'usuarios.json')
+    _escribir(ruta, USUARIOS)
+    return ruta
+
+
+def test_json_y_sqlite_autentican_igual(ruta_json, tmp_path):
+    almacen_json = crear_almacen(ruta_json)
+    almacen_sqlite = crear_almacen(f"sqlite:///{tmp_path / 'usuarios.db'}")
+    assert isinstance(almacen_json, UsuariosJSON) and isinstance(almacen_sqlite, UsuariosSQLite)
+    assert almacen_sqlite.importar_json(ruta_json) == 2
+    casos = [("ana", "secreta"), ("ana", "otra"), ("luis", "otra"), ("luis", ""), ("nadie", "secreta"), ("", "")]
+    for usuario, password in casos:
+        assert autenticar(usuario, password, almacen_json) == autenticar(usuario, password, almacen_sqlite)
+    assert autenticar("ana", "secreta", almacen_sqlite)["plan"] == "PRO"
+    assert autenticar("ana", "otra", almacen_sqlite) is None
+    # Un cambio de plan en SQLite se ve en la siguiente consulta
+    almacen_sqlite.guardar("luis", USUARIOS[1]["password_hash"], "PRO")
+    assert autenticar("luis", "otra", almacen_sqlite)["plan"] == "PRO"
+
+
+def test_json_reescrito_se_recarga_sin_reiniciar(ruta_json):
+    almacen = UsuariosJSON(ruta_json)
+    assert autenticar("ana", "secreta", almacen)["plan"] == "PRO"
+    _escribir(ruta_json, [{**USUARIOS[0], "password_hash": _hash("nueva"), "plan": "BASIC"}])
+    assert autenticar("ana", "secreta", almacen) is None
+    assert autenticar("ana", "nueva", almacen)["plan"] == "BASIC"
+    assert autenticar("luis", "otra", almacen) is None
+
+
+def test_json_inexistente_no_tiene_usuarios(tmp_path):
+    ruta = str(tmp_path / 'usuarios.json')
+    almacen = UsuariosJSON(ruta)
+    assert autenticar("ana", "secreta", almacen) is None
+    assert almacen.todos() == []
+    # En cuanto aparece el archivo se lee; si se borra, se vacía
+    _escribir(ruta, USUARIOS)
+    assert autenticar("ana", "secreta", almacen) is not None
+    os.remove(ruta)
+    assert autenticar("ana", "secreta", almacen) is None
+
+
+@pytest.mark.parametrize('contenido', ['', '[{"usuario": "ana", "pass', '{"usuario": "ana"}', '[{"nombre": "ana"}]'],
+                         ids=['vacio', 'cortado', 'objeto', 'sin_usuario'])
+def test_json_corrupto_no_lanza_y_conserva_los_usuarios(ruta_json, contenido):
+    almacen = UsuariosJSON(ruta_json)
+    assert autenticar("ana", "secreta", almacen) is not None
+    _escribir(ruta_json, contenido)
+    # Se siguen usando los usuarios anteriores hasta que el archivo vuelve a ser válido
+    assert autenticar("ana", "secreta", almacen) is not None
+    _escribir(ruta_json, USUARIOS[1:])
+    assert autenticar("ana", "secreta", almacen) is None
+    assert autenticar("luis", "otra", almacen) is not None
+    # Corrupto desde el principio: sin usuarios, sin excepción
+    _escribir(ruta_json, contenido)
+    assert autenticar("ana", "secreta", UsuariosJSON(ruta_json)) is None